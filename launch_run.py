@@ -1,18 +1,26 @@
+import os
 import signal
 import sys
 from time import time
 
+import numpy as np
+
 from pyqcd.algorithms import GA, GLOA, MC, MLOA
 from pyqcd.alphabet import Alphabet
 from pyqcd.gates import CX, U3, I
 from pyqcd.logger import Logger
 from pyqcd.matrices import QFT, random_unitary
 
+SEED = 0
+CHECKPOINT = "data/launch_run.ckpt.npz"
+CHECKPOINT_INTERVAL = 10
+
 
 def main():
     start = time()
-    # Quantum Fourier Transform on 4 qubits
-    target = random_unitary(Q=4)
+    np.random.seed(SEED)
+    # Random unitary on 4 qubits, seeded so that a resumed run has the same target
+    target = random_unitary(Q=4, seed=SEED)
 
     # Instantiate a custom set of gates, an alphabet whose words are gates
     alphabet = Alphabet(Q=4)
@@ -22,25 +30,47 @@ def main():
     solver = MLOA(target=target, alphabet=alphabet,
                   n_groups=5, group_size=5, circuit_size=50)
 
-    # Instantiate the logger class to keep track of fitness evolution
-    logger = Logger("data/%s_%srandom.pickle" %
-                    (int(time()), solver.__class__.__name__), True)
-    logger.add_variables(*solver.stats().keys())
+    # Instantiate the logger class to keep track of fitness evolution,
+    # resuming the run of the last checkpoint if any
+    if os.path.exists(CHECKPOINT):
+        extra = solver.load_checkpoint(CHECKPOINT)
+        logger = Logger(extra['log_file'], True, resume_at=extra['log_size'])
+        print("Resumed %s at generation %d" % (extra['log_file'], solver.gen))
+    else:
+        logger = Logger("data/%s_%srandom.log" %
+                        (int(time()), solver.__class__.__name__), True)
+        logger.add_variables(*solver.stats().keys())
+
+    def checkpoint():
+        solver.save_checkpoint(CHECKPOINT, log_file=logger.file, log_size=logger.size())
+
+    # On SIGINT, stop after the current generation so that the checkpoint is consistent
+    interrupted = []
 
     def exit_handler(sig, frame):
-        solver.end()
-        sys.exit(0)
+        interrupted.append(sig)
 
     signal.signal(signal.SIGINT, exit_handler)
 
     # Main loop
-    while solver.n_evals < 500000:
+    while solver.n_evals < 500000 and not interrupted:
         # One step evolution
         solver.evolve()
 
         # Gather and save statistics
         logger.register(**solver.stats())
 
+        if solver.gen % CHECKPOINT_INTERVAL == 0:
+            checkpoint()
+
+    logger.dump()
+    if interrupted:
+        checkpoint()
+        solver.end()
+        sys.exit(0)
+
+    if os.path.exists(CHECKPOINT):
+        os.remove(CHECKPOINT)
     solver.end()
     print("Time elapsed %d s" % (time() - start))
 
@@ -1,41 +1,78 @@
-import os
-import pickle
 from pathlib import Path
 
 import matplotlib.animation as animation
 import matplotlib.pyplot as plt
 import numpy as np
 
+from pyqcd.logger import LogReader
 
-def pick_file():
-    #files = sorted(glob("data/*.pickle"))
-    files = sorted(list(Path('data').glob('**/*.pickle')))
 
-    print("Pick a file to monitor")
+def pick_files():
+    files = sorted(list(Path('data').glob('**/*.log')))
+
+    print("Pick files to monitor (space separated)")
     for x in enumerate(files):
         print("[%d] %s" % x)
 
-    return files[int(input("\n> "))]
+    return [files[int(idx)] for idx in input("\n> ").split()]
+
+
+class Series:
+    """Values of a label, grown in place with amortized doubling"""
+
+    def __init__(self, line) -> None:
+        self.line = line
+        self.n = 0
+        self.x = np.empty(1024)
+        self.y = np.empty(1024)
+
+    def extend(self, values) -> None:
+        values = np.array([np.nan if v is None else v for v in values], dtype=float)
+        if self.n + len(values) > len(self.y):
+            size = max(2 * len(self.y), self.n + len(values))
+            self.x = np.resize(self.x, size)
+            self.y = np.resize(self.y, size)
 
+        self.x[self.n:self.n + len(values)] = np.arange(self.n, self.n + len(values))
+        self.y[self.n:self.n + len(values)] = values
+        self.n += len(values)
+        self.line.set_data(self.x[:self.n], self.y[:self.n])
 
-def run_animation(filename):
+
+def run_animation(filenames):
     fig = plt.figure()
     ax = fig.add_subplot(1, 1, 1)
 
+    readers = [LogReader(filename) for filename in filenames]
+    series = [{} for _ in filenames]
+    limits = [0, np.inf, -np.inf]
+
     def animate(i):
-        try:
-            with open(filename, "rb") as f:
-                data = pickle.load(f)
-                ax.clear()
-                for label in data:
-                    # HACK: show only fitness during monitor
-                    if "fit" not in label:
-                        continue
-
-                    ax.plot(data[label], label=label)
-                # ax.legend()
-        except Exception:
-            pass
+        # Only records appended since the last tick are read and drawn
+        changed = False
+        for reader, lines in zip(readers, series):
+            for label, values in reader.read().items():
+                # HACK: show only fitness during monitor
+                if "fit" not in label or not values:
+                    continue
+
+                if label not in lines:
+                    line, = ax.plot([], [], label="%s %s" % (Path(reader.file).stem, label))
+                    lines[label] = Series(line)
+                lines[label].extend(values)
+
+                finite = [v for v in values if v is not None and np.isfinite(v)]
+                limits[0] = max(limits[0], lines[label].n)
+                if finite:
+                    limits[1] = min(limits[1], min(finite))
+                    limits[2] = max(limits[2], max(finite))
+                changed = True
+
+        if changed and np.isfinite(limits[1]):
+            margin = 0.05 * (limits[2] - limits[1]) or 0.05
+            ax.set_xlim(0, max(1, limits[0]))
+            ax.set_ylim(limits[1] - margin, limits[2] + margin)
+            # ax.legend()
 
     ani = animation.FuncAnimation(fig, animate, interval=1000)
     plt.show()
@@ -43,8 +80,8 @@ def run_animation(filename):
 
 def main():
 
-    filename = pick_file()
-    run_animation(filename)
+    filenames = pick_files()
+    run_animation(filenames)
 
 
 if __name__ == "__main__":
@@ -1,56 +1,32 @@
-from time import time
-
-from pyqcd.algorithms import *
-from pyqcd.alphabet import Alphabet
-from pyqcd.gates import CX, U3, I
-from pyqcd.logger import Logger
-from pyqcd.matrices import QFT
+import sys
+
+from pyqcd.runs import load_matrix, run_matrix
+
+# Default run matrix: 4 MLOA runs on QFT on 2 qubits
+RUN_MATRIX = {
+    "output": "data",
+    "runs": [
+        {
+            "target": "QFT",
+            "qubits": 2,
+            "gates": ["I", "U3", "CX"],
+            "solver": "MLOA",
+            "params": {"n_groups": 50, "group_size": 5, "circuit_size": 15},
+            "seeds": [0, 1, 2, 3],
+            "n_evals": 100000,
+        },
+    ],
+}
 
 
 def main():
-    """Submit several runs"""
-
-    qubits = 2
-    target_name = "QFT"
-    gates_set = [I, U3, CX]
-    n_runs = 4
-
-    target = QFT(qubits)
-    # Instantiate a custom set of gates, an alphabet whose words are gates
-    alphabet = Alphabet(Q=qubits)
-    alphabet.register_gates(gates_set)
-
-    for n_run in range(n_runs):
-
-        start_time = int(time())
-
-        solver = MLOA(target=target, alphabet=alphabet,
-                      n_groups=50, group_size=5, circuit_size=15)
-        #solver = GA(target=target, alphabet=alphabet, pop_size=50, circuit_size=15)
-        # Instantiate the logger class to keep track of fitness evolution
-
-        logger = Logger("data/%s/%s_%s%d.pickle" %
-                        (solver.__class__.__name__, start_time, target_name, qubits), True)
-        logger.add_variables(*solver.stats().keys())
-
-        while solver.n_evals < 100000:
-            # One step evolution
-            solver.evolve()
-
-            # Gather and save statistics
-            logger.register(**solver.stats())
-
-        print("=============================")
-        print("%s %s%d #%d" %
-              (solver.__class__.__name__, target_name, qubits, n_run))
-        print("Generations %d" % solver.gen)
-        print("Fitness evals %d" % solver.n_evals)
-        print("Score %0.5f" % solver.best.score)
-        print("%s" % solver.best)
-        print("=============================")
+    """Submit several runs: python multi_runs.py [run_matrix.json]
 
-        with open("data/%s/%s_%s%d.qasm" % (solver.__class__.__name__, start_time, target_name, qubits), 'w') as f:
-            f.write(solver.best.to_qasm())
+    Runs are scheduled over a process pool; runs whose output already exists
+    are skipped, so that an interrupted campaign resumes where it stopped.
+    """
+    matrix = load_matrix(sys.argv[1]) if len(sys.argv) > 1 else RUN_MATRIX
+    run_matrix(matrix)
 
 
 if __name__ == "__main__":
@@ -2,3 +2,4 @@ from .mc import MC
 from .ga import GA 
 from .gloa import GLOA
 from .mloa import MLOA
+from .islands import Islands
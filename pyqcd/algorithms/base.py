@@ -1,37 +1,86 @@
+import json
+import os
 import typing
 import numpy as np
 
-from pyqcd.circuit import Circuit
+from pyqcd.circuit import (Circuit, FitnessCache, UnitaryCache, early_exit_block_size, iter_unitaries,
+                           simulate_columns, stack_arrays, threshold_tr_distances)
 from pyqcd.alphabet import Alphabet
-from pyqcd.math_utils import tr_distance
+from pyqcd.gates import GATES
+from pyqcd.math_utils import REJECTED, batch_distance, random_states, sampled_tr_distance, tr_distance
+from pyqcd.parallel import BlockedEvaluator, ProcessEvaluator
+from pyqcd.population import Population
+from pyqcd.targets import ColumnsTarget
 
 
 class BaseSearch:
     """Common Base for search algorithms"""
 
     def __init__(self,
-                 target: np.ndarray,
+                 target: typing.Union[np.ndarray, ColumnsTarget],
                  alphabet: Alphabet,
                  circuit_size: int,
-                 mat_dist: typing.Callable = tr_distance) -> None:
+                 mat_dist: typing.Callable = tr_distance,
+                 unitary_cache: typing.Optional[UnitaryCache] = None,
+                 fitness_cache: typing.Optional[FitnessCache] = None,
+                 executor: typing.Optional[typing.Union[ProcessEvaluator, BlockedEvaluator]] = None,
+                 early_exit: bool = False,
+                 n_samples: typing.Optional[int] = None) -> None:
         """
         Initialize BaseSearch.
 
         Arguments:
-            target {np.ndarray} -- unitary target
+            target {typing.Union[np.ndarray, ColumnsTarget]} -- unitary target, or state / isometry
+                                          target (see pyqcd.targets) simulated on its input columns only
             alphabet {Alphabet} -- universal set alphabet
-            mat_dist {typing.Callable} -- matrix distance
-                                          (default: {tr_distance})
+            mat_dist {typing.Callable} -- matrix distance, tr_distance stands for the own distance
+                                          of state / isometry targets (default: {tr_distance})
+            unitary_cache {typing.Optional[UnitaryCache]} -- partial products cache used to
+                                          re-score edited circuits (default: {None})
+            fitness_cache {typing.Optional[FitnessCache]} -- fitness values of already scored
+                                          circuits, hits do not count as evaluations (default: {None})
+            executor {typing.Optional[typing.Union[ProcessEvaluator, BlockedEvaluator]]} -- evaluator
+                                          simulating circuits in place of the local simulator, built on
+                                          the same target and mat_dist (default: {None})
+            early_exit {bool} -- with tr_distance, stop simulating candidates proven unable to beat
+                                          their acceptance threshold and score them REJECTED (default: {False})
+            n_samples {typing.Optional[int]} -- estimate tr_distance on n_samples random input states
+                                          (see sampled_distances), circuits becoming best are re-scored
+                                          exactly (default: {None}, exact fitness)
         """
+        if isinstance(target, ColumnsTarget):
+            if executor is not None:
+                raise ValueError("Executors simulate unitary targets only")
+            if mat_dist is tr_distance:
+                mat_dist = target.mat_dist
+        if executor is not None and executor.mat_dist is not mat_dist:
+            raise ValueError("The executor computes %s, not %s" % (executor.mat_dist.__name__, mat_dist.__name__))
+        if n_samples is not None and (mat_dist is not tr_distance or isinstance(target, ColumnsTarget)):
+            raise ValueError("Sampled fitness estimates tr_distance to a unitary target")
+
         self.Q = int(np.log2(target.shape[0]))
         self.target = target
         self.alphabet = alphabet
         self.circuit_size = circuit_size
         self.mat_dist = mat_dist
+        self.batch_mat_dist = batch_distance(mat_dist)
+        self.unitary_cache = unitary_cache
+        self.fitness_cache = fitness_cache
+        self.executor = executor
+        self.early_exit = early_exit
+        self.n_samples = n_samples
 
         self.best = None
         self.gen = 0
         self.n_evals = 0
+        self.n_rejects = 0
+        # Exact re-checks of sampled fitness, half width of the interval of the estimated best score
+        self.n_exact = 0
+        self.best_ci = None
+        # Key and exact score of the last circuit re-checked
+        self._checked = None
+        if n_samples is not None:
+            self.set_samples(random_states(self.Q, n_samples))
 
     def stats(self) -> typing.Dict:
         """Return current stats
@@ -42,6 +91,14 @@ class BaseSearch:
         res = {}
         res['best_fit'] = self.best.score if self.best is not None else None
         res['n_evals'] = self.n_evals
+        if self.early_exit:
+            res['n_rejects'] = self.n_rejects
+        if self.n_samples is not None:
+            res['n_exact'] = self.n_exact
+            res['best_ci'] = self.best_ci
+        if self.fitness_cache is not None:
+            res['cache_hits'] = self.fitness_cache.hits
+            res['cache_misses'] = self.fitness_cache.misses
         return res
 
     def matrix_distance(self, circuit: Circuit) -> float:
@@ -54,7 +111,99 @@ class BaseSearch:
         Returns:
             float -- the distance
         """
-        return self.mat_dist(circuit.to_matrix(), self.target)
+        if isinstance(self.target, ColumnsTarget):
+            return self.mat_dist(self.target.simulate(circuit.gate_ids, circuit.qubits, circuit.params),
+                                 self.target.columns)
+        if self.executor is not None and self.unitary_cache is None:
+            return self.executor.distance(circuit.gate_ids, circuit.qubits, circuit.params)
+        return self.mat_dist(circuit.to_matrix(self.unitary_cache), self.target)
+
+    def unitaries_distance(self, matrices: np.ndarray) -> np.ndarray:
+        """Distances to the target of a stack of circuit unitaries
+
+        Arguments:
+            matrices {np.ndarray} -- (N,2**Q,2**Q) unitary matrices
+
+        Returns:
+            np.ndarray -- (N,) distances
+        """
+        if isinstance(self.target, ColumnsTarget):
+            return self.batch_mat_dist(self.target.select(matrices), self.target.columns)
+        return self.batch_mat_dist(matrices, self.target)
+
+    def set_samples(self, states: np.ndarray) -> None:
+        """Set the input states of sampled fitness
+
+        Arguments:
+            states {np.ndarray} -- (2**Q,n_samples) Haar random states
+        """
+        self.sample_states = states
+        self.sample_outputs = np.dot(self.target, states)
+
+    def sampled_distances(self,
+                          gate_ids: np.ndarray,
+                          qubits: np.ndarray,
+                          params: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Estimate the tr_distance to the target of circuits in padded array representation: the
+        sample states are pushed through each circuit U and compared with target @ states,
+        in O(n_samples 2**Q) per gate (see sampled_tr_distance)
+
+        Arguments:
+            gate_ids {np.ndarray} -- (N,L) gate ids, -1 for padding
+            qubits {np.ndarray} -- (N,L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (N,L,MAX_PARAMS) padded params
+
+        Returns:
+            typing.Tuple[np.ndarray, np.ndarray] -- (N,) estimated distances, half widths of their intervals
+        """
+        overlaps = np.empty((len(gate_ids), self.n_samples), dtype=complex)
+        lengths = np.sum(gate_ids >= 0, axis=1)
+        for idx, n in enumerate(lengths.tolist()):
+            outputs = simulate_columns(self.Q, gate_ids[idx, :n], qubits[idx, :n], params[idx, :n],
+                                       self.sample_states)
+            overlaps[idx] = np.sum(np.conjugate(self.sample_outputs) * outputs, axis=0)
+        return sampled_tr_distance(overlaps, 2**self.Q)
+
+    def exact_fitness(self, circuit: Circuit) -> float:
+        """Return total fitness with the exact distance, whatever the fitness mode
+
+        Arguments:
+            circuit {Circuit} -- a circuit obj
+
+        Returns:
+            float -- fitness
+        """
+        self.n_exact += 1
+        return self.matrix_distance(circuit) + self.circuit_cost(circuit)
+
+    def cached_distances(self,
+                         gate_ids: np.ndarray,
+                         qubits: np.ndarray,
+                         params: np.ndarray,
+                         partials: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        """Distances to the target of circuits in padded array representation, simulated one
+        by one through the unitary cache
+
+        Arguments:
+            gate_ids {np.ndarray} -- (N,L) gate ids, -1 for padding
+            qubits {np.ndarray} -- (N,L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (N,L,MAX_PARAMS) padded params
+            partials {typing.Optional[np.ndarray]} -- (N,) partial products of the circuits, or of
+                                                      their ancestors, updated in place (default: {None})
+
+        Returns:
+            np.ndarray -- (N,) distances
+        """
+        distances = np.empty(len(gate_ids))
+        lengths = np.sum(gate_ids >= 0, axis=1)
+        for idx, n in enumerate(lengths.tolist()):
+            circuit = Circuit.from_arrays(self.Q, gate_ids[idx, :n], qubits[idx, :n], params[idx, :n])
+            if partials is not None:
+                circuit._partials = partials[idx]
+            distances[idx] = self.mat_dist(circuit.to_matrix(self.unitary_cache), self.target)
+            if partials is not None:
+                partials[idx] = circuit._partials
+        return distances
 
     def circuit_cost(self, circuit: Circuit) -> float:
         """Implementation cost of circuit
@@ -67,17 +216,195 @@ class BaseSearch:
         """
         return 0
 
-    def fitness(self, circuit: Circuit) -> float:
+    def fitness(self, circuit: Circuit, threshold: typing.Optional[float] = None) -> float:
         """Return total fitness: distance + cost
 
         Arguments:
             circuit {Circuit} -- a circuit obj
+            threshold {typing.Optional[float]} -- fitness to beat for the circuit to be accepted,
+                                                  used by early exit (default: {None})
 
         Returns:
-            float -- fitness
+            float -- fitness, REJECTED if early exit proved it is above threshold
         """
-        self.n_evals += 1
-        return self.matrix_distance(circuit) + self.circuit_cost(circuit)
+        if self.n_samples is not None or (threshold is not None and self.uses_early_exit(1)):
+            thresholds = None if threshold is None else np.array([threshold], dtype=float)
+            return self.arrays_fitness(circuit.gate_ids[None], circuit.qubits[None], circuit.params[None],
+                                       thresholds)[0]
+
+        if self.fitness_cache is None:
+            self.n_evals += 1
+            return self.matrix_distance(circuit) + self.circuit_cost(circuit)
+
+        key = self.fitness_cache.key(circuit)
+        value = self.fitness_cache.get(key)
+        if value is None:
+            self.n_evals += 1
+            value = self.matrix_distance(circuit) + self.circuit_cost(circuit)
+            self.fitness_cache.put(key, value)
+        return value
+
+    def uses_early_exit(self, N: int) -> bool:
+        """Whether thresholds given to the fitness methods of N circuits are used to stop evaluations early:
+        with exact tr_distance, simulated locally, on unitaries split in several column blocks"""
+        return (self.early_exit and self.mat_dist is tr_distance and self.executor is None and self.n_samples is None
+                and early_exit_block_size(N, self.Q) < 2**self.Q)
+
+    def batch_fitness(self,
+                      circuits: typing.Sequence[Circuit],
+                      thresholds: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        """Return total fitness of several circuits, simulated as one batch
+
+        Arguments:
+            circuits {typing.Sequence[Circuit]} -- circuit objs
+            thresholds {typing.Optional[np.ndarray]} -- (N,) fitness to beat, see fitness (default: {None})
+
+        Returns:
+            np.ndarray -- (N,) fitness array
+        """
+        partials = np.full(len(circuits), None, dtype=object)
+        for idx, c in enumerate(circuits):
+            partials[idx] = c._partials
+        scores = self.arrays_fitness(*stack_arrays(circuits), thresholds, partials)
+        for c, entry in zip(circuits, partials):
+            c._partials = entry
+        return scores
+
+    def arrays_fitness(self,
+                       gate_ids: np.ndarray,
+                       qubits: np.ndarray,
+                       params: np.ndarray,
+                       thresholds: typing.Optional[np.ndarray] = None,
+                       partials: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        """Return total fitness of circuits in padded array representation, simulated as one batch.
+        With a fitness cache, only the distinct circuits not in cache are simulated.
+
+        Arguments:
+            gate_ids {np.ndarray} -- (N,L) gate ids, -1 for padding
+            qubits {np.ndarray} -- (N,L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (N,L,MAX_PARAMS) padded params
+            thresholds {typing.Optional[np.ndarray]} -- (N,) fitness to beat, see fitness (default: {None})
+            partials {typing.Optional[np.ndarray]} -- (N,) partial products of the circuits in the
+                                                      unitary cache, updated in place (default: {None})
+
+        Returns:
+            np.ndarray -- (N,) fitness array
+        """
+        if self.fitness_cache is None or not len(gate_ids):
+            return self.simulate_fitness(gate_ids, qubits, params, thresholds, partials)
+
+        # Look up every circuit, simulate once each distinct circuit not in cache
+        scores = np.empty(len(gate_ids))
+        keys = self.fitness_cache.keys(gate_ids, qubits, params)
+        missing: typing.Dict[bytes, typing.List[int]] = {}
+        for idx, key in enumerate(keys):
+            if key in missing:
+                missing[key].append(idx)
+                self.fitness_cache.hits += 1
+                continue
+
+            value = self.fitness_cache.get(key)
+            if value is None:
+                missing[key] = [idx]
+            else:
+                scores[idx] = value
+
+        if missing:
+            rows = [index[0] for index in missing.values()]
+            if thresholds is not None:
+                # Duplicates share the simulation, it must beat the loosest of their thresholds
+                thresholds = np.array([np.max(np.asarray(thresholds)[index]) for index in missing.values()])
+            missing_partials = None if partials is None else partials[rows]
+            values = self.simulate_fitness(gate_ids[rows], qubits[rows], params[rows], thresholds, missing_partials)
+            for row, (key, index), value in zip(range(len(rows)), missing.items(), values.tolist()):
+                scores[index] = value
+                if value != REJECTED:
+                    self.fitness_cache.put(key, value)
+                if partials is not None:
+                    for idx in index:
+                        partials[idx] = missing_partials[row]
+        return scores
+
+    def simulate_fitness(self,
+                         gate_ids: np.ndarray,
+                         qubits: np.ndarray,
+                         params: np.ndarray,
+                         thresholds: typing.Optional[np.ndarray] = None,
+                         partials: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        """Simulate circuits in padded array representation as one batch and return their total fitness
+
+        Arguments:
+            gate_ids {np.ndarray} -- (N,L) gate ids, -1 for padding
+            qubits {np.ndarray} -- (N,L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (N,L,MAX_PARAMS) padded params
+            thresholds {typing.Optional[np.ndarray]} -- (N,) fitness to beat, see fitness (default: {None})
+            partials {typing.Optional[np.ndarray]} -- (N,) partial products of the circuits in the
+                                                      unitary cache, updated in place (default: {None})
+
+        Returns:
+            np.ndarray -- (N,) fitness array
+        """
+        if not len(gate_ids):
+            return np.empty(0)
+
+        if type(self).circuit_cost is BaseSearch.circuit_cost:
+            # No implementation cost
+            costs = np.zeros(len(gate_ids))
+        else:
+            lengths = np.sum(gate_ids >= 0, axis=1)
+            costs = np.array([self.circuit_cost(Circuit.from_arrays(self.Q, g[:n], q[:n], p[:n]))
+                              for g, q, p, n in zip(gate_ids, qubits, params, lengths)], dtype=float)
+
+        self.n_evals += len(gate_ids)
+        if thresholds is not None and self.uses_early_exit(len(gate_ids)):
+            distances = threshold_tr_distances(self.Q, gate_ids, qubits, params, self.target,
+                                               np.asarray(thresholds, dtype=float) - costs)
+            self.n_rejects += int(np.count_nonzero(distances == REJECTED))
+        elif self.n_samples is not None:
+            distances, _ = self.sampled_distances(gate_ids, qubits, params)
+        elif isinstance(self.target, ColumnsTarget):
+            outputs = self.target.batch_simulate(gate_ids, qubits, params)
+            distances = self.batch_mat_dist(outputs, self.target.columns)
+        elif self.unitary_cache is not None:
+            distances = self.cached_distances(gate_ids, qubits, params, partials)
+        elif self.executor is not None:
+            distances = self.executor.distances(gate_ids, qubits, params)
+        else:
+            distances = np.empty(len(gate_ids))
+            for rows, matrices in iter_unitaries(self.Q, gate_ids, qubits, params):
+                distances[rows] = self.unitaries_distance(matrices)
+
+        return distances + costs
+
+    def compute_population_scores(self, pop: Population, thresholds: typing.Optional[np.ndarray] = None) -> None:
+        """Score, as one batch, the individuals of a population not yet scored
+
+        Arguments:
+            pop {Population} -- a population obj
+            thresholds {typing.Optional[np.ndarray]} -- (len(pop),) fitness to beat, see fitness (default: {None})
+        """
+        index = pop.unscored()
+        if thresholds is not None:
+            thresholds = np.asarray(thresholds)[index]
+        partials = pop.partials[index]
+        pop.scores[index] = self.arrays_fitness(pop.gate_ids[index], pop.qubits[index], pop.params[index],
+                                                thresholds, partials)
+        pop.partials[index] = partials
+
+    def compute_scores(self,
+                       circuits: typing.Sequence[Circuit],
+                       thresholds: typing.Optional[typing.Sequence[float]] = None) -> None:
+        """Score, as one batch, the circuits not yet scored
+
+        Arguments:
+            circuits {typing.Sequence[Circuit]} -- circuit objs
+            thresholds {typing.Optional[typing.Sequence[float]]} -- fitness to beat, see fitness (default: {None})
+        """
+        index = [idx for idx, c in enumerate(circuits) if c.score is None]
+        if thresholds is not None:
+            thresholds = np.array([thresholds[idx] for idx in index], dtype=float)
+        for idx, score in zip(index, self.batch_fitness([circuits[idx] for idx in index], thresholds)):
+            circuits[idx].score = score
 
     def get_random_circuit(self) -> Circuit:
         """Return a random circuit
@@ -85,7 +412,7 @@ class BaseSearch:
         Returns:
             Circuit -- a circuit obj
         """
-        return Circuit(self.Q, self.alphabet.get_random(self.circuit_size))
+        return Circuit.from_arrays(self.Q, *self.alphabet.get_random_arrays(self.circuit_size))
 
     def update_best(self, circuit: Circuit) -> None:
         """Update current best if circuit is better
@@ -93,10 +420,131 @@ class BaseSearch:
         Arguments:
             circuit {Circuit} -- a circuit obj
         """
-        if self.best is None or circuit.score < self.best.score:
+        if self.best is not None and not circuit.score < self.best.score:
+            return
+        if self.n_samples is None:
             self.best = circuit.clone()
             # print("New best @ gen %d, score %0.5f\n%s" %
             #      (self.gen, self.best.score, self.best))
+            return
+
+        # Sampled scores are estimates: the circuit is accepted on its exact score,
+        # computed once for a circuit proposed again (e.g. the same population best)
+        key = circuit.gate_ids.tobytes() + circuit.qubits.tobytes() + circuit.params.tobytes()
+        if self._checked is None or self._checked[0] != key:
+            self._checked = (key, self.exact_fitness(circuit))
+        score = self._checked[1]
+        if self.best is None or score < self.best.score:
+            self.best = circuit.clone()
+            self.best.score = score
+            _, ci = self.sampled_distances(circuit.gate_ids[None], circuit.qubits[None], circuit.params[None])
+            self.best_ci = float(ci[0])
+
+    def checkpoint_state(self) -> typing.Dict[str, np.ndarray]:
+        """Return the arrays and counters defining the search state, extended by subclasses
+
+        Returns:
+            typing.Dict[str, np.ndarray] -- named arrays
+        """
+        state = {'gen': np.array(self.gen), 'n_evals': np.array(self.n_evals), 'n_rejects': np.array(self.n_rejects)}
+        if self.n_samples is not None:
+            state.update(sample_states=self.sample_states, n_exact=np.array(self.n_exact),
+                         best_ci=np.array(np.nan if self.best_ci is None else self.best_ci))
+            if self._checked is not None:
+                state.update(checked_key=np.frombuffer(self._checked[0], dtype=np.uint8),
+                             checked_score=np.array(self._checked[1]))
+        if self.fitness_cache is not None:
+            cache_state = self.fitness_cache.checkpoint_state()
+            state.update({'fitness_cache_' + key: value for key, value in cache_state.items()})
+        if self.best is not None:
+            state.update(pack_circuits('best', [self.best]))
+        return state
+
+    def restore_state(self, state: typing.Dict[str, np.ndarray]) -> None:
+        """Restore the search state from the arrays of checkpoint_state
+
+        Arguments:
+            state {typing.Dict[str, np.ndarray]} -- named arrays
+        """
+        self.gen = int(state['gen'])
+        self.n_evals = int(state['n_evals'])
+        self.n_rejects = int(state['n_rejects']) if 'n_rejects' in state else 0
+        if self.n_samples is not None and 'sample_states' in state:
+            self.set_samples(state['sample_states'])
+            self.n_exact = int(state['n_exact'])
+            self.best_ci = None if np.isnan(state['best_ci']) else float(state['best_ci'])
+            self._checked = (state['checked_key'].tobytes(), float(state['checked_score'])) \
+                if 'checked_key' in state else None
+        if self.fitness_cache is not None and 'fitness_cache_values' in state:
+            self.fitness_cache.restore_state({key[len('fitness_cache_'):]: value for key, value in state.items()
+                                              if key.startswith('fitness_cache_')})
+        self.best = unpack_circuits(self.Q, 'best', state)[0] if 'best_gate_ids' in state else None
+
+    def rng_state(self) -> typing.Dict[str, np.ndarray]:
+        """Return the state of the global random generator and of the alphabet generator, if any
+
+        Returns:
+            typing.Dict[str, np.ndarray] -- named arrays
+        """
+        name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+        state = {'rng_keys': keys, 'rng_pos': np.array(pos), 'rng_has_gauss': np.array(has_gauss),
+                 'rng_cached_gaussian': np.array(cached_gaussian)}
+        if isinstance(self.alphabet.rng, np.random.Generator):
+            state['alphabet_rng'] = np.array(json.dumps(self.alphabet.rng.bit_generator.state))
+        return state
+
+    def set_rng_state(self, state: typing.Dict[str, np.ndarray]) -> None:
+        """Restore the random generators from the arrays of rng_state
+
+        Arguments:
+            state {typing.Dict[str, np.ndarray]} -- named arrays
+        """
+        np.random.set_state(('MT19937', state['rng_keys'], int(state['rng_pos']), int(state['rng_has_gauss']),
+                             float(state['rng_cached_gaussian'])))
+        if 'alphabet_rng' in state and isinstance(self.alphabet.rng, np.random.Generator):
+            self.alphabet.rng.bit_generator.state = json.loads(state['alphabet_rng'].item())
+
+    def save_checkpoint(self, file: str, **extra) -> None:
+        """Save search state and random generator state, replacing file atomically
+
+        Arguments:
+            file {str} -- checkpoint file (.npz)
+            extra -- scalars saved along, returned by load_checkpoint
+        """
+        state = self.checkpoint_state()
+        state.update(self.rng_state())
+        state.update(gate_names=np.array([gate.__name__ for gate in GATES]))
+        state.update({'extra_%s' % key: np.array(value) for key, value in extra.items()})
+
+        tmp = file + ".tmp.npz"
+        np.savez(tmp, **state)
+        os.replace(tmp, file)
+
+    def load_checkpoint(self, file: str) -> typing.Dict:
+        """Restore a search saved by save_checkpoint, on a solver built with the same arguments
+
+        Arguments:
+            file {str} -- checkpoint file (.npz)
+
+        Returns:
+            typing.Dict -- extra scalars given to save_checkpoint
+        """
+        with np.load(file) as data:
+            state = dict(data)
+
+        # Gate ids of the checkpoint session to gate ids of this session
+        ids = {gate.__name__: gid for gid, gate in enumerate(GATES)}
+        missing = [name for name in state['gate_names'].tolist() if name not in ids]
+        if missing:
+            raise ValueError("Unknown gates in checkpoint: %s" % missing)
+        remap = np.append(np.array([ids[name] for name in state['gate_names'].tolist()], dtype=np.int16), -1)
+        for key in state:
+            if key.endswith('_gate_ids'):
+                state[key] = remap[state[key]]
+
+        self.restore_state(state)
+        self.set_rng_state(state)
+        return {key[len('extra_'):]: state[key].item() for key in state if key.startswith('extra_')}
 
     def end(self) -> None:
 
@@ -109,3 +557,18 @@ class BaseSearch:
 
         # with open('best.qasm', 'w') as f:
         #    f.write(self.best.to_qasm())
+
+
+def pack_circuits(prefix: str, circuits: typing.Sequence[Circuit]) -> typing.Dict[str, np.ndarray]:
+    """Return padded arrays and scores of circuits, named prefix_*, for a checkpoint"""
+    gate_ids, qubits, params = stack_arrays(circuits)
+    scores = np.array([np.nan if c.score is None else c.score for c in circuits], dtype=float)
+    return {prefix + '_gate_ids': gate_ids, prefix + '_qubits': qubits,
+            prefix + '_params': params, prefix + '_scores': scores}
+
+
+def unpack_circuits(Q: int, prefix: str, state: typing.Dict[str, np.ndarray]) -> typing.List[Circuit]:
+    """Return the circuits saved by pack_circuits"""
+    pop = Population(Q, state[prefix + '_gate_ids'], state[prefix + '_qubits'],
+                     state[prefix + '_params'], state[prefix + '_scores'])
+    return pop.to_circuits()
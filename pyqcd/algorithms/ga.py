@@ -11,7 +11,8 @@ class GA(BaseSearch):
                  circuit_size: int,
                  cx_pb: float = 0.7,
                  mut_pb: float = 0.15,
-                 mat_dist: typing.Callable = tr_distance) -> None:
+                 mat_dist: typing.Callable = tr_distance,
+                 **kwargs) -> None:
         """
         Arguments:
             target {np.ndarray} -- unitary target
@@ -21,15 +22,16 @@ class GA(BaseSearch):
             cx_pb {float} -- probability of crossover (default: 0.7)
             mut_pb {float} -- probability of mutation (default: 0.15)
             mat_dist {typing.Callable} -- matrix distance (default: {tr_distance})
+            kwargs -- forwarded to BaseSearch (e.g. unitary_cache, fitness_cache, executor)
         """
-        super().__init__(target, alphabet, circuit_size, mat_dist)
+        super().__init__(target, alphabet, circuit_size, mat_dist, **kwargs)
 
         self.cx_pb = cx_pb
         self.mut_pb = mut_pb
 
         self.pop_size = pop_size
 
-        self.pop = [self.get_random_circuit() for _ in range(self.pop_size)]
+        self.pop = Population.random(self.Q, self.alphabet, self.pop_size, self.circuit_size)
         self.compute_fitness()
 
         # Extra stats initialization
@@ -39,119 +41,90 @@ class GA(BaseSearch):
 
     def stats(self) -> typing.Dict:
         res = super().stats()
-        res['mean_fit'] = np.mean([x.score for x in self.pop])
-        res['mean_len'] = np.mean([len(x) for x in self.pop])
+        res['mean_fit'] = np.mean(self.pop.scores)
+        res['mean_len'] = np.mean(self.pop.lengths)
         res['n_muts'] = self.n_muts
         res['n_cxs'] = self.n_cxs
         res['n_fixs'] = self.n_fixs
         return res
 
+    def checkpoint_state(self) -> typing.Dict[str, np.ndarray]:
+        state = super().checkpoint_state()
+        state.update(pop_gate_ids=self.pop.gate_ids, pop_qubits=self.pop.qubits,
+                     pop_params=self.pop.params, pop_scores=self.pop.scores,
+                     n_muts=np.array(self.n_muts), n_cxs=np.array(self.n_cxs), n_fixs=np.array(self.n_fixs))
+        return state
+
+    def restore_state(self, state: typing.Dict[str, np.ndarray]) -> None:
+        super().restore_state(state)
+        self.pop = Population(self.Q, state['pop_gate_ids'], state['pop_qubits'],
+                              state['pop_params'], state['pop_scores'])
+        self.n_muts = int(state['n_muts'])
+        self.n_cxs = int(state['n_cxs'])
+        self.n_fixs = int(state['n_fixs'])
+
     def evolve(self) -> None:
         self.fixing()
         self.new_generation()
         self.gen += 1
 
-        best = min(self.pop, key=lambda x: x.score)
+        best = self.pop[self.pop.best()]
         self.update_best(best)
 
     def new_generation(self) -> None:
         """One evolution step"""
-        np.random.shuffle(self.pop)
-
-        for idx, (p0, p1) in enumerate(zip(self.pop[::2], self.pop[1::2])):
-            c0, c1 = p0.clone(), p1.clone()
+        pop = self.pop.take(np.random.permutation(len(self.pop)))
 
-            if np.random.rand() < self.cx_pb:
-                self.mate(c0, c1)
+        # Consecutive individuals are paired, the odd one out is left untouched
+        a = np.arange(0, len(pop) - 1, 2)
+        b = a + 1
+        children = pop.take(np.arange(2 * len(a)))
 
-            if np.random.rand() < self.mut_pb:
-                self.mutate(c0)
+        mates = np.random.rand(len(a)) < self.cx_pb
+        self.mate(children, a[mates], b[mates])
 
-            if np.random.rand() < self.mut_pb:
-                self.mutate(c1)
+        mutants = np.flatnonzero(np.random.rand(len(children)) < self.mut_pb)
+        self.mutate(children, mutants)
 
-            if c0.score is None:
-                c0.score = self.fitness(c0)
-            if c1.score is None:
-                c1.score = self.fitness(c1)
+        # Score all the offspring at once, a child only matters if it beats its parent
+        self.compute_population_scores(children, pop.scores[:len(children)])
 
-            # Applying elitism during selection
-            if c0.score <= p0.score:
-                self.pop[idx] = c0
-            if c1.score <= p1.score:
-                self.pop[idx+1] = c1
+        # Applying elitism during selection
+        better = np.flatnonzero(children.scores <= pop.scores[:len(children)])
+        pop.put(better, children.take(better))
+        self.pop = pop
 
     def fixing(self) -> None:
         """Substitute empty individuals with a new random one"""
-        for idx, p in enumerate(self.pop):
-            if len(p) == 0:
-                self.pop[idx] = self.get_random_circuit()
-                self.pop[idx].score = self.fitness(self.pop[idx])
-                self.n_fixs += 1
+        empty = np.flatnonzero(self.pop.lengths == 0)
+        if len(empty):
+            self.pop.put(empty, Population.random(self.Q, self.alphabet, len(empty), self.circuit_size))
+            self.n_fixs += len(empty)
+        self.compute_fitness()
 
     def compute_fitness(self) -> None:
         """Compute fitness for all individuals not yet scored"""
-        for p in self.pop:
-            if p.score is None:
-                p.score = self.fitness(p)
-
-    def mutate(self, p: Circuit) -> Circuit:
-        """Single point mutation: a random instruction is removed, changed or added"""
-        mode = np.random.randint(3)
-
-        if mode is 0:
-            # DELETE random instruction
-            idx = np.random.randint(len(p))
-            p.instructions.pop(idx)
-        elif mode is 1:
-            # CHANGE random instruction idx
-            idx = np.random.randint(len(p))
-
-            # Mutation mode
-            mut_mode = np.random.randint(3)
-
-            if mut_mode is 0:
-                # NEW instruction
-                p.instructions[idx] = self.alphabet.get_random()[0]
-            elif mut_mode is 1:
-                # QUBITS mutation
-                qubits = self.alphabet.get_random_qubits(
-                    p.instructions[idx].gate.n_qubits)
-                p.instructions[idx].qubits = qubits
-            else:
-                # PARAMS mutation
-                params = self.alphabet.get_random_angles(
-                    p.instructions[idx].gate.n_params)
-                p.instructions[idx].params = params
-        else:
-            # INSERT random instruction in random position
-            idx = np.random.randint(len(p)+1)
-            p.instructions.insert(idx, self.alphabet.get_random()[0])
-
-        p.score = None
-
-        self.n_muts += 1
-
-        return p
-
-    def mate(self, p0: Circuit, p1: Circuit) -> typing.Tuple[Circuit]:
-        """Perform one point crossover"""
-        idx = np.random.randint(min(len(p0), len(p1)))
-
-        p0.instructions[:idx], p1.instructions[:idx] = p1.instructions[:idx], p0.instructions[:idx]
-
-        p0.score = None
-        p1.score = None
-
-        self.n_cxs += 1
-
-        return p0, p1
-
-    def roulette_selection(self, n: int = 1) -> Circuit:
+        self.compute_population_scores(self.pop)
+
+    def mutate(self, pop: Population, index: np.ndarray) -> Population:
+        """Single point mutation of individuals in index: a random instruction is removed, changed or added"""
+        pop.mutate(index, self.alphabet)
+        self.n_muts += len(index)
+        return pop
+
+    def mate(self, pop: Population, a: np.ndarray, b: np.ndarray) -> Population:
+        """Perform one point crossover between individuals a[i] and b[i]"""
+        points = np.floor(np.random.rand(len(a)) *
+                          np.minimum(pop.lengths[a], pop.lengths[b])).astype(int)
+        pop.crossover(a, b, points)
+        self.n_cxs += len(a)
+        return pop
+
+    def roulette_selection(self, n: int = 1) -> typing.List[Circuit]:
         # BUG: yields incorrect selection for minimizing problems
-        scores = [x.score for x in self.pop]
-        return np.random.choice(self.pop, size=n, p=scores/np.sum(scores))
+        scores = self.pop.scores
+        idxs = np.random.choice(len(self.pop), size=n, p=scores/np.sum(scores))
+        return [self.pop[idx] for idx in idxs]
 
     def tournament_selection(self, t_size: int) -> Circuit:
-        selection = np.random.choice(self.pop, size=t_size, replace=False)
-        return min(selection, key=lambda x: x.score)
+        return self.pop[self.pop.tournament_selection(t_size)[0]]
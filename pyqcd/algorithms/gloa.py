@@ -16,7 +16,8 @@ class GLOA(BaseSearch):
                  group_size: int,
                  circuit_size: int,
                  weights: np.ndarray = np.array([0.7, 0.15, 0.15]),
-                 mat_dist: typing.Callable = tr_distance) -> None:
+                 mat_dist: typing.Callable = tr_distance,
+                 **kwargs) -> None:
         """        
         Arguments:
             target {np.ndarray} -- unitary target
@@ -27,8 +28,9 @@ class GLOA(BaseSearch):
             weights {np.ndarray} -- weights of respectively current, leader and random 
                                     in one-way crossover (default: {np.array([0.7,0.15,0.15])})
             mat_dist {typing.Callable} -- matrix distance (default: {tr_distance})
+            kwargs -- forwarded to BaseSearch (e.g. unitary_cache, fitness_cache, executor)
         """
-        super().__init__(target, alphabet, circuit_size, mat_dist)
+        super().__init__(target, alphabet, circuit_size, mat_dist, **kwargs)
 
         self.weights = weights
         self.n_groups = n_groups
@@ -59,6 +61,19 @@ class GLOA(BaseSearch):
         res['n_migs'] = self.n_migs
         return res
 
+    def checkpoint_state(self) -> typing.Dict[str, np.ndarray]:
+        state = super().checkpoint_state()
+        state.update(pack_circuits('groups', [p for group in self.groups for p in group]))
+        state.update(n_muts=np.array(self.n_muts), n_migs=np.array(self.n_migs))
+        return state
+
+    def restore_state(self, state: typing.Dict[str, np.ndarray]) -> None:
+        super().restore_state(state)
+        circuits = unpack_circuits(self.Q, 'groups', state)
+        self.groups = [circuits[i:i + self.group_size] for i in range(0, len(circuits), self.group_size)]
+        self.n_muts = int(state['n_muts'])
+        self.n_migs = int(state['n_migs'])
+
     def evolve(self) -> None:
         # Next generation
         self.mutation()
@@ -73,25 +88,21 @@ class GLOA(BaseSearch):
         self.update_best(best)
 
     def compute_fitness(self) -> None:
-        for group in self.groups:
-            for p in group:
-                if p.score is None:
-                    p.score = self.fitness(p)
+        self.compute_scores([p for group in self.groups for p in group])
 
     def mutation(self) -> None:
         """Perform mutation and recombination between members of the same group"""
-        for gid, group in enumerate(self.groups):
-            leader = min(group, key=lambda x: x.score)
+        pop = Population.from_circuits(self.Q, [p for group in self.groups for p in group])
+        leaders = pop.take(np.repeat(pop.leaders(self.group_size), self.group_size))
+        randoms = Population.random(self.Q, self.alphabet, len(pop), self.circuit_size)
 
-            for idx, p in enumerate(group):
-                random = self.get_random_circuit()
+        # Recombine and score the individuals of all groups at once
+        candidates = pop.combine(leaders, randoms, self.weights)
+        self.compute_population_scores(candidates, pop.scores)
 
-                new_circuit = self.combine(p, leader, random)
-                new_circuit.score = self.fitness(new_circuit)
-
-                if new_circuit.score < p.score:
-                    self.groups[gid][idx] = new_circuit
-                    self.n_muts += 1
+        for idx in np.flatnonzero(candidates.scores < pop.scores):
+            self.groups[idx // self.group_size][idx % self.group_size] = candidates[idx]
+            self.n_muts += 1
 
     def migration(self) -> None:
         """Perform one-way-crossover: unidirectional migration between different groups"""
@@ -106,33 +117,59 @@ class GLOA(BaseSearch):
 
                 # Clone receiver and substitute an instruction
                 new = self.groups[x][j].clone()
-                new.instructions[k] = self.groups[i][j].instructions[k].clone()
-                new.score = self.fitness(new)
+                new[k] = self.groups[i][j][k]
+                new.score = self.fitness(new, self.groups[x][j].score)
 
                 # Substitute the individual if new is fittest
                 if new.score < self.groups[x][j].score:
                     self.groups[x][j] = new
                     self.n_migs += 1
 
+    def emigrants(self, n_genes: int) -> typing.List[Instruction]:
+        """Return n_genes instructions drawn from the group leaders, to be sent to other islands
+
+        Arguments:
+            n_genes {int} -- number of instructions
+
+        Returns:
+            typing.List[Instruction] -- instruction objs
+        """
+        leaders = [min(group, key=lambda x: x.score) for group in self.groups]
+        leaders = [leader for leader in leaders if len(leader)]
+        if not leaders:
+            return []
+
+        genes = []
+        for _ in range(n_genes):
+            leader = leaders[np.random.randint(len(leaders))]
+            genes.append(leader[np.random.randint(len(leader))])
+        return genes
+
+    def immigrate(self, genes: typing.Sequence[Instruction]) -> None:
+        """Migration from other islands: each gene substitutes an instruction of a random
+        individual, which is replaced if fitter
+
+        Arguments:
+            genes {typing.Sequence[Instruction]} -- instructions received from other islands
+        """
+        candidates = []
+        for gene in genes:
+            x = np.random.randint(self.n_groups)
+            j = np.random.randint(self.group_size)
+            new = self.groups[x][j].clone()
+            if not len(new):
+                continue
+            new[np.random.randint(len(new))] = gene
+            candidates.append((x, j, new))
+
+        self.compute_scores([new for _, _, new in candidates],
+                            [self.groups[x][j].score for x, j, _ in candidates])
+        for x, j, new in candidates:
+            if new.score < self.groups[x][j].score:
+                self.groups[x][j] = new
+                self.n_migs += 1
+
     def combine(self, current: Circuit, leader: Circuit, random: Circuit) -> Circuit:
         """Generate a new circuit combining current, leader and random"""
-        p = Circuit(self.Q, [])
-        for instr in zip(current.instructions, leader.instructions, random.instructions):
-
-            if instr[0].n_params() > 0 and instr[0].gate == instr[1].gate and instr[0].gate == instr[2].gate:
-                # Combine parameters arithmetically
-                params = np.array([x.params for x in instr])
-                new_params = np.sum((params.T * self.weights).T, axis=0)
-                new_qubits = instr[np.random.choice(
-                    np.arange(3), p=self.weights)].qubits
-
-                new_instr = Instruction(instr[0].gate, new_qubits, new_params)
-                p.append(new_instr)
-            else:
-                new_instr = np.random.choice(instr, p=self.weights).clone()
-                p.append(new_instr)
-
-        while len(p) < len(current.instructions):
-            p.append(current.instructions[len(p)].clone())
-
-        return p
+        pop, leaders, randoms = [Population.from_circuits(self.Q, [x]) for x in [current, leader, random]]
+        return pop.combine(leaders, randoms, self.weights)[0]
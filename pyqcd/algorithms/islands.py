@@ -0,0 +1,193 @@
+import multiprocessing
+from multiprocessing.connection import Connection
+
+from .base import *
+from .gloa import GLOA
+
+from pyqcd.circuit import Circuit
+
+# Island stats summed into the stats of the model
+COUNTERS = ['n_evals', 'n_rejects', 'n_exact', 'cache_hits', 'cache_misses', 'n_muts', 'n_migs', 'n_refs']
+
+
+def _island(conn: Connection,
+            solver_cls: typing.Type[GLOA],
+            args: typing.Tuple,
+            kwargs: typing.Dict,
+            seed: int) -> None:
+    """Island process: evolve a solver on request, exchanging genes with the other islands
+
+    Each request is (n_gens, immigrants, n_genes): immigrants are applied, the solver
+    evolves n_gens generations and replies with its stats, best and n_genes emigrants.
+    A "checkpoint" request replies with the solver and random generator states,
+    a ("restore", state) request restores them and replies with the stats.
+    A None request stops the island.
+    """
+    np.random.seed(seed)
+    alphabet = args[1]
+    if isinstance(alphabet.rng, np.random.Generator):
+        # Every island got a copy of the same generator state
+        alphabet.rng = np.random.default_rng(seed)
+    solver = solver_cls(*args, **kwargs)
+    conn.send((solver.stats(), solver.best.instructions, solver.best.score, []))
+
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        if request == "checkpoint":
+            state = solver.checkpoint_state()
+            state.update(solver.rng_state())
+            conn.send(state)
+            continue
+        if request[0] == "restore":
+            solver.restore_state(request[1])
+            solver.set_rng_state(request[1])
+            conn.send(solver.stats())
+            continue
+
+        n_gens, immigrants, n_genes = request
+        solver.immigrate(immigrants)
+        for _ in range(n_gens):
+            solver.evolve()
+        conn.send((solver.stats(), solver.best.instructions, solver.best.score, solver.emigrants(n_genes)))
+    conn.close()
+
+
+class Islands(BaseSearch):
+    """Island model of a group based solver (GLOA, MLOA).
+
+    Each island is a solver on a block of groups evolving in its own process.
+    Every migration_interval generations, islands send n_genes instructions of
+    their group leaders to the next island of a ring, where they are migrated
+    into random individuals. Stats are those of a single solver on all the groups:
+    counters are summed over the islands, best_ci is that of the island holding the best.
+    Checkpoints gather the solver and random generator states of every island.
+    """
+
+    def __init__(self,
+                 solver_cls: typing.Type[GLOA],
+                 target: np.ndarray,
+                 alphabet: Alphabet,
+                 n_islands: int,
+                 n_groups: int,
+                 group_size: int,
+                 circuit_size: int,
+                 migration_interval: int = 10,
+                 n_genes: typing.Optional[int] = None,
+                 seed: typing.Optional[int] = None,
+                 **kwargs) -> None:
+        """
+        Arguments:
+            solver_cls {typing.Type[GLOA]} -- solver of each island, GLOA or MLOA
+            target {np.ndarray} -- unitary target
+            alphabet {Alphabet} -- universal set alphabet
+            n_islands {int} -- number of islands (i.e. processes)
+            n_groups {int} -- number of groups per island
+            group_size {int} -- size of a group
+            circuit_size {int} -- size of an individual (i.e. number of instructions)
+            migration_interval {int} -- generations between two exchanges (default: {10})
+            n_genes {typing.Optional[int]} -- instructions sent by each island per exchange
+                                              (default: {None}, one per individual of a group)
+            seed {typing.Optional[int]} -- root seed of the islands (default: {None})
+            kwargs -- forwarded to each island solver (e.g. weights, mat_dist, fitness_cache)
+        """
+        super().__init__(target, alphabet, circuit_size, kwargs.get('mat_dist', tr_distance))
+
+        self.solver_cls = solver_cls
+        self.n_islands = n_islands
+        self.n_groups = n_groups
+        self.group_size = group_size
+        self.migration_interval = migration_interval
+        self.n_genes = group_size if n_genes is None else n_genes
+
+        seeds = [s.generate_state(1)[0] for s in np.random.SeedSequence(seed).spawn(n_islands)]
+        args = (target, alphabet, n_groups, group_size, circuit_size)
+
+        self._conns = []
+        self._processes = []
+        for island_seed in seeds:
+            conn, island_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_island, daemon=True,
+                                              args=(island_conn, solver_cls, args, kwargs, island_seed))
+            process.start()
+            self._conns.append(conn)
+            self._processes.append(process)
+
+        self._island_stats = []
+        self._emigrants = []
+        self._gather()
+
+    def _gather(self) -> None:
+        """Collect the replies of the islands"""
+        self._island_stats = []
+        self._emigrants = []
+        for conn in self._conns:
+            stats, instructions, score, emigrants = conn.recv()
+            self._island_stats.append(stats)
+            self._emigrants.append(emigrants)
+
+            best = Circuit(self.Q, instructions)
+            best.score = score
+            self.update_best(best)
+
+        self.n_evals = sum(stats['n_evals'] for stats in self._island_stats)
+
+    def stats(self) -> typing.Dict:
+        res = super().stats()
+
+        # Groups are numbered across islands, counters are summed
+        for island, stats in enumerate(self._island_stats):
+            for idx in range(self.n_groups):
+                res["mean_fit_%d" % (island * self.n_groups + idx)] = stats["mean_fit_%d" % idx]
+
+        best = min(self._island_stats, key=lambda stats: stats['best_fit'])
+        for key in self._island_stats[0]:
+            if key in res:
+                continue
+            if key in COUNTERS:
+                res[key] = sum(stats[key] for stats in self._island_stats)
+            elif key == 'best_ci':
+                res[key] = best[key]
+        return res
+
+    def evolve(self) -> None:
+        # Island i receives the emigrants of island i-1
+        for idx, conn in enumerate(self._conns):
+            conn.send((self.migration_interval, self._emigrants[idx - 1], self.n_genes))
+        self._gather()
+        self.gen += self.migration_interval
+
+    def checkpoint_state(self) -> typing.Dict[str, np.ndarray]:
+        """Gather the states of the islands, named island<i>_*, with the emigrants
+        awaiting the next exchange"""
+        state = super().checkpoint_state()
+        for conn in self._conns:
+            conn.send("checkpoint")
+        for island, conn in enumerate(self._conns):
+            state.update({'island%d_%s' % (island, key): value for key, value in conn.recv().items()})
+            state.update(pack_circuits('emigrants%d' % island, [Circuit(self.Q, self._emigrants[island])]))
+        return state
+
+    def restore_state(self, state: typing.Dict[str, np.ndarray]) -> None:
+        super().restore_state(state)
+        for island, conn in enumerate(self._conns):
+            prefix = 'island%d_' % island
+            conn.send(("restore", {key[len(prefix):]: value for key, value in state.items()
+                                   if key.startswith(prefix)}))
+        self._island_stats = [conn.recv() for conn in self._conns]
+        self._emigrants = [list(unpack_circuits(self.Q, 'emigrants%d' % island, state)[0].instructions)
+                           for island in range(self.n_islands)]
+
+    def close(self) -> None:
+        """Stop the island processes"""
+        for conn, process in zip(self._conns, self._processes):
+            conn.send(None)
+            process.join()
+            conn.close()
+        self._conns = []
+        self._processes = []
+
+    def end(self) -> None:
+        self.close()
+        super().end()
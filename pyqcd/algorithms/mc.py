@@ -8,23 +8,45 @@ class MC(BaseSearch):
                  target: np.ndarray,
                  alphabet: Alphabet,
                  circuit_size: int,
-                 mat_dist: typing.Callable = tr_distance) -> None:
+                 mat_dist: typing.Callable = tr_distance,
+                 batch_size: int = 1,
+                 **kwargs) -> None:
         """
         Arguments:
             target {np.ndarray} -- unitary target
             alphabet {Alphabet} -- universal set alphabet
             circuit_size {int} -- size of an individual (i.e. number of instructions)
             mat_dist {typing.Callable} -- matrix distance (default: {tr_distance})
+            batch_size {int} -- random circuits sampled and scored as one batch per step,
+                                simulated by chunks of bounded memory (default: {1})
+            kwargs -- forwarded to BaseSearch (e.g. unitary_cache, fitness_cache, executor)
         """
-        super().__init__(target, alphabet, circuit_size, mat_dist)
+        super().__init__(target, alphabet, circuit_size, mat_dist, **kwargs)
+
+        self.batch_size = batch_size
 
     def stats(self) -> typing.Dict:
         res = super().stats()
         return res
 
     def evolve(self) -> None:
+        if self.batch_size > 1:
+            self.evolve_batch()
+            return
+
         new = self.get_random_circuit()
         new.score = self.fitness(new)
         self.gen += 1
 
         self.update_best(new)
+
+    def evolve_batch(self) -> None:
+        """Sample batch_size random circuits as arrays and score them as one batch"""
+        gate_ids, qubits, params = self.alphabet.get_random_arrays((self.batch_size, self.circuit_size))
+        scores = self.arrays_fitness(gate_ids, qubits, params)
+        self.gen += 1
+
+        idx = np.argmin(scores)
+        new = Circuit.from_arrays(self.Q, gate_ids[idx], qubits[idx], params[idx])
+        new.score = scores[idx]
+        self.update_best(new)
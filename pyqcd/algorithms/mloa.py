@@ -1,6 +1,10 @@
 from .base import *
 from .gloa import GLOA
 
+from pyqcd.circuit import shared_structure_to_matrix
+from pyqcd.gates import MAX_PARAMS, gate_table
+from pyqcd.gradient import GRADIENT_EVALS, tr_distance_gradient
+
 
 class MLOA(GLOA):
     """Memetic Group Leader Optimization Algorithm
@@ -16,7 +20,10 @@ class MLOA(GLOA):
                  circuit_size: int,
                  weights: np.ndarray = np.array([0.7, 0.15, 0.15]),
                  ref_pb: float = 0.25,
-                 mat_dist: typing.Callable = tr_distance) -> None:
+                 mat_dist: typing.Callable = tr_distance,
+                 refinement: str = "random",
+                 learning_rate: float = 0.05,
+                 **kwargs) -> None:
         """        
         Arguments:
             target {np.ndarray} -- unitary target
@@ -26,12 +33,28 @@ class MLOA(GLOA):
             circuit_size {int} -- size of an individual (i.e. number of instructions)
             weights {np.ndarray} -- weights of respectively current, leader and random 
                                     in one-way crossover (default: {np.array([0.7,0.15,0.15])})
+            ref_pb {float} -- probability of perturbing a param in random refinement (default: {0.25})
             mat_dist {typing.Callable} -- matrix distance (default: {tr_distance})
+            refinement {str} -- "random": random perturbations of the params, one at a time,
+                                "batch": random perturbations of the params simulated as one batch,
+                                "gradient": Adam steps on analytic gradients, tr_distance on a unitary
+                                            target only, exact fitness only (default: {"random"})
+            learning_rate {float} -- step size of gradient refinement (default: {0.05})
+            kwargs -- forwarded to BaseSearch (e.g. unitary_cache, fitness_cache, executor)
         """
+        if refinement not in ["random", "batch", "gradient"]:
+            raise ValueError("Unknown refinement %s" % refinement)
+        if refinement == "gradient" and (mat_dist is not tr_distance or isinstance(target, ColumnsTarget)):
+            raise ValueError("Gradient refinement requires tr_distance on a unitary target")
+        if refinement == "gradient" and kwargs.get('n_samples') is not None:
+            raise ValueError("Gradient refinement computes exact distances, not sampled ones")
+
         super().__init__(target, alphabet, n_groups,
-                         group_size, circuit_size, weights, mat_dist)
+                         group_size, circuit_size, weights, mat_dist, **kwargs)
 
         self.ref_pb = ref_pb
+        self.refinement_mode = refinement
+        self.learning_rate = learning_rate
         # Extra stats initialization
         self.n_refs = 0
 
@@ -54,6 +77,15 @@ class MLOA(GLOA):
         res['n_refs'] = self.n_refs
         return res
 
+    def checkpoint_state(self) -> typing.Dict[str, np.ndarray]:
+        state = super().checkpoint_state()
+        state['n_refs'] = np.array(self.n_refs)
+        return state
+
+    def restore_state(self, state: typing.Dict[str, np.ndarray]) -> None:
+        super().restore_state(state)
+        self.n_refs = int(state['n_refs'])
+
     def migration(self) -> None:
         # Compute origin group probabilities: the lower the fitness, the better
         group_p = [1/np.mean([x.score for x in group]) for group in self.groups]
@@ -69,38 +101,138 @@ class MLOA(GLOA):
                 k = np.random.randint(self.circuit_size)
 
                 new = self.groups[i][j].clone()
-                new.instructions[k] = self.groups[gid][j].instructions[k].clone()
-                new.score = self.fitness(new)
+                new[k] = self.groups[gid][j][k]
+                new.score = self.fitness(new, self.groups[i][j].score)
 
                 if new.score < self.groups[i][j].score:
                     self.groups[i][j] = new
                     self.n_migs += 1
 
     def refinement(self, n_selections: int = 1, n_iters: int = 10) -> None:
+        selected = []
         for group in self.groups:
-            for p in np.random.choice(group, size=min(n_selections, len(group)), replace=False):
-                self.refine(p, n_iters)
+            idxs = np.random.choice(len(group), size=min(n_selections, len(group)), replace=False)
+            selected += [group[idx] for idx in idxs]
+        self.refine_batch(selected, n_iters)
 
         leaders = [min(group, key=lambda x: x.score) for group in self.groups]
-        for leader in leaders:
-            self.refine(leader, n_iters)
+        self.refine_batch(leaders, n_iters)
 
     def refine(self, circuit: Circuit, n_iters: int) -> Circuit:
-        for _ in range(n_iters):
-            new = circuit.clone()
+        return self.refine_batch([circuit], n_iters)[0]
 
-            for instr in new.instructions:
-                if instr.n_params() and np.random.rand() < self.ref_pb:
-                    instr.params = instr.params + \
-                        self.alphabet.get_random_angles(instr.n_params())/4
+    def refine_batch(self, circuits: typing.Sequence[Circuit], n_iters: int) -> typing.Sequence[Circuit]:
+        """Refine the parameters of distinct circuits in lockstep,
+        scoring the candidates of each iteration as one batch"""
+        if self.refinement_mode == "gradient":
+            return [self.gradient_refine(circuit, n_iters) for circuit in circuits]
+        if self.refinement_mode == "batch":
+            return [self.batch_refine(circuit, n_iters) for circuit in circuits]
+
+        for _ in range(n_iters):
+            candidates = []
+            for circuit in circuits:
+                new = circuit.clone()
+
+                # Perturb params of random parametrized instructions
+                n_params = gate_table('n_params')[new.gate_ids]
+                mask = (n_params > 0) & (np.random.rand(len(new)) < self.ref_pb)
+                if np.any(mask):
+                    angles = self.alphabet.get_random_angles(MAX_PARAMS * np.sum(mask))/4
+                    angles = np.reshape(angles, (-1, MAX_PARAMS))
+                    new.params[mask] += angles * (np.arange(MAX_PARAMS) < n_params[mask, None])
                     new.score = None
 
-            if new.score is None:
-                new.score = self.fitness(new)
+                candidates.append(new)
+
+            self.compute_scores(candidates, [circuit.score for circuit in circuits])
+
+            for circuit, new in zip(circuits, candidates):
+                if new.score < circuit.score:
+                    # The partial products of the candidate follow its params
+                    circuit.params = new.params
+                    circuit._partials = new._partials
+                    circuit.score = new.score
+                    self.n_refs += 1
+
+        return circuits
 
-            if new.score < circuit.score:
-                circuit.instructions = new.instructions
-                circuit.score = new.score
-                self.n_refs += 1
+    def gradient_refine(self, circuit: Circuit, n_iters: int,
+                        beta1: float = 0.9, beta2: float = 0.999, eps: float = 1e-8) -> Circuit:
+        """Refine the parameters of a circuit with n_iters Adam steps on the analytic
+        gradient of tr_distance; the circuit takes the best params met.
+        Each gradient sweep counts as GRADIENT_EVALS evaluations.
 
+        Arguments:
+            circuit {Circuit} -- a circuit obj, refined in place
+            n_iters {int} -- number of gradient steps
+
+        Returns:
+            Circuit -- the refined circuit
+        """
+        if not np.any(gate_table('n_params')[circuit.gate_ids] > 0):
+            return circuit
+
+        cost = self.circuit_cost(circuit)
+        params = circuit.params.copy()
+        m = np.zeros(params.shape)
+        v = np.zeros(params.shape)
+        best_score, best_params = circuit.score, None
+
+        for t in range(1, n_iters + 1):
+            distance, grad = tr_distance_gradient(self.Q, circuit.gate_ids, circuit.qubits, params, self.target)
+            self.n_evals += GRADIENT_EVALS
+
+            if distance + cost < best_score:
+                best_score, best_params = distance + cost, params.copy()
+
+            m = beta1 * m + (1 - beta1) * grad
+            v = beta2 * v + (1 - beta2) * grad**2
+            params = params - self.learning_rate * (m / (1 - beta1**t)) / (np.sqrt(v / (1 - beta2**t)) + eps)
+
+        if best_params is not None:
+            circuit.params = best_params
+            circuit.score = best_score
+            self.n_refs += 1
+        return circuit
+
+    def batch_refine(self, circuit: Circuit, n_candidates: int) -> Circuit:
+        """Sample n_candidates perturbations of the params of a circuit and simulate them
+        as one batch, gates without params being shared; the circuit takes the best
+        candidate if fitter. With sampled fitness, candidates are scored on the sample states
+        like circuit.score.
+
+        Arguments:
+            circuit {Circuit} -- a circuit obj, refined in place
+            n_candidates {int} -- number of perturbations
+
+        Returns:
+            Circuit -- the refined circuit
+        """
+        # Perturb params of random parametrized instructions
+        n_params = gate_table('n_params')[circuit.gate_ids]
+        mask = (n_params > 0) & (np.random.rand(n_candidates, len(circuit)) < self.ref_pb)
+        mask = mask[np.any(mask, axis=1)]
+        if not len(mask):
+            return circuit
+
+        angles = self.alphabet.get_random_angles(MAX_PARAMS * mask.size)/4
+        angles = np.reshape(angles, mask.shape + (MAX_PARAMS,))
+        params = circuit.params + angles * (mask[..., None] & (np.arange(MAX_PARAMS) < n_params[:, None]))
+
+        self.n_evals += len(params)
+        if self.n_samples is not None:
+            gate_ids = np.broadcast_to(circuit.gate_ids, params.shape[:2])
+            qubits = np.broadcast_to(circuit.qubits, params.shape[:2] + circuit.qubits.shape[1:])
+            distances = self.sampled_distances(gate_ids, qubits, params)[0]
+        else:
+            matrices = shared_structure_to_matrix(self.Q, circuit.gate_ids, circuit.qubits, params)
+            distances = self.unitaries_distance(matrices)
+        scores = distances + self.circuit_cost(circuit)
+
+        best = np.argmin(scores)
+        if scores[best] < circuit.score:
+            circuit.params = params[best]
+            circuit.score = scores[best]
+            self.n_refs += 1
         return circuit
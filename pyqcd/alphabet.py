@@ -2,7 +2,7 @@ import typing
 
 import numpy as np
 
-from pyqcd.gates import Gate
+from pyqcd.gates import GATES, MAX_PARAMS, MAX_QUBITS, Gate, gate_id, gate_table
 from pyqcd.instruction import Instruction
 
 
@@ -10,14 +10,28 @@ class Alphabet(object):
     """An object to represent a set S of quantum
     instructions acting on Q qubits"""
 
-    def __init__(self, Q: int) -> None:
+    def __init__(self, Q: int, rng: typing.Optional[np.random.Generator] = None) -> None:
         """Initialize an Alphabet, a collection of gates
 
         Arguments:
             Q {int} -- number of qubits
+            rng {typing.Optional[np.random.Generator]} -- random generator of the alphabet
+                                                          (default: {None}, the global np.random state)
         """
         self.Q = Q
         self.gates: typing.List[Gate] = []
+        self.rng = rng
+        self._ids = np.empty(0, dtype=np.int16)
+
+    @property
+    def rng(self) -> typing.Any:
+        """Random generator of the alphabet: its own Generator, or the np.random module (global state)"""
+        return np.random if self._rng is None else self._rng
+
+    @rng.setter
+    def rng(self, rng: typing.Optional[np.random.Generator]) -> None:
+        # None is kept rather than the module, so that alphabets pickle with the global state
+        self._rng = rng
 
     def register_gates(self, gates: typing.Sequence[Gate]):
         """Registers a gate
@@ -28,12 +42,58 @@ class Alphabet(object):
         for gate in gates:
             if gate not in self.gates:
                 self.gates.append(gate)
+        self._ids = np.array([gate_id(gate) for gate in self.gates], dtype=np.int16)
 
     def get_random_qubits(self, n: int) -> typing.Sequence[int]:
-        return np.random.choice(np.arange(self.Q), size=n, replace=False)
+        return self.rng.choice(self.Q, size=n, replace=False)
 
     def get_random_angles(self, n: int) -> typing.Sequence[float]:
-        return np.random.rand(n)*2*np.pi
+        return self.rng.random(n)*2*np.pi
+
+    def get_random_qubits_array(self, n_qubits: np.ndarray) -> np.ndarray:
+        """Draw distinct random qubits for many instructions at once
+
+        Arguments:
+            n_qubits {np.ndarray} -- number of qubits of each instruction
+
+        Returns:
+            np.ndarray -- n_qubits.shape + (MAX_QUBITS,) qubits padded with -1
+        """
+        n_qubits = np.asarray(n_qubits)
+        qubits = np.argsort(self.rng.random(n_qubits.shape + (self.Q,)), axis=-1)[..., :MAX_QUBITS]
+        if self.Q < MAX_QUBITS:
+            pad = np.full(n_qubits.shape + (MAX_QUBITS - self.Q,), -1)
+            qubits = np.concatenate([qubits, pad], axis=-1)
+        mask = np.arange(MAX_QUBITS) < n_qubits[..., None]
+        return np.where(mask, qubits, -1).astype(np.int8)
+
+    def get_random_angles_array(self, n_params: np.ndarray) -> np.ndarray:
+        """Draw random angles for many instructions at once
+
+        Arguments:
+            n_params {np.ndarray} -- number of params of each instruction
+
+        Returns:
+            np.ndarray -- n_params.shape + (MAX_PARAMS,) angles padded with 0
+        """
+        n_params = np.asarray(n_params)
+        angles = self.rng.random(n_params.shape + (MAX_PARAMS,))*2*np.pi
+        return angles * (np.arange(MAX_PARAMS) < n_params[..., None])
+
+    def get_random_arrays(self, shape: typing.Union[int, typing.Tuple[int, ...]]) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get random instructions in array representation (see Circuit)
+
+        Arguments:
+            shape {typing.Union[int, typing.Tuple[int, ...]]} -- e.g. (L,) for a circuit,
+                                                                 (N,L) for a population
+
+        Returns:
+            typing.Tuple[np.ndarray, np.ndarray, np.ndarray] -- gate ids, qubits, params arrays
+        """
+        gate_ids = self._ids[self.rng.choice(len(self._ids), size=shape)]
+        qubits = self.get_random_qubits_array(gate_table('n_qubits')[gate_ids])
+        params = self.get_random_angles_array(gate_table('n_params')[gate_ids])
+        return gate_ids, qubits, params
 
     def get_random(self, n: int = 1) -> typing.List[Instruction]:
         """Get a random instruction from register
@@ -45,10 +105,8 @@ class Alphabet(object):
             typing.List[Instruction] -- list of instructions
         """
         out = []
-        for _ in range(n):
-            gate = np.random.choice(self.gates)
-            qubits = self.get_random_qubits(gate.n_qubits)
-            params = self.get_random_angles(gate.n_params)
-            out.append(Instruction(gate, qubits, params))
+        for gid, qubits, params in zip(*self.get_random_arrays(n)):
+            gate = GATES[gid]
+            out.append(Instruction(gate, qubits[:gate.n_qubits], params[:gate.n_params]))
 
         return out
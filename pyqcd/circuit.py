@@ -1,24 +1,454 @@
+import functools
+import threading
 import typing
-from copy import deepcopy
+from collections import OrderedDict
+from string import ascii_lowercase
 
 import numpy as np
-from qiskit import QuantumCircuit
-from qiskit.providers.basicaer.basicaertools import einsum_matmul_index
 
+from pyqcd.gates import (GATES, MAX_PARAMS, MAX_QUBITS, Gate, batch_gate_matrix, constant_matrix, gate_id,
+                         gate_matrix, gate_permutation, gate_table)
 from pyqcd.instruction import Instruction
+from pyqcd.math_utils import REJECTED
+
+
+class ApplyPlan(object):
+    """Precomputed indexing to apply a k-qubit gate to the row axes of a Q-qubit tensor
+
+    Tensors have Q leading row axes, qubit q being axis Q-1-q, followed by any number
+    of trailing axes (e.g. the Q column axes of a unitary). Gate tensors follow the
+    matrix convention: gate axis j acts on qubits[k-1-j].
+
+    Kernels write in out when given, a C-contiguous tensor of the same shape not
+    sharing memory with the input, and allocate their result otherwise.
+    """
+
+    def __init__(self, qubits: typing.Tuple[int, ...], Q: int) -> None:
+        """Initialize a plan
+
+        Arguments:
+            qubits {typing.Tuple[int, ...]} -- target qubits
+            Q {int} -- number of qubits
+        """
+        if len(set(qubits)) != len(qubits) or not all(0 <= q < Q for q in qubits):
+            raise ValueError("Invalid target qubits %s on %d qubits" % (qubits, Q))
+        if Q + len(qubits) > len(ascii_lowercase):
+            raise ValueError("Too many qubits for a contraction plan: %d" % Q)
+
+        self.qubits = qubits
+        self.Q = Q
+        self.k = len(qubits)
+        self.axes = [Q - 1 - q for q in reversed(qubits)]
+        # 1-qubit dense gates: (2**axis, 2, rest) view of the tensor, the gate multiplying the middle axis
+        self.matmul_rows = 2**self.axes[0] if self.k == 1 else None
+
+        # Dense gates: einsum subscripts contracting gate inputs with row axes
+        rows = list(ascii_lowercase[:Q])
+        out = list(rows)
+        gate_out = ascii_lowercase[-self.k:]
+        for pos, axis in enumerate(self.axes):
+            out[axis] = gate_out[pos]
+        gate_in = "".join(rows[axis] for axis in self.axes)
+        self.subscripts = "%s%s,%s...->%s..." % (gate_out, gate_in, "".join(rows), "".join(out))
+        # One gate per slice of the last axis, labelled Z
+        self.batch_subscripts = "Z%s%s,%s...Z->%s...Z" % (gate_out, gate_in, "".join(rows), "".join(out))
+
+        # Diagonal gates: axes order and broadcast shape of the reshaped diagonal
+        self.diagonal_order = tuple(np.argsort(self.axes))
+        self.diagonal_shape = tuple(2 if axis in self.axes else 1 for axis in range(Q))
+
+        # Permutation gates: row blocks selected by each basis state of the targets
+        self.blocks = []
+        for idx in range(2**self.k):
+            index = [slice(None)] * Q
+            for pos, axis in enumerate(self.axes):
+                index[axis] = (idx >> (self.k - 1 - pos)) & 1
+            self.blocks.append(tuple(index) + (Ellipsis,))
+
+    def apply_dense(self, gate: np.ndarray, tensor: np.ndarray, out: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        if out is not None and self.k == 1:
+            # Broadcast matmul over a view, 2-3x faster than einsum writing in a C-contiguous out
+            shape = (self.matmul_rows, 2, -1)
+            np.matmul(np.asarray(gate, dtype=complex), np.reshape(tensor, shape), out=np.reshape(out, shape))
+            return out
+        gate_tensor = np.reshape(np.asarray(gate, dtype=complex), 2 * self.k * [2])
+        return np.einsum(self.subscripts, gate_tensor, tensor, dtype=complex, casting='no', out=out)
+
+    def apply_diagonal(self,
+                       diagonal: np.ndarray,
+                       tensor: np.ndarray,
+                       out: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        phases = np.transpose(np.reshape(diagonal, self.k * [2]), self.diagonal_order)
+        return np.multiply(tensor, np.reshape(phases, self.diagonal_shape + (1,) * (tensor.ndim - self.Q)), out=out)
+
+    def apply_dense_batch(self, gates: np.ndarray, tensor: np.ndarray) -> np.ndarray:
+        """Apply gates[i] to tensor[..., i]: one gate per slice of the last axis"""
+        gate_tensor = np.reshape(np.asarray(gates, dtype=complex), (len(gates),) + 2 * self.k * (2,))
+        return np.einsum(self.batch_subscripts, gate_tensor, tensor, dtype=complex, casting='no')
+
+    def apply_diagonal_batch(self, diagonals: np.ndarray, tensor: np.ndarray) -> np.ndarray:
+        """Apply diagonal gates diagonals[i] to tensor[..., i]"""
+        phases = np.reshape(diagonals, (len(diagonals),) + self.k * (2,))
+        phases = np.transpose(phases, (0,) + tuple(1 + axis for axis in self.diagonal_order))
+        phases = np.moveaxis(phases, 0, -1)
+        shape = self.diagonal_shape + (1,) * (tensor.ndim - self.Q - 1) + (len(diagonals),)
+        return tensor * np.reshape(phases, shape)
+
+    def apply_permutation(self,
+                          permutation: np.ndarray,
+                          tensor: np.ndarray,
+                          out: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        if self.k == 1:
+            # Bit flip: a view with reversed axis, out is not used
+            return np.flip(tensor, self.axes[0]) if permutation[0] else tensor
+
+        if out is None:
+            out = np.empty_like(tensor)
+        for row, col in enumerate(permutation.tolist()):
+            out[self.blocks[row]] = tensor[self.blocks[col]]
+        return out
+
+
+@functools.lru_cache(maxsize=None)
+def apply_plan(qubits: typing.Tuple[int, ...], Q: int) -> ApplyPlan:
+    """Return the cached ApplyPlan of qubits on Q qubits"""
+    return ApplyPlan(qubits, Q)
+
+
+def get_plan(qubits: typing.Sequence[int], Q: int) -> ApplyPlan:
+    """Return the cached ApplyPlan of a sequence of qubits (e.g. an array)"""
+    return apply_plan(tuple(int(q) for q in qubits), Q)
+
+
+def instruction_matrices(gate_ids: np.ndarray, params: np.ndarray) -> typing.List[np.ndarray]:
+    """Return the matrices of a sequence of instructions in array representation,
+    built with one vectorized construction per distinct gate
+
+    Arguments:
+        gate_ids {np.ndarray} -- (L,) gate ids
+        params {np.ndarray} -- (L,MAX_PARAMS) padded params
+
+    Returns:
+        typing.List[np.ndarray] -- L matrices
+    """
+    matrices = [None if GATES[gid].n_params else constant_matrix(GATES[gid]) for gid in gate_ids.tolist()]
+
+    parametric = gate_table('n_params')[gate_ids] > 0
+    for gid in np.unique(gate_ids[parametric]):
+        index = np.flatnonzero(gate_ids == gid)
+        for idx, matrix in zip(index.tolist(), GATES[gid].batch_to_matrix(params[index])):
+            matrices[idx] = matrix
+    return matrices
+
+
+# Cost model of the ApplyPlan kernels deciding which gates to fuse, in operations on unitary
+# entries: a k-qubit dense gate does 2**k multiply-adds per entry, a diagonal gate one product
+# and a permutation one copy. Dense gates on more than one qubit go through einsum, whose
+# generic loop is EINSUM_OP_COST times slower per operation than the matmul of 1-qubit gates,
+# and each kernel call pays a numpy dispatch overhead worth KERNEL_CALL_OPS operations.
+# Products of whole unitaries go through BLAS, doing BLAS_OP_SPEEDUP multiply-adds per operation.
+# The constants are measured by scripts/benchmark_simulation.py
+KERNEL_CALL_OPS = 2**12
+EINSUM_OP_COST = 2
+BLAS_OP_SPEEDUP = 8
+
+# Column blocks of threshold_tr_distances: at most EARLY_EXIT_BLOCKS blocks, of at least
+# EARLY_EXIT_MIN_ENTRIES unitary entries for the batch, and slack on the bound against rounding errors
+EARLY_EXIT_BLOCKS = 4
+EARLY_EXIT_MIN_ENTRIES = 2**14
+EARLY_EXIT_TOLERANCE = 1e-12
+
+# Below this number of qubits, compiling a circuit costs more than the contractions it saves:
+# on random circuits of 30 instructions, scripts/benchmark_simulation.py measures fusion at
+# 0.7-1.05x of one kernel call per instruction for 3 to 6 qubits and 1.0-1.5x from 7 qubits
+FUSION_MIN_QUBITS = 7
+
+# Circuits are simulated as layered batches up to BATCH_MAX_QUBITS qubits, beyond which the
+# structured kernels of single circuits are faster (see scripts/benchmark_simulation.py),
+# by chunks of at most BATCH_MAX_BYTES of unitaries
+BATCH_MAX_QUBITS = 4
+BATCH_MAX_BYTES = 2**26
+
+SWAP_MATRIX = np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=complex)
+_EYE2 = np.eye(2, dtype=complex)
+
+
+def kernel_cost(Q: int, k: int, diagonal: bool, permutation: bool) -> int:
+    """Estimated operations to apply a k-qubit gate to a Q-qubit unitary (see KERNEL_CALL_OPS)"""
+    if diagonal or permutation:
+        per_entry = 1
+    else:
+        per_entry = 2**k if k == 1 else EINSUM_OP_COST * 2**k
+    return KERNEL_CALL_OPS + per_entry * 4**Q
+
+
+def product_cost(Q: int) -> int:
+    """Estimated operations of the product of two Q-qubit unitaries (see KERNEL_CALL_OPS)"""
+    return KERNEL_CALL_OPS + 8**Q // BLAS_OP_SPEEDUP
+
+
+def _embed(matrix: np.ndarray, qubits: typing.Tuple[int, ...], frame: typing.Tuple[int, ...]) -> np.ndarray:
+    """Return the matrix of a gate on qubits as a gate on frame (qubits a subset of frame, at most 2 qubits)"""
+    if qubits == frame:
+        return matrix
+    if len(qubits) == 2:
+        # Same pair, reversed order
+        return np.dot(np.dot(SWAP_MATRIX, matrix), SWAP_MATRIX)
+    # Kronecker products with the identity, broadcast
+    if qubits[0] == frame[1]:
+        return np.reshape(matrix[:, None, :, None] * _EYE2[None, :, None, :], (4, 4))
+    return np.reshape(_EYE2[:, None, :, None] * matrix[None, :, None, :], (4, 4))
+
+
+class CompiledGate(object):
+    """A gate of the lowered form of a circuit: the product of one or more
+    instructions acting on the same qubits"""
+
+    def __init__(self,
+                 matrix: np.ndarray,
+                 qubits: typing.Sequence[int],
+                 diagonal: bool = False,
+                 permutation: bool = False,
+                 gate: typing.Optional[typing.Type[Gate]] = None) -> None:
+        """Initialize a compiled gate
+
+        Arguments:
+            matrix {np.ndarray} -- (2**k,2**k) matrix
+            qubits {typing.Sequence[int]} -- target qubits
+            diagonal {bool} -- the matrix is diagonal (default: {False})
+            permutation {bool} -- the matrix is a permutation (default: {False})
+            gate {typing.Optional[typing.Type[Gate]]} -- gate class of a single instruction (default: {None})
+        """
+        self.matrix = matrix
+        self.qubits = tuple(qubits)
+        self.diagonal = diagonal
+        self.permutation = permutation
+        self.gate = gate
+
+    @classmethod
+    def from_gate(cls, gate: typing.Type[Gate], matrix: np.ndarray, qubits: typing.Sequence[int]) -> "CompiledGate":
+        return cls(matrix, qubits, gate.diagonal, gate.permutation, gate)
+
+    def fuse(self, other: "CompiledGate") -> None:
+        """Multiply a gate applied after this one, acting on a subset of its qubits, into it
+
+        Arguments:
+            other {CompiledGate} -- a compiled gate
+        """
+        self.matrix = np.dot(_embed(other.matrix, other.qubits, self.qubits), self.matrix)
+        # Products of diagonal (permutation) matrices are diagonal (permutation) matrices
+        self.diagonal = self.diagonal and other.diagonal
+        self.permutation = self.permutation and other.permutation
+        self.gate = None
+
+    def cost(self, Q: int) -> int:
+        """Estimated operations to apply the gate to a Q-qubit unitary (see KERNEL_CALL_OPS)"""
+        return kernel_cost(Q, len(self.qubits), self.diagonal, self.permutation)
+
+    def apply(self, tensor: np.ndarray, Q: int, out: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        """Apply the gate to the row axes of a Q-qubit tensor, writing in out if given (see ApplyPlan)"""
+        plan = get_plan(self.qubits, Q)
+        if self.diagonal:
+            return plan.apply_diagonal(np.diagonal(self.matrix), tensor, out)
+        if self.permutation:
+            if self.gate is not None:
+                permutation = gate_permutation(self.gate, self.matrix)
+            else:
+                permutation = np.argmax(np.abs(self.matrix), axis=1)
+            return plan.apply_permutation(permutation, tensor, out)
+        return plan.apply_dense(self.matrix, tensor, out)
+
+
+class _PairBlock(object):
+    """Consecutive gates acting only on a pair of qubits, fused into one 4x4 gate if cheaper"""
+
+    def __init__(self, qubits: typing.Tuple[int, int]) -> None:
+        self.qubits = qubits
+        self.parts: typing.List[CompiledGate] = []
+        # 1-qubit part of each qubit after the last 2-qubit part, still growing
+        self.tail: typing.Dict[int, CompiledGate] = {}
+
+    def append(self, gate: CompiledGate) -> None:
+        if len(gate.qubits) == 2:
+            self.parts.append(gate)
+            self.tail.clear()
+        elif gate.qubits[0] in self.tail:
+            self.tail[gate.qubits[0]].fuse(gate)
+        else:
+            self.parts.append(gate)
+            self.tail[gate.qubits[0]] = gate
+
+    def lower(self, Q: int) -> typing.List[CompiledGate]:
+        if len(self.parts) == 1:
+            return self.parts
+
+        diagonal = all(part.diagonal for part in self.parts)
+        permutation = all(part.permutation for part in self.parts)
+        if kernel_cost(Q, 2, diagonal, permutation) >= sum(part.cost(Q) for part in self.parts):
+            return self.parts
+
+        fused = CompiledGate(np.eye(4, dtype=complex), self.qubits, True, True)
+        for part in self.parts:
+            fused.fuse(part)
+        return [fused]
+
+
+def compile_arrays(Q: int, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> typing.List[CompiledGate]:
+    """Lower a sequence of instructions in array representation to fewer gates for simulation
+
+    Identities are dropped and runs of 1-qubit gates on a qubit are multiplied together.
+    Gates acting only on the qubits of a 2-qubit gate are grouped with it, and the group
+    is fused into one 4x4 gate when this is estimated to be cheaper (see KERNEL_CALL_OPS).
+    A 1-qubit gate commutes with every gate not acting on its qubit, so it can be moved
+    next to the gate it is fused with.
+
+    Arguments:
+        Q {int} -- number of qubits
+        gate_ids {np.ndarray} -- (L,) gate ids
+        qubits {np.ndarray} -- (L,MAX_QUBITS) padded target qubits
+        params {np.ndarray} -- (L,MAX_PARAMS) padded params
+
+    Returns:
+        typing.List[CompiledGate] -- gates whose product is the circuit unitary
+    """
+    ops: typing.List[typing.Union[CompiledGate, _PairBlock]] = []
+    # Last emitted gate or block acting on each qubit
+    last: typing.Dict[int, typing.Union[CompiledGate, _PairBlock]] = {}
+    # 1-qubit products waiting for the next gate acting on their qubit
+    pending: typing.Dict[int, CompiledGate] = {}
+
+    for gid, q, matrix in zip(gate_ids.tolist(), qubits.tolist(), instruction_matrices(gate_ids, params)):
+        gate = GATES[gid]
+        if gate.diagonal and gate.permutation:
+            # Identity
+            continue
+
+        new = CompiledGate.from_gate(gate, matrix, q[:gate.n_qubits])
+        if gate.n_qubits == 1:
+            qubit = new.qubits[0]
+            if qubit in pending:
+                pending[qubit].fuse(new)
+            elif isinstance(last.get(qubit), _PairBlock):
+                last[qubit].append(new)
+            else:
+                pending[qubit] = new
+            continue
+
+        block = last.get(new.qubits[0])
+        if (gate.n_qubits == 2 and isinstance(block, _PairBlock) and last.get(new.qubits[1]) is block
+                and set(block.qubits) == set(new.qubits)):
+            block.append(new)
+            continue
+
+        if gate.n_qubits == 2:
+            block = _PairBlock(new.qubits)
+            for qubit in new.qubits:
+                if qubit in pending:
+                    block.append(pending.pop(qubit))
+            block.append(new)
+            new = block
+        else:
+            ops.extend(pending.pop(qubit) for qubit in new.qubits if qubit in pending)
+        ops.append(new)
+        for qubit in new.qubits:
+            last[qubit] = new
+
+    ops.extend(pending.values())
+
+    compiled = []
+    for op in ops:
+        compiled.extend(op.lower(Q) if isinstance(op, _PairBlock) else [op])
+    return compiled
+
+
+class BufferPool(object):
+    """Free work buffers of the simulators, by shape and dtype.
+
+    Simulators take their buffers from the pool and give back those they do not
+    hand over to the caller, so that consecutive simulations of the same size
+    reuse warm memory instead of allocating (and page faulting) a result per gate.
+    """
+
+    def __init__(self, max_free: int = 2) -> None:
+        """Initialize an empty pool
+
+        Arguments:
+            max_free {int} -- max number of free buffers kept per shape and dtype (default: {2})
+        """
+        self.max_free = max_free
+        self._free: typing.Dict[typing.Tuple, typing.List[np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, shape: typing.Tuple[int, ...], dtype: np.dtype = complex) -> np.ndarray:
+        """Return a free C-contiguous buffer, allocated if none is free"""
+        with self._lock:
+            free = self._free.get((tuple(shape), np.dtype(dtype)))
+            if free:
+                return free.pop()
+        return np.empty(shape, dtype=dtype)
+
+    def give(self, buffer: np.ndarray) -> None:
+        """Give back a buffer taken from the pool, no longer referenced by its taker"""
+        with self._lock:
+            free = self._free.setdefault((buffer.shape, buffer.dtype), [])
+            if len(free) < self.max_free:
+                free.append(buffer)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._free.clear()
+
+
+# Work buffers of UnitaryCircuit
+WORK_BUFFERS = BufferPool()
+
+
+@functools.lru_cache(maxsize=None)
+def identity_tensor(Q: int) -> np.ndarray:
+    """Return the cached, read-only, identity of Q qubits as a Q*[2,2] tensor"""
+    identity = np.reshape(np.eye(2**Q, dtype=complex), Q * [2, 2])
+    identity.setflags(write=False)
+    return identity
 
 
 class UnitaryCircuit(object):
-    """Unitary representation of a circuit"""
+    """Unitary representation of a circuit.
 
-    def __init__(self, Q: int) -> None:
+    Gates are applied from the unitary to a spare buffer, ping-ponging between two
+    work buffers taken from WORK_BUFFERS: neither the starting unitary nor the
+    results of to_matrix are ever written.
+    """
+
+    def __init__(self, Q: int, unitary: typing.Optional[np.ndarray] = None) -> None:
         """Initialize a unitary circuit
 
         Arguments:
             Q {int} -- number of qubits
+            unitary {typing.Optional[np.ndarray]} -- (2**Q,2**Q) starting unitary, not modified
+                                                     (default: {None}, identity)
         """
         self.Q = Q
-        self._unitary = np.reshape(np.eye(2**Q, dtype=complex), Q * [2, 2])
+        self._unitary = identity_tensor(Q) if unitary is None else np.reshape(unitary, Q * [2, 2])
+        # Work buffers owned by the circuit, at most two
+        self._buffers: typing.List[np.ndarray] = []
+
+    def _spare(self) -> np.ndarray:
+        """Return a work buffer not holding the current unitary"""
+        for buffer in self._buffers:
+            if not np.may_share_memory(buffer, self._unitary):
+                return buffer
+        buffer = WORK_BUFFERS.take(self.Q * (2, 2))
+        self._buffers.append(buffer)
+        return buffer
+
+    def add_gate(self, gate: np.ndarray, qubits: typing.Sequence[int]) -> None:
+        """Append a k-qubit gate
+
+        Arguments:
+            gate {np.ndarray} -- (2**k,2**k) matrix representation of the gate
+            qubits {typing.Sequence[int]} -- target qubits
+        """
+        self._unitary = get_plan(qubits, self.Q).apply_dense(gate, self._unitary, self._spare())
 
     def add_one_qubit(self, gate: np.ndarray, qubit: int) -> None:
         """Append a 1-qubit gate
@@ -27,10 +457,7 @@ class UnitaryCircuit(object):
             gate {np.ndarray} -- matrix representation of the gate
             qubit {int} -- target qubit
         """
-        gate_tensor = np.array(gate, dtype=complex)
-        indexes = einsum_matmul_index([qubit], self.Q)
-        self._unitary = np.einsum(
-            indexes, gate_tensor, self._unitary, dtype=complex, casting='no')
+        self.add_gate(gate, [qubit])
 
     def add_two_qubits(self, gate: np.ndarray, qubit0: int, qubit1: int) -> None:
         """Append a 2-qubit gate
@@ -40,55 +467,741 @@ class UnitaryCircuit(object):
             qubit0 {int} -- first target qubit
             qubit1 {int} -- second target qubit
         """
-        gate_tensor = np.reshape(np.array(gate, dtype=complex), 4 * [2])
-        indexes = einsum_matmul_index([qubit0, qubit1], self.Q)
-        self._unitary = np.einsum(
-            indexes, gate_tensor, self._unitary, dtype=complex, casting='no')
+        self.add_gate(gate, [qubit0, qubit1])
+
+    def add_diagonal(self, diagonal: np.ndarray, qubits: typing.Sequence[int]) -> None:
+        """Append a diagonal gate as an elementwise phase multiplication
+
+        Arguments:
+            diagonal {np.ndarray} -- (2**k,) diagonal of the gate
+            qubits {typing.Sequence[int]} -- target qubits
+        """
+        self._unitary = get_plan(qubits, self.Q).apply_diagonal(diagonal, self._unitary, self._spare())
+
+    def add_permutation(self, permutation: np.ndarray, qubits: typing.Sequence[int]) -> None:
+        """Append a permutation gate as a permutation of unitary rows
+
+        Arguments:
+            permutation {np.ndarray} -- (2**k,) row i of the gate has its 1 in column permutation[i]
+            qubits {typing.Sequence[int]} -- target qubits
+        """
+        self._unitary = get_plan(qubits, self.Q).apply_permutation(permutation, self._unitary, self._spare())
+
+    def add(self,
+            gate: typing.Type[Gate],
+            qubits: typing.Sequence[int],
+            params: typing.Sequence[float] = (),
+            dagger: bool = False) -> None:
+        """Append a gate
+
+        Arguments:
+            gate {typing.Type[Gate]} -- a class derived from Gate
+            qubits {typing.Sequence[int]} -- target qubits
+            params {typing.Sequence[float]} -- gate params (default: {()})
+            dagger {bool} -- append the adjoint of the gate (default: {False})
+        """
+        if gate.diagonal and gate.permutation:
+            # Identity
+            return
+
+        self.add_matrix(gate, gate_matrix(gate, params), qubits, dagger)
+
+    def add_matrix(self,
+                   gate: typing.Type[Gate],
+                   matrix: np.ndarray,
+                   qubits: typing.Sequence[int],
+                   dagger: bool = False) -> None:
+        """Append the matrix of a gate, using specialized kernels for diagonal and permutation gates
+
+        Arguments:
+            gate {typing.Type[Gate]} -- a class derived from Gate
+            matrix {np.ndarray} -- matrix of the gate
+            qubits {typing.Sequence[int]} -- target qubits
+            dagger {bool} -- append the adjoint of the gate (default: {False})
+        """
+        if gate.diagonal and gate.permutation:
+            # Identity
+            return
+
+        plan = get_plan(qubits, self.Q)
+        if gate.diagonal:
+            diagonal = np.diagonal(matrix)
+            if dagger:
+                diagonal = np.conjugate(diagonal)
+            self._unitary = plan.apply_diagonal(diagonal, self._unitary, self._spare())
+        elif gate.permutation:
+            permutation = gate_permutation(gate, matrix)
+            if dagger:
+                permutation = np.argsort(permutation)
+            self._unitary = plan.apply_permutation(permutation, self._unitary, self._spare())
+        else:
+            if dagger:
+                matrix = np.conjugate(matrix.T)
+            self._unitary = plan.apply_dense(matrix, self._unitary, self._spare())
+
+    def add_instruction(self, instruction: Instruction, dagger: bool = False) -> None:
+        """Append an instruction
+
+        Arguments:
+            instruction {Instruction} -- a quantum instruction
+            dagger {bool} -- append the adjoint of the instruction (default: {False})
+        """
+        params = instruction.params if instruction.params is not None else ()
+        self.add(instruction.gate, instruction.qubits, params, dagger)
+
+    def add_arrays(self,
+                   gate_ids: np.ndarray,
+                   qubits: np.ndarray,
+                   params: np.ndarray,
+                   dagger: bool = False) -> None:
+        """Append a sequence of instructions in array representation (see Circuit)
+
+        Arguments:
+            gate_ids {np.ndarray} -- (L,) gate ids
+            qubits {np.ndarray} -- (L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (L,MAX_PARAMS) padded params
+            dagger {bool} -- append the adjoint of the sequence (default: {False})
+        """
+        matrices = instruction_matrices(gate_ids, params)
+        rows = zip(gate_ids.tolist(), qubits.tolist(), matrices)
+        if dagger:
+            rows = reversed(list(rows))
+
+        for gid, q, matrix in rows:
+            gate = GATES[gid]
+            self.add_matrix(gate, matrix, q[:gate.n_qubits], dagger)
+
+    def add_compiled(self, ops: typing.Sequence[CompiledGate]) -> None:
+        """Append the gates of a compiled circuit (see compile_arrays)
+
+        Arguments:
+            ops {typing.Sequence[CompiledGate]} -- compiled gates
+        """
+        for op in ops:
+            self._unitary = op.apply(self._unitary, self.Q, self._spare())
 
     def to_matrix(self) -> np.ndarray:
-        """Matrix representation of the circuit
+        """Matrix representation of the circuit. The work buffer holding it is handed over
+        to the caller, the other goes back to the pool; appending gates afterwards takes
+        new buffers.
 
         Returns:
             np.ndarray -- (2**Q,2**Q) unitary matrix
         """
-        return np.reshape(self._unitary, 2 * [2**self.Q])
+        held = [buffer for buffer in self._buffers if np.may_share_memory(buffer, self._unitary)]
+        for buffer in self._buffers:
+            if not held or buffer is not held[0]:
+                WORK_BUFFERS.give(buffer)
+        self._buffers = []
+
+        matrix = np.reshape(self._unitary, 2 * [2**self.Q])
+        if not held:
+            # No gate applied (or bit flips only): a view of the starting unitary, which the caller must not get
+            matrix = np.array(matrix)
+        return matrix
+
+
+def layer_gates(gate_ids: np.ndarray,
+                qubits: np.ndarray,
+                params: np.ndarray) -> typing.List[typing.Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Return the non-identity instructions of a layer (one per batch member) grouped by number of qubits
+
+    Arguments:
+        gate_ids {np.ndarray} -- (N,) gate ids, -1 for no-op
+        qubits {np.ndarray} -- (N,MAX_QUBITS) padded target qubits
+        params {np.ndarray} -- (N,MAX_PARAMS) padded params
+
+    Returns:
+        typing.List[typing.Tuple[np.ndarray, np.ndarray, np.ndarray]] -- (M,) batch members,
+                                                  (M,2**k,2**k) gate matrices, (M,k) target qubits
+    """
+    active = gate_ids >= 0
+    ids = np.where(active, gate_ids, 0)
+    active &= ~(gate_table('diagonal')[ids] & gate_table('permutation')[ids])
+    n_qubits = gate_table('n_qubits')[ids]
+
+    groups = []
+    for k in np.unique(n_qubits[active]):
+        index = np.flatnonzero(active & (n_qubits == k))
+        groups.append((index, batch_gate_matrix(gate_ids[index], params[index]), qubits[index, :k].astype(int)))
+    return groups
+
+
+def lower_arrays(Q: int, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> typing.List[CompiledGate]:
+    """Return the gates simulating a circuit in array representation: compiled from
+    FUSION_MIN_QUBITS qubits, one per non-identity instruction below
+
+    Arguments:
+        Q {int} -- number of qubits
+        gate_ids {np.ndarray} -- (L,) gate ids
+        qubits {np.ndarray} -- (L,MAX_QUBITS) padded target qubits
+        params {np.ndarray} -- (L,MAX_PARAMS) padded params
+
+    Returns:
+        typing.List[CompiledGate] -- gates whose product is the circuit unitary
+    """
+    if Q >= FUSION_MIN_QUBITS:
+        return compile_arrays(Q, gate_ids, qubits, params)
+
+    ops = []
+    for gid, q, matrix in zip(gate_ids.tolist(), qubits.tolist(), instruction_matrices(gate_ids, params)):
+        gate = GATES[gid]
+        if not (gate.diagonal and gate.permutation):
+            ops.append(CompiledGate.from_gate(gate, matrix, q[:gate.n_qubits]))
+    return ops
+
+
+def identity_columns(Q: int, columns: typing.Optional[typing.Union[slice, np.ndarray]] = None) -> np.ndarray:
+    """Return columns of the (2**Q,2**Q) identity, without building it
+
+    Arguments:
+        Q {int} -- number of qubits
+        columns {typing.Optional[typing.Union[slice, np.ndarray]]} -- column indices (default: {None}, all)
+
+    Returns:
+        np.ndarray -- (2**Q,C) basis states
+    """
+    inputs = np.arange(2**Q) if columns is None else np.arange(2**Q)[columns]
+    identity = np.zeros((2**Q, len(inputs)), dtype=complex)
+    identity[inputs, np.arange(len(inputs))] = 1
+    return identity
+
+
+def simulate_columns(Q: int, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray,
+                     columns: np.ndarray) -> np.ndarray:
+    """Return U @ columns for the unitary U of a circuit in array representation, pushing
+    the columns through the lowered gates in O(k 2**Q) per gate. columns is not modified,
+    the result may be a view of it.
+
+    Arguments:
+        Q {int} -- number of qubits
+        gate_ids {np.ndarray} -- (L,) gate ids
+        qubits {np.ndarray} -- (L,MAX_QUBITS) padded target qubits
+        params {np.ndarray} -- (L,MAX_PARAMS) padded params
+        columns {np.ndarray} -- (2**Q,k) input vectors
+
+    Returns:
+        np.ndarray -- (2**Q,k) output vectors
+    """
+    k = columns.shape[1]
+    tensor = np.reshape(columns, Q * [2] + [k])
+    for op in lower_arrays(Q, gate_ids, qubits, params):
+        tensor = op.apply(tensor, Q)
+    return np.reshape(tensor, (2**Q, k))
+
+
+class BatchUnitaryCircuit(object):
+    """Unitary representation of a batch of circuits on the same qubits"""
+
+    def __init__(self,
+                 N: int,
+                 Q: int,
+                 columns: typing.Optional[typing.Union[slice, np.ndarray]] = None) -> None:
+        """Initialize N identity unitaries
+
+        Arguments:
+            N {int} -- batch size
+            Q {int} -- number of qubits
+            columns {typing.Optional[typing.Union[slice, np.ndarray]]} -- only simulate these columns
+                                                of the unitaries (default: {None}, all columns)
+        """
+        self.N = N
+        self.Q = Q
+        self._unitary = np.tile(identity_columns(Q, columns), (N, 1, 1))
+
+    def add_gates(self, gates: np.ndarray, qubits: np.ndarray, index: np.ndarray) -> None:
+        """Append k-qubit gates, one per selected batch member
+
+        Every output row i of a gate on qubits q mixes the 2**k rows of the unitary
+        that agree with i outside q: both the source rows and the gate coefficients
+        are gathered with index arithmetic, so that members acting on different
+        qubits are updated by the same few vectorized calls.
+
+        Arguments:
+            gates {np.ndarray} -- (M,2**k,2**k) gate matrices
+            qubits {np.ndarray} -- (M,k) target qubits
+            index {np.ndarray} -- (M,) batch members the gates are appended to
+        """
+        k = qubits.shape[1]
+        rows = np.arange(2**self.Q)
+        sub = np.arange(2**k)
+        shifts = np.arange(k)
+
+        # Gate row of every output row: bits of i on the target qubits
+        row_sub = np.sum(((rows[None, :, None] >> qubits[:, None, :]) & 1) << shifts, axis=2)
+        # Source rows: bits of i outside the targets, bits of s on the targets
+        mask = np.sum(1 << qubits, axis=1)
+        scatter = np.sum((((sub[:, None] >> shifts) & 1)[None] << qubits[:, None, :]), axis=2)
+        src = (rows[None, :, None] & ~mask[:, None, None]) | scatter[:, None, :]
+
+        coeff = np.take_along_axis(gates, row_sub[:, :, None], axis=1)
+        self._unitary[index] = np.einsum(
+            'mis,misj->mij', coeff, self._unitary[index[:, None, None], src])
+
+    def add_layer(self, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> None:
+        """Append one instruction per batch member, identities are skipped
+
+        Arguments:
+            gate_ids {np.ndarray} -- (N,) gate ids, -1 for no-op
+            qubits {np.ndarray} -- (N,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (N,MAX_PARAMS) padded params
+        """
+        for index, gates, q in layer_gates(gate_ids, qubits, params):
+            self.add_gates(gates, q, index)
+
+    def to_matrix(self) -> np.ndarray:
+        """Matrix representation of the batch
+
+        Returns:
+            np.ndarray -- (N,2**Q,2**Q) unitary matrices, (N,2**Q,C) if built on C columns
+        """
+        return self._unitary
+
+
+class PartialProducts(object):
+    """Prefix and suffix partial products of the unitary of a circuit.
+
+    Given instructions G_1 ... G_L, prefix[k] = G_k ... G_1 and
+    suffix_dag[k] = (G_L ... G_{k+1})^dag, so that U = suffix_dag[k]^dag prefix[k] for any k.
+    Suffixes are computed lazily, the first time an edited circuit needs them.
+    """
+
+    def __init__(self, circuit: "Circuit", prefix: typing.List[np.ndarray]) -> None:
+        # Snapshot of the arrays, the circuit may be edited in place later on
+        self.Q = circuit.Q
+        self.gate_ids = circuit.gate_ids.copy()
+        self.qubits = circuit.qubits.copy()
+        self.params = circuit.params.copy()
+        self.prefix = prefix
+        self.suffix_dag = None
+
+    def __len__(self) -> int:
+        return len(self.gate_ids)
+
+    @property
+    def valid(self) -> bool:
+        """False once the products have been evicted"""
+        return self.prefix is not None
+
+    @property
+    def nbytes(self) -> int:
+        size = len(self.prefix) * self.prefix[0].nbytes
+        if self.suffix_dag is not None:
+            size += len(self.suffix_dag) * self.suffix_dag[0].nbytes
+        return size
+
+    def build_suffixes(self) -> None:
+        """Compute suffix products with a backward sweep over the cached instructions"""
+        UC = UnitaryCircuit(self.Q)
+        suffix_dag = [UC.to_matrix()]
+        for k in reversed(range(len(self))):
+            UC.add_arrays(self.gate_ids[k:k+1], self.qubits[k:k+1], self.params[k:k+1], dagger=True)
+            suffix_dag.append(UC.to_matrix())
+        for matrix in suffix_dag:
+            matrix.setflags(write=False)
+        self.suffix_dag = suffix_dag[::-1]
+
+    def drop(self) -> None:
+        self.prefix = None
+        self.suffix_dag = None
+
+
+def _equal_rows(a: typing.Tuple[np.ndarray, ...], b: typing.Tuple[np.ndarray, ...]) -> np.ndarray:
+    """Rowwise equality of two (gate_ids, qubits, params) array triplets of the same length"""
+    return (a[0] == b[0]) & np.all(a[1] == b[1], axis=1) & np.all(a[2] == b[2], axis=1)
+
+
+class UnitaryCache(object):
+    """Memory bounded LRU store of circuit partial products.
+
+    A circuit scored through the cache keeps a reference to its partial products,
+    which are shared with its clones. When a clone differs from the cached circuit
+    only in a window of instructions (point edit, insertion, deletion, crossover),
+    its unitary is rebuilt from the cached prefix applying the instructions in the
+    window, then the common suffix: its instructions go through the gate kernels,
+    unless a product with the cached suffix is estimated cheaper (small unitaries).
+    """
+
+    def __init__(self, max_bytes: int = 2**28, max_window: typing.Optional[int] = None) -> None:
+        """Initialize an empty cache
+
+        Arguments:
+            max_bytes {int} -- memory budget for stored products (default: {2**28})
+            max_window {typing.Optional[int]} -- max number of instructions to re-apply on a hit
+                                                 (default: {None}, half the circuit size)
+        """
+        self.max_bytes = max_bytes
+        self.max_window = max_window
+
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: typing.Dict[int, PartialProducts] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        for entry in self._entries.values():
+            entry.drop()
+        self._entries.clear()
+        self.nbytes = 0
+
+    def _touch(self, entry: PartialProducts) -> None:
+        self._entries.move_to_end(id(entry))
+
+    def _store(self, entry: PartialProducts, old_nbytes: int = 0) -> None:
+        self._entries[id(entry)] = entry
+        self._entries.move_to_end(id(entry))
+        self.nbytes += entry.nbytes - old_nbytes
+
+        while self.nbytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            evicted.drop()
+            self.evictions += 1
+
+    def _build(self, circuit: "Circuit") -> np.ndarray:
+        # to_matrix hands its buffer over: snapshots are not overwritten by the next gates
+        UC = UnitaryCircuit(circuit.Q)
+        prefix = [UC.to_matrix()]
+        for k in range(len(circuit)):
+            UC.add_arrays(circuit.gate_ids[k:k+1], circuit.qubits[k:k+1], circuit.params[k:k+1])
+            prefix.append(UC.to_matrix())
+        for matrix in prefix:
+            matrix.setflags(write=False)
+
+        entry = PartialProducts(circuit, prefix)
+        circuit._partials = entry
+        self._store(entry)
+
+        # The caller gets its own matrix, the snapshot stays in the cache
+        return prefix[-1].copy()
+
+    def to_matrix(self, circuit: "Circuit") -> np.ndarray:
+        """Return the matrix representation of circuit, reusing cached products if possible
+
+        Arguments:
+            circuit {Circuit} -- a circuit obj
+
+        Returns:
+            np.ndarray -- (2**Q,2**Q) unitary matrix
+        """
+        entry = circuit._partials
+
+        if entry is None or not entry.valid:
+            self.misses += 1
+            return self._build(circuit)
+
+        # Common prefix and common (non overlapping) suffix with the cached circuit
+        old = (entry.gate_ids, entry.qubits, entry.params)
+        new = (circuit.gate_ids, circuit.qubits, circuit.params)
+        n_old, n_new = len(entry), len(circuit)
+        n = min(n_old, n_new)
+
+        diff = np.flatnonzero(~_equal_rows([x[:n] for x in old], [x[:n] for x in new]))
+        a = diff[0] if len(diff) else n
+        m = n - a
+        diff = np.flatnonzero(~_equal_rows([x[n_old - m:] for x in old], [x[n_new - m:] for x in new]))
+        b = m - 1 - diff[-1] if len(diff) else m
+
+        window = n_new - a - b
+        max_window = self.max_window
+        if max_window is None:
+            max_window = n_new // 2
+        if window > max_window:
+            self.misses += 1
+            return self._build(circuit)
+
+        self.hits += 1
+        self._touch(entry)
+
+        UC = UnitaryCircuit(circuit.Q, entry.prefix[a])
+        UC.add_arrays(*[x[a:n_new - b] for x in new])
+
+        if b == 0:
+            return UC.to_matrix()
+
+        # Gate kernels cost O(4**Q) per instruction, a product with the cached suffix O(8**Q)
+        suffix = [x[n_new - b:] for x in new]
+        cost = sum(kernel_cost(circuit.Q, GATES[gid].n_qubits, GATES[gid].diagonal, GATES[gid].permutation)
+                   for gid in suffix[0].tolist())
+        if cost <= product_cost(circuit.Q):
+            UC.add_arrays(*suffix)
+            return UC.to_matrix()
+
+        if entry.suffix_dag is None:
+            old_nbytes = entry.nbytes
+            entry.build_suffixes()
+            suffix_dag = entry.suffix_dag[n_old - b]
+            self._store(entry, old_nbytes)
+        else:
+            suffix_dag = entry.suffix_dag[n_old - b]
+
+        return np.dot(np.conjugate(suffix_dag.T), UC.to_matrix())
+
+
+class FitnessCache(object):
+    """Bounded LRU store of fitness values keyed by circuit.
+
+    Keys are the bytes of the gate ids, target qubits and params of a circuit,
+    params being quantized to resolution, so that circuits differing only by
+    rounding noise in their params share the same entry.
+    """
+
+    def __init__(self, max_size: int = 2**16, resolution: float = 1e-9) -> None:
+        """Initialize an empty cache
+
+        Arguments:
+            max_size {int} -- max number of stored values (default: {2**16})
+            resolution {float} -- quantization step of params (default: {1e-9})
+        """
+        self.max_size = max_size
+        self.resolution = resolution
+
+        self.hits = 0
+        self.misses = 0
+
+        self._values: typing.Dict[bytes, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    def keys(self, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> typing.List[bytes]:
+        """Return the key of each circuit in padded array representation
+
+        Arguments:
+            gate_ids {np.ndarray} -- (N,L) gate ids, -1 for padding
+            qubits {np.ndarray} -- (N,L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (N,L,MAX_PARAMS) padded params
+
+        Returns:
+            typing.List[bytes] -- N keys
+        """
+        params = np.round(np.asarray(params) / self.resolution).astype(np.int64)
+        return self._pack_keys(gate_ids, qubits, params)
+
+    @staticmethod
+    def _pack_keys(gate_ids: np.ndarray, qubits: np.ndarray, steps: np.ndarray) -> typing.List[bytes]:
+        """Return the keys of circuits with params quantized to steps"""
+        gate_ids = np.asarray(gate_ids, dtype=np.int16)
+        qubits = np.asarray(qubits, dtype=np.int8)
+        lengths = np.sum(gate_ids >= 0, axis=1)
+        return [g[:n].tobytes() + q[:n].tobytes() + p[:n].tobytes()
+                for g, q, p, n in zip(gate_ids, qubits, steps, lengths.tolist())]
+
+    def key(self, circuit: "Circuit") -> bytes:
+        return self.keys(circuit.gate_ids[None], circuit.qubits[None], circuit.params[None])[0]
+
+    def get(self, key: bytes) -> typing.Optional[float]:
+        """Return the value stored for key, None on a miss"""
+        value = self._values.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._values.move_to_end(key)
+        return value
+
+    def put(self, key: bytes, value: float) -> None:
+        self._values[key] = value
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+
+    def checkpoint_state(self) -> typing.Dict[str, np.ndarray]:
+        """Return the entries, from least to most recently used, and counters as named arrays:
+        keys are unpacked to padded gate ids, target qubits and quantized params
+
+        Returns:
+            typing.Dict[str, np.ndarray] -- named arrays
+        """
+        # Bytes per instruction: int16 gate id, int8 qubits, int64 params
+        size = 2 + MAX_QUBITS + 8 * MAX_PARAMS
+        lengths = [len(key) // size for key in self._values]
+        L = max(lengths, default=0)
+        gate_ids = np.full((len(lengths), L), -1, dtype=np.int16)
+        qubits = np.full((len(lengths), L, MAX_QUBITS), -1, dtype=np.int8)
+        steps = np.zeros((len(lengths), L, MAX_PARAMS), dtype=np.int64)
+        for idx, (key, n) in enumerate(zip(self._values, lengths)):
+            gate_ids[idx, :n] = np.frombuffer(key, dtype=np.int16, count=n)
+            qubits[idx, :n] = np.frombuffer(key, dtype=np.int8, count=n * MAX_QUBITS,
+                                            offset=2 * n).reshape(n, MAX_QUBITS)
+            steps[idx, :n] = np.frombuffer(key, dtype=np.int64, offset=(2 + MAX_QUBITS) * n).reshape(n, MAX_PARAMS)
+        return {'gate_ids': gate_ids, 'qubits': qubits, 'steps': steps,
+                'values': np.array(list(self._values.values()), dtype=float),
+                'hits': np.array(self.hits), 'misses': np.array(self.misses)}
+
+    def restore_state(self, state: typing.Dict[str, np.ndarray]) -> None:
+        """Replace the entries and counters with those of checkpoint_state
+
+        Arguments:
+            state {typing.Dict[str, np.ndarray]} -- named arrays
+        """
+        keys = self._pack_keys(state['gate_ids'], state['qubits'], state['steps'])
+        self._values = OrderedDict(zip(keys, state['values'].tolist()))
+        while len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+        self.hits = int(state['hits'])
+        self.misses = int(state['misses'])
 
 
 class Circuit(object):
-    """Quantum circuit as a sequence of quantum instructions"""
+    """Quantum circuit as a sequence of quantum instructions.
+
+    Instructions are stored as a struct of arrays: gate ids (see pyqcd.gates.GATES),
+    target qubits padded with -1 and params padded with 0.
+    Instruction objects are built on access and packed on assignment.
+    """
 
-    def __init__(self, Q: int, instructions: typing.Sequence[Instruction]) -> None:
+    def __init__(self, Q: int, instructions: typing.Sequence[Instruction] = ()) -> None:
         """Initialize a quantum circuit
 
         Arguments:
             Q {int} -- number of qubits
-            instructions {typing.Sequence[Instruction]} -- sequence of quantum instructions
+            instructions {typing.Sequence[Instruction]} -- sequence of quantum instructions (default: {()})
         """
         self.Q = Q
         self.score = None
         self.instructions = instructions
+        # Partial products shared with clones, see UnitaryCache
+        self._partials = None
+
+    @classmethod
+    def from_arrays(cls,
+                    Q: int,
+                    gate_ids: np.ndarray,
+                    qubits: np.ndarray,
+                    params: np.ndarray) -> "Circuit":
+        """Build a circuit on the given arrays (not copied)
+
+        Arguments:
+            Q {int} -- number of qubits
+            gate_ids {np.ndarray} -- (L,) gate ids
+            qubits {np.ndarray} -- (L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (L,MAX_PARAMS) padded params
+
+        Returns:
+            Circuit -- a circuit obj
+        """
+        circuit = cls(Q)
+        circuit.gate_ids = gate_ids
+        circuit.qubits = qubits
+        circuit.params = params
+        return circuit
+
+    @staticmethod
+    def pack(instructions: typing.Sequence[Instruction]) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the array representation of a sequence of instructions
+
+        Arguments:
+            instructions {typing.Sequence[Instruction]} -- sequence of quantum instructions
+
+        Returns:
+            typing.Tuple[np.ndarray, np.ndarray, np.ndarray] -- gate ids, qubits, params arrays
+        """
+        gate_ids = np.empty(len(instructions), dtype=np.int16)
+        qubits = np.full((len(instructions), MAX_QUBITS), -1, dtype=np.int8)
+        params = np.zeros((len(instructions), MAX_PARAMS))
+
+        for idx, instr in enumerate(instructions):
+            gate_ids[idx] = gate_id(instr.gate)
+            qubits[idx, :instr.gate.n_qubits] = instr.qubits
+            if instr.gate.n_params:
+                params[idx, :instr.gate.n_params] = instr.params
+
+        return gate_ids, qubits, params
+
+    @property
+    def instructions(self) -> typing.Tuple[Instruction, ...]:
+        """Tuple of instructions, built from the arrays: edit the circuit with item assignment,
+        insert, append, pop or by assigning instructions"""
+        return tuple(self[idx] for idx in range(len(self)))
+
+    @instructions.setter
+    def instructions(self, instructions: typing.Sequence[Instruction]) -> None:
+        self.gate_ids, self.qubits, self.params = self.pack(instructions)
 
     def clone(self) -> "Circuit":
-        clone = Circuit(self.Q, deepcopy(self.instructions))
+        clone = Circuit.from_arrays(self.Q, self.gate_ids.copy(), self.qubits.copy(), self.params.copy())
         clone.score = self.score
+        clone._partials = self._partials
         return clone
 
+    def __getitem__(self, idx: int) -> Instruction:
+        gate = GATES[self.gate_ids[idx]]
+        return Instruction(gate,
+                           self.qubits[idx, :gate.n_qubits].astype(int),
+                           self.params[idx, :gate.n_params].copy())
+
+    def __setitem__(self, idx: int, instruction: Instruction) -> None:
+        gate_ids, qubits, params = self.pack([instruction])
+        self.gate_ids[idx] = gate_ids[0]
+        self.qubits[idx] = qubits[0]
+        self.params[idx] = params[0]
+
+    def gate(self, idx: int) -> typing.Type[Gate]:
+        """Return the gate class of instruction idx"""
+        return GATES[self.gate_ids[idx]]
+
+    def set_qubits(self, idx: int, qubits: typing.Sequence[int]) -> None:
+        """Set the target qubits of instruction idx"""
+        self.qubits[idx, :len(qubits)] = qubits
+
+    def set_params(self, idx: int, params: typing.Sequence[float]) -> None:
+        """Set the params of instruction idx"""
+        self.params[idx, :len(params)] = params
+
+    def insert(self, idx: int, instruction: Instruction) -> None:
+        gate_ids, qubits, params = self.pack([instruction])
+        self.gate_ids = np.insert(self.gate_ids, idx, gate_ids, axis=0)
+        self.qubits = np.insert(self.qubits, idx, qubits, axis=0)
+        self.params = np.insert(self.params, idx, params, axis=0)
+
     def append(self, instruction: Instruction) -> None:
-        self.instructions.append(instruction)
+        self.insert(len(self), instruction)
+
+    def pop(self, idx: int = -1) -> Instruction:
+        instruction = self[idx]
+        self.gate_ids = np.delete(self.gate_ids, idx, axis=0)
+        self.qubits = np.delete(self.qubits, idx, axis=0)
+        self.params = np.delete(self.params, idx, axis=0)
+        return instruction
+
+    def swap_prefix(self, other: "Circuit", idx: int) -> None:
+        """Exchange the first idx instructions with another circuit"""
+        for attr in ['gate_ids', 'qubits', 'params']:
+            a, b = getattr(self, attr), getattr(other, attr)
+            a[:idx], b[:idx] = b[:idx].copy(), a[:idx].copy()
 
     def __len__(self) -> int:
-        return len(self.instructions)
+        return len(self.gate_ids)
+
+    def to_matrix(self, cache: typing.Optional[UnitaryCache] = None) -> np.ndarray:
+        """Return the matrix representation of the circuit
+
+        Arguments:
+            cache {typing.Optional[UnitaryCache]} -- partial products cache (default: {None})
+        """
+        if cache is not None:
+            return cache.to_matrix(self)
 
-    def to_matrix(self) -> np.ndarray:
-        """Return the matrix representation of the circuit"""
         UC = UnitaryCircuit(self.Q)
-        for i in self.instructions:
-            if i.gate.n_qubits == 1:
-                UC.add_one_qubit(i.to_matrix(), *i.qubits)
-            else:
-                UC.add_two_qubits(i.to_matrix(), *i.qubits)
+        if self.Q >= FUSION_MIN_QUBITS:
+            UC.add_compiled(self.compile())
+        else:
+            UC.add_arrays(self.gate_ids, self.qubits, self.params)
         return UC.to_matrix()
 
+    def compile(self) -> typing.List[CompiledGate]:
+        """Return the lowered form of the circuit used for simulation (see compile_arrays)"""
+        return compile_arrays(self.Q, self.gate_ids, self.qubits, self.params)
+
     def to_qasm(self) -> str:
         """Return circuit as QASM string"""
         qasm_str = "OPENQASM 2.0;\ninclude \"qelib1.inc\";\nqreg q[%d];\n" % self.Q
@@ -101,9 +1214,223 @@ class Circuit(object):
 
         return qasm_str
 
-    def to_qiskit_circuit(self) -> QuantumCircuit:
+    def to_qiskit_circuit(self) -> "QuantumCircuit":
         """Return qiskit.QuantumCircuit"""
+        from qiskit import QuantumCircuit
+
         return QuantumCircuit.from_qasm_str(self.to_qasm())
 
     def __str__(self) -> str:
         return str(self.to_qiskit_circuit())
+
+
+def stack_arrays(circuits: typing.Sequence[Circuit]) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the array representations of circuits padded to the same length
+
+    Arguments:
+        circuits {typing.Sequence[Circuit]} -- circuit objs
+
+    Returns:
+        typing.Tuple[np.ndarray, np.ndarray, np.ndarray] -- (N,L) gate ids padded with -1,
+                                                            (N,L,MAX_QUBITS) qubits, (N,L,MAX_PARAMS) params
+    """
+    depth = max([len(c) for c in circuits], default=0)
+    gate_ids = np.full((len(circuits), depth), -1, dtype=np.int16)
+    qubits = np.full((len(circuits), depth, MAX_QUBITS), -1, dtype=np.int8)
+    params = np.zeros((len(circuits), depth, MAX_PARAMS))
+
+    for idx, c in enumerate(circuits):
+        gate_ids[idx, :len(c)] = c.gate_ids
+        qubits[idx, :len(c)] = c.qubits
+        params[idx, :len(c)] = c.params
+
+    return gate_ids, qubits, params
+
+
+def batch_arrays_to_matrix(Q: int, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> np.ndarray:
+    """Return the stacked matrix representations of circuits in padded array representation
+
+    Arguments:
+        Q {int} -- number of qubits
+        gate_ids {np.ndarray} -- (N,L) gate ids, -1 for no-op
+        qubits {np.ndarray} -- (N,L,MAX_QUBITS) padded target qubits
+        params {np.ndarray} -- (N,L,MAX_PARAMS) padded params
+
+    Returns:
+        np.ndarray -- (N,2**Q,2**Q) unitary matrices
+    """
+    BUC = BatchUnitaryCircuit(gate_ids.shape[0], Q)
+    for t in range(gate_ids.shape[1]):
+        BUC.add_layer(gate_ids[:, t], qubits[:, t], params[:, t])
+    return BUC.to_matrix()
+
+
+def iter_unitaries(Q: int,
+                   gate_ids: np.ndarray,
+                   qubits: np.ndarray,
+                   params: np.ndarray) -> typing.Iterator[typing.Tuple[slice, np.ndarray]]:
+    """Yield the unitaries of circuits in padded array representation by chunks of bounded memory:
+    layered batches of at most BATCH_MAX_BYTES up to BATCH_MAX_QUBITS qubits, one circuit
+    simulated with Circuit.to_matrix above
+
+    Arguments:
+        Q {int} -- number of qubits
+        gate_ids {np.ndarray} -- (N,L) gate ids, -1 for padding
+        qubits {np.ndarray} -- (N,L,MAX_QUBITS) padded target qubits
+        params {np.ndarray} -- (N,L,MAX_PARAMS) padded params
+
+    Yields:
+        typing.Tuple[slice, np.ndarray] -- rows of the chunk, (len(rows),2**Q,2**Q) unitaries
+    """
+    N = len(gate_ids)
+    if Q > BATCH_MAX_QUBITS:
+        lengths = np.sum(gate_ids >= 0, axis=1)
+        for idx, n in enumerate(lengths.tolist()):
+            circuit = Circuit.from_arrays(Q, gate_ids[idx, :n], qubits[idx, :n], params[idx, :n])
+            yield slice(idx, idx + 1), circuit.to_matrix()[None]
+        return
+
+    # The batch, its kernel output and the gather temporaries
+    size = max(1, BATCH_MAX_BYTES // (3 * 4**Q * np.dtype(complex).itemsize))
+    for start in range(0, N, size):
+        rows = slice(start, min(N, start + size))
+        yield rows, batch_arrays_to_matrix(Q, gate_ids[rows], qubits[rows], params[rows])
+
+
+def early_exit_block_size(N: int, Q: int) -> int:
+    """Columns per block of threshold_tr_distances for N circuits on Q qubits, 2**Q if no early exit is possible"""
+    dim = 2**Q
+    return min(dim, max(dim // EARLY_EXIT_BLOCKS, -(-EARLY_EXIT_MIN_ENTRIES // (N * dim))))
+
+
+def threshold_tr_distances(Q: int,
+                           gate_ids: np.ndarray,
+                           qubits: np.ndarray,
+                           params: np.ndarray,
+                           target: np.ndarray,
+                           thresholds: np.ndarray) -> np.ndarray:
+    """Return tr_distance of circuits in padded array representation, or REJECTED for
+    those proven unable to score below their threshold
+
+    Tr[target_dag U] is accumulated block of columns by block of columns. Every column of
+    two unitaries has unit norm, so each column left adds at most 1 to |Tr|: after c of the
+    n columns, the distance is at least 1 - (|partial trace| + n - c)/n. Circuits whose
+    bound exceeds their threshold are dropped before the next block. Blocks hold at least
+    EARLY_EXIT_MIN_ENTRIES entries for the whole batch, small problems are simulated at once.
+
+    Arguments:
+        Q {int} -- number of qubits
+        gate_ids {np.ndarray} -- (N,L) gate ids, -1 for no-op
+        qubits {np.ndarray} -- (N,L,MAX_QUBITS) padded target qubits
+        params {np.ndarray} -- (N,L,MAX_PARAMS) padded params
+        target {np.ndarray} -- (2**Q,2**Q) target unitary
+        thresholds {np.ndarray} -- (N,) distances to beat
+
+    Returns:
+        np.ndarray -- (N,) trace distances, REJECTED for rejected circuits
+    """
+    N, dim = len(gate_ids), 2**Q
+    size = early_exit_block_size(N, Q)
+    thresholds = np.broadcast_to(np.asarray(thresholds, dtype=float), (N,))
+    # Unknown thresholds (e.g. unscored parents) reject nothing
+    thresholds = np.where(np.isnan(thresholds), np.inf, thresholds)
+
+    if N == 1:
+        # A single circuit: structured kernels on the (rows, columns) tensor
+        length = np.count_nonzero(gate_ids[0] >= 0)
+        ops = lower_arrays(Q, gate_ids[0, :length], qubits[0, :length], params[0, :length])
+
+        def simulate(alive: np.ndarray, columns: slice) -> np.ndarray:
+            tensor = np.reshape(identity_columns(Q, columns), Q * [2] + [-1])
+            for op in ops:
+                tensor = op.apply(tensor, Q)
+            return np.reshape(tensor, (1, dim, -1))
+    else:
+        # Gate matrices are built once and gathered for the circuits still alive
+        layers = [layer_gates(gate_ids[:, t], qubits[:, t], params[:, t]) for t in range(gate_ids.shape[1])]
+
+        def simulate(alive: np.ndarray, columns: slice) -> np.ndarray:
+            position = np.full(N, -1)
+            position[alive] = np.arange(len(alive))
+            BUC = BatchUnitaryCircuit(len(alive), Q, columns)
+            for layer in layers:
+                for index, gates, q in layer:
+                    keep = position[index] >= 0
+                    if np.any(keep):
+                        BUC.add_gates(gates[keep], q[keep], position[index[keep]])
+            return BUC.to_matrix()
+
+    traces = np.zeros(N, dtype=complex)
+    alive = np.arange(N)
+    for start in range(0, dim, size):
+        columns = slice(start, start + size)
+        traces[alive] += np.einsum('nij,ij->n', simulate(alive, columns), np.conjugate(target[:, columns]))
+
+        left = dim - min(dim, start + size)
+        if left:
+            bound = 1 - (np.abs(traces[alive]) + left) / dim
+            alive = alive[bound <= thresholds[alive] + EARLY_EXIT_TOLERANCE]
+            if not len(alive):
+                break
+
+    distances = np.full(N, REJECTED)
+    distances[alive] = 1 - np.abs(traces[alive]) / dim
+    return distances
+
+
+def shared_structure_to_matrix(Q: int, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> np.ndarray:
+    """Return the matrix representations of K circuits sharing their gates and qubits,
+    differing only in their params
+
+    Gates without params are applied once to the whole stack, gates with params
+    are built for the K candidates at once and applied slice by slice.
+
+    Arguments:
+        Q {int} -- number of qubits
+        gate_ids {np.ndarray} -- (L,) gate ids
+        qubits {np.ndarray} -- (L,MAX_QUBITS) padded target qubits
+        params {np.ndarray} -- (K,L,MAX_PARAMS) padded params of each circuit
+
+    Returns:
+        np.ndarray -- (K,2**Q,2**Q) unitary matrices
+    """
+    K = len(params)
+    tensor = np.repeat(np.eye(2**Q, dtype=complex)[:, :, None], K, axis=2)
+    tensor = np.reshape(tensor, Q * [2, 2] + [K])
+
+    for idx, (gid, q) in enumerate(zip(gate_ids.tolist(), qubits.tolist())):
+        gate = GATES[gid]
+        if gate.diagonal and gate.permutation:
+            continue
+
+        plan = get_plan(q[:gate.n_qubits], Q)
+        if not gate.n_params:
+            matrix = constant_matrix(gate)
+            if gate.diagonal:
+                tensor = plan.apply_diagonal(np.diagonal(matrix), tensor)
+            elif gate.permutation:
+                tensor = plan.apply_permutation(gate_permutation(gate), tensor)
+            else:
+                tensor = plan.apply_dense(matrix, tensor)
+        elif gate.diagonal:
+            tensor = plan.apply_diagonal_batch(np.diagonal(gate.batch_to_matrix(params[:, idx]), axis1=1, axis2=2),
+                                               tensor)
+        else:
+            tensor = plan.apply_dense_batch(gate.batch_to_matrix(params[:, idx]), tensor)
+
+    return np.moveaxis(np.reshape(tensor, (2**Q, 2**Q, K)), -1, 0)
+
+
+def batch_to_matrix(circuits: typing.Sequence[Circuit]) -> np.ndarray:
+    """Return the stacked matrix representations of circuits on the same qubits
+
+    Circuits are simulated together, one instruction layer at a time;
+    shorter circuits are padded with identities.
+
+    Arguments:
+        circuits {typing.Sequence[Circuit]} -- circuits on Q qubits
+
+    Returns:
+        np.ndarray -- (N,2**Q,2**Q) unitary matrices
+    """
+    return batch_arrays_to_matrix(circuits[0].Q, *stack_arrays(circuits))
@@ -17,6 +17,11 @@ Matrix repr. of CX 0 1 (where 0 is control and 1 target):
 
 
 class Gate(object):
+    # Matrix structure, used by the simulator to pick a specialized kernel.
+    # A gate flagged both diagonal and permutation is the identity.
+    diagonal = False
+    permutation = False
+
     def __init__(self, name: str, n_qubits: int, params: typing.Optional[typing.Sequence[float]] = None) -> None:
         self.name = name
 
@@ -37,6 +42,44 @@ class Gate(object):
     def to_matrix(self) -> np.ndarray:
         raise NotImplementedError
 
+    @classmethod
+    def batch_to_matrix(cls, params: np.ndarray) -> np.ndarray:
+        """Return the matrices of n instances of the gate
+
+        Arguments:
+            params {np.ndarray} -- (n,n_params) params, extra columns are ignored
+
+        Returns:
+            np.ndarray -- (n,2**n_qubits,2**n_qubits) matrices
+        """
+        if cls.n_params:
+            # Generic fallback for gates without a vectorized construction
+            return np.array([cls(*p[:cls.n_params]).to_matrix() for p in params], dtype=complex)
+
+        matrix = constant_matrix(cls)
+        return np.broadcast_to(matrix, (len(params),) + matrix.shape)
+
+    @classmethod
+    def batch_derivatives(cls, params: np.ndarray) -> np.ndarray:
+        """Return the derivatives of the matrices of n instances of the gate w.r.t. each param
+
+        Arguments:
+            params {np.ndarray} -- (n,n_params) params, extra columns are ignored
+
+        Returns:
+            np.ndarray -- (n,n_params,2**n_qubits,2**n_qubits) derivatives
+        """
+        # Generic fallback: central differences
+        params = np.array(params[:, :cls.n_params], dtype=float)
+        eps = 1e-6
+        res = []
+        for idx in range(cls.n_params):
+            shift = np.zeros(cls.n_params)
+            shift[idx] = eps
+            res.append((cls.batch_to_matrix(params + shift) - cls.batch_to_matrix(params - shift)) / (2 * eps))
+        dim = 2**cls.n_qubits
+        return np.reshape(np.stack(res, axis=1), (len(params), cls.n_params, dim, dim))
+
     def __str__(self) -> str:
         return self.to_qasm()
 
@@ -45,6 +88,8 @@ class I(Gate):
     name = "id"
     n_qubits = 1
     n_params = 0
+    diagonal = True
+    permutation = True
 
     def __init__(self) -> None:
         super().__init__("id", 1, [])
@@ -57,6 +102,7 @@ class X(Gate):
     name = "x"
     n_qubits = 1
     n_params = 0
+    permutation = True
 
     def __init__(self) -> None:
         super().__init__("x", 1, [])
@@ -81,6 +127,7 @@ class Z(Gate):
     name = "z"
     n_qubits = 1
     n_params = 0
+    diagonal = True
 
     def __init__(self) -> None:
         super().__init__("z", 1, [])
@@ -98,12 +145,29 @@ class RX(Gate):
         super().__init__("rx", 1, [a])
 
     def to_matrix(self) -> np.ndarray:
-        a = float(self.params[0])
-        return np.array(
-            [
-                [np.cos(a/2), -1j*np.sin(a/2)],
-                [-1j*np.sin(a/2), np.cos(a/2)]
-            ], dtype=complex)
+        return self.batch_to_matrix(np.array([self.params], dtype=float))[0]
+
+    @staticmethod
+    def batch_to_matrix(params: np.ndarray) -> np.ndarray:
+        a = params[:, 0]
+        cos, sin = np.cos(a/2), np.sin(a/2)
+        out = np.empty((len(a), 2, 2), dtype=complex)
+        out[:, 0, 0] = cos
+        out[:, 0, 1] = -1j*sin
+        out[:, 1, 0] = -1j*sin
+        out[:, 1, 1] = cos
+        return out
+
+    @staticmethod
+    def batch_derivatives(params: np.ndarray) -> np.ndarray:
+        a = params[:, 0]
+        cos, sin = np.cos(a/2)/2, np.sin(a/2)/2
+        out = np.empty((len(a), 1, 2, 2), dtype=complex)
+        out[:, 0, 0, 0] = -sin
+        out[:, 0, 0, 1] = -1j*cos
+        out[:, 0, 1, 0] = -1j*cos
+        out[:, 0, 1, 1] = -sin
+        return out
 
 
 class RY(Gate):
@@ -115,29 +179,58 @@ class RY(Gate):
         super().__init__("ry", 1, [a])
 
     def to_matrix(self) -> np.ndarray:
-        a = float(self.params[0])
-        return np.array(
-            [
-                [np.cos(a/2), -np.sin(a/2)],
-                [np.sin(a/2), np.cos(a/2)]
-            ], dtype=complex)
+        return self.batch_to_matrix(np.array([self.params], dtype=float))[0]
+
+    @staticmethod
+    def batch_to_matrix(params: np.ndarray) -> np.ndarray:
+        a = params[:, 0]
+        cos, sin = np.cos(a/2), np.sin(a/2)
+        out = np.empty((len(a), 2, 2), dtype=complex)
+        out[:, 0, 0] = cos
+        out[:, 0, 1] = -sin
+        out[:, 1, 0] = sin
+        out[:, 1, 1] = cos
+        return out
+
+    @staticmethod
+    def batch_derivatives(params: np.ndarray) -> np.ndarray:
+        a = params[:, 0]
+        cos, sin = np.cos(a/2)/2, np.sin(a/2)/2
+        out = np.empty((len(a), 1, 2, 2), dtype=complex)
+        out[:, 0, 0, 0] = -sin
+        out[:, 0, 0, 1] = -cos
+        out[:, 0, 1, 0] = cos
+        out[:, 0, 1, 1] = -sin
+        return out
 
 
 class RZ(Gate):
     name = "rz"
     n_qubits = 1
     n_params = 1
+    diagonal = True
 
     def __init__(self, a: float):
         super().__init__("rz", 1, [a])
 
     def to_matrix(self) -> np.ndarray:
-        a = float(self.params[0])
-        return np.array(
-            [
-                [np.exp(-1j*a/2), 0],
-                [0, np.exp(1j*a/2)]
-            ], dtype=complex)
+        return self.batch_to_matrix(np.array([self.params], dtype=float))[0]
+
+    @staticmethod
+    def batch_to_matrix(params: np.ndarray) -> np.ndarray:
+        a = params[:, 0]
+        out = np.zeros((len(a), 2, 2), dtype=complex)
+        out[:, 0, 0] = np.exp(-1j*a/2)
+        out[:, 1, 1] = np.exp(1j*a/2)
+        return out
+
+    @staticmethod
+    def batch_derivatives(params: np.ndarray) -> np.ndarray:
+        a = params[:, 0]
+        out = np.zeros((len(a), 1, 2, 2), dtype=complex)
+        out[:, 0, 0, 0] = -0.5j*np.exp(-1j*a/2)
+        out[:, 0, 1, 1] = 0.5j*np.exp(1j*a/2)
+        return out
 
 
 class H(Gate):
@@ -156,6 +249,7 @@ class T(Gate):
     name = "t"
     n_qubits = 1
     n_params = 0
+    diagonal = True
 
     def __init__(self) -> None:
         super().__init__("t", 1, [])
@@ -168,6 +262,7 @@ class Tdg(Gate):
     name = "tdg"
     n_qubits = 1
     n_params = 0
+    diagonal = True
 
     def __init__(self) -> None:
         super().__init__("tdg", 1, [])
@@ -180,6 +275,7 @@ class S(Gate):
     name = "s"
     n_qubits = 1
     n_params = 0
+    diagonal = True
 
     def __init__(self) -> None:
         super().__init__("s", 1, [])
@@ -192,6 +288,7 @@ class Sdg(Gate):
     name = "sdg"
     n_qubits = 1
     n_params = 0
+    diagonal = True
 
     def __init__(self) -> None:
         super().__init__("sdg", 1, [])
@@ -228,17 +325,28 @@ class U1(Gate):
     name = "u1"
     n_qubits = 1
     n_params = 1
+    diagonal = True
 
     def __init__(self, a: float):
         super().__init__("u1", 1, [a])
 
     def to_matrix(self) -> np.ndarray:
-        a = float(self.params[0])
-        return np.array(
-            [
-                [1, 0],
-                [0, np.exp(1j * a)]
-            ], dtype=complex)
+        return self.batch_to_matrix(np.array([self.params], dtype=float))[0]
+
+    @staticmethod
+    def batch_to_matrix(params: np.ndarray) -> np.ndarray:
+        a = params[:, 0]
+        out = np.zeros((len(a), 2, 2), dtype=complex)
+        out[:, 0, 0] = 1
+        out[:, 1, 1] = np.exp(1j * a)
+        return out
+
+    @staticmethod
+    def batch_derivatives(params: np.ndarray) -> np.ndarray:
+        a = params[:, 0]
+        out = np.zeros((len(a), 1, 2, 2), dtype=complex)
+        out[:, 0, 1, 1] = 1j * np.exp(1j * a)
+        return out
 
 
 class U2(Gate):
@@ -250,12 +358,27 @@ class U2(Gate):
         super().__init__("u2", 1, [a, b])
 
     def to_matrix(self) -> np.ndarray:
-        a, b = [float(x) for x in self.params]
-        return 1/np.sqrt(2)*np.array(
-            [
-                [1,                 -np.exp(1j * b)],
-                [np.exp(1j * a),    np.exp(1j * (a + b))]
-            ], dtype=complex)
+        return self.batch_to_matrix(np.array([self.params], dtype=float))[0]
+
+    @staticmethod
+    def batch_to_matrix(params: np.ndarray) -> np.ndarray:
+        a, b = params[:, 0], params[:, 1]
+        out = np.empty((len(a), 2, 2), dtype=complex)
+        out[:, 0, 0] = 1
+        out[:, 0, 1] = -np.exp(1j * b)
+        out[:, 1, 0] = np.exp(1j * a)
+        out[:, 1, 1] = np.exp(1j * (a + b))
+        return 1/np.sqrt(2)*out
+
+    @staticmethod
+    def batch_derivatives(params: np.ndarray) -> np.ndarray:
+        a, b = params[:, 0], params[:, 1]
+        out = np.zeros((len(a), 2, 2, 2), dtype=complex)
+        out[:, 0, 1, 0] = 1j * np.exp(1j * a)
+        out[:, 0, 1, 1] = 1j * np.exp(1j * (a + b))
+        out[:, 1, 0, 1] = -1j * np.exp(1j * b)
+        out[:, 1, 1, 1] = 1j * np.exp(1j * (a + b))
+        return 1/np.sqrt(2)*out
 
 
 class U3(Gate):
@@ -267,20 +390,40 @@ class U3(Gate):
         super().__init__("u3", 1, [a, b, c])
 
     def to_matrix(self) -> np.ndarray:
-        a, b, c = [float(x) for x in self.params]
-        return np.array(
-            [
-                [np.cos(a / 2),                    -
-                 np.exp(1j * c) * np.sin(a / 2)],
-                [np.exp(1j * b) * np.sin(a / 2),
-                 np.exp(1j * (b + c)) * np.cos(a / 2)]
-            ], dtype=complex)
+        return self.batch_to_matrix(np.array([self.params], dtype=float))[0]
+
+    @staticmethod
+    def batch_to_matrix(params: np.ndarray) -> np.ndarray:
+        a, b, c = params[:, 0], params[:, 1], params[:, 2]
+        cos, sin = np.cos(a / 2), np.sin(a / 2)
+        out = np.empty((len(a), 2, 2), dtype=complex)
+        out[:, 0, 0] = cos
+        out[:, 0, 1] = -np.exp(1j * c) * sin
+        out[:, 1, 0] = np.exp(1j * b) * sin
+        out[:, 1, 1] = np.exp(1j * (b + c)) * cos
+        return out
+
+    @staticmethod
+    def batch_derivatives(params: np.ndarray) -> np.ndarray:
+        a, b, c = params[:, 0], params[:, 1], params[:, 2]
+        cos, sin = np.cos(a / 2), np.sin(a / 2)
+        out = np.zeros((len(a), 3, 2, 2), dtype=complex)
+        out[:, 0, 0, 0] = -sin / 2
+        out[:, 0, 0, 1] = -np.exp(1j * c) * cos / 2
+        out[:, 0, 1, 0] = np.exp(1j * b) * cos / 2
+        out[:, 0, 1, 1] = -np.exp(1j * (b + c)) * sin / 2
+        out[:, 1, 1, 0] = 1j * np.exp(1j * b) * sin
+        out[:, 1, 1, 1] = 1j * np.exp(1j * (b + c)) * cos
+        out[:, 2, 0, 1] = -1j * np.exp(1j * c) * sin
+        out[:, 2, 1, 1] = 1j * np.exp(1j * (b + c)) * cos
+        return out
 
 
 class CX(Gate):
     name = "cx"
     n_qubits = 2
     n_params = 0
+    permutation = True
 
     def __init__(self) -> None:
         super().__init__("cx", 2, [])
@@ -293,6 +436,7 @@ class CZ(Gate):
     name = "cz"
     n_qubits = 2
     n_params = 0
+    diagonal = True
 
     def __init__(self) -> None:
         super().__init__("cz", 2, [])
@@ -305,9 +449,134 @@ class CCX(Gate):
     name = "ccx"
     n_qubits = 3
     n_params = 0
+    permutation = True
 
     def __init__(self) -> None:
         super().__init__("ccx", 3, [])
 
     def to_matrix(self) -> np.ndarray:
         return matrices.CCX
+
+
+# Registry of gate classes: the id of a gate, used by the array representation
+# of circuits, is its index in GATES
+GATES: typing.List[typing.Type[Gate]] = [
+    I, X, Y, Z, RX, RY, RZ, H, T, Tdg, S, Sdg, V, Vdg, U1, U2, U3, CX, CZ, CCX]
+
+# Padding sizes of the array representation
+MAX_QUBITS = 3
+MAX_PARAMS = 3
+
+_GATE_IDS = {gate: idx for idx, gate in enumerate(GATES)}
+_TABLES = {}
+_MATRICES = {}
+_PERMUTATIONS = {}
+
+
+def gate_id(gate: typing.Type[Gate]) -> int:
+    """Return the id of a gate class, registering it if needed
+
+    Arguments:
+        gate {typing.Type[Gate]} -- a class derived from Gate
+
+    Returns:
+        int -- index of gate in GATES
+    """
+    if gate not in _GATE_IDS:
+        if gate.n_qubits > MAX_QUBITS or gate.n_params > MAX_PARAMS:
+            raise ValueError("Gate %s exceeds %d qubits or %d params" %
+                             (gate.name, MAX_QUBITS, MAX_PARAMS))
+        _GATE_IDS[gate] = len(GATES)
+        GATES.append(gate)
+    return _GATE_IDS[gate]
+
+
+def gate_table(attr: str) -> np.ndarray:
+    """Return a class attribute of every registered gate, as an array indexed by gate id
+
+    Arguments:
+        attr {str} -- attribute name, e.g. n_qubits
+
+    Returns:
+        np.ndarray -- (len(GATES),) array
+    """
+    if attr not in _TABLES or len(_TABLES[attr]) != len(GATES):
+        _TABLES[attr] = np.array([getattr(gate, attr) for gate in GATES])
+    return _TABLES[attr]
+
+
+def constant_matrix(gate: typing.Type[Gate]) -> np.ndarray:
+    """Return the (read-only) matrix of a gate class without params, computed once
+
+    Arguments:
+        gate {typing.Type[Gate]} -- a class derived from Gate
+
+    Returns:
+        np.ndarray -- (2**n_qubits,2**n_qubits) matrix
+    """
+    if gate not in _MATRICES:
+        matrix = np.array(gate().to_matrix(), dtype=complex)
+        matrix.flags.writeable = False
+        _MATRICES[gate] = matrix
+    return _MATRICES[gate]
+
+
+def gate_permutation(gate: typing.Type[Gate], matrix: typing.Optional[np.ndarray] = None) -> np.ndarray:
+    """Return the permutation of a permutation gate: row i of its matrix has its 1 in column perm[i].
+    Computed once for gates without params.
+
+    Arguments:
+        gate {typing.Type[Gate]} -- a class derived from Gate, flagged as permutation
+        matrix {typing.Optional[np.ndarray]} -- matrix of the gate, for gates with params (default: {None})
+
+    Returns:
+        np.ndarray -- (2**n_qubits,) permutation
+    """
+    if gate.n_params:
+        return np.argmax(np.abs(matrix), axis=1)
+
+    if gate not in _PERMUTATIONS:
+        _PERMUTATIONS[gate] = np.argmax(np.abs(constant_matrix(gate)), axis=1)
+    return _PERMUTATIONS[gate]
+
+
+def gate_matrix(gate: typing.Type[Gate], params: typing.Sequence[float] = ()) -> np.ndarray:
+    """Return the matrix representation of a gate class with params
+
+    Arguments:
+        gate {typing.Type[Gate]} -- a class derived from Gate
+        params {typing.Sequence[float]} -- gate params, extra (padding) values are ignored
+
+    Returns:
+        np.ndarray -- (2**n_qubits,2**n_qubits) matrix
+    """
+    if gate.n_params:
+        return gate.batch_to_matrix(np.array([params[:gate.n_params]], dtype=float))[0]
+    return constant_matrix(gate)
+
+
+def batch_gate_matrix(gate_ids: np.ndarray, params: np.ndarray) -> np.ndarray:
+    """Return the matrices of many instructions acting on the same number of qubits,
+    with one vectorized construction per distinct gate
+
+    Arguments:
+        gate_ids {np.ndarray} -- (...) gate ids
+        params {np.ndarray} -- (...,MAX_PARAMS) padded params
+
+    Returns:
+        np.ndarray -- (...,2**k,2**k) matrices
+    """
+    flat_ids = np.reshape(gate_ids, -1)
+    flat_params = np.reshape(params, (-1, MAX_PARAMS))
+
+    uniques = np.unique(flat_ids)
+    n_qubits = gate_table('n_qubits')[uniques]
+    if len(uniques) and np.any(n_qubits != n_qubits[0]):
+        raise ValueError("Gates acting on a different number of qubits")
+    dim = 2**n_qubits[0] if len(uniques) else 1
+
+    out = np.empty((len(flat_ids), dim, dim), dtype=complex)
+    for gid in uniques:
+        mask = flat_ids == gid
+        out[mask] = GATES[gid].batch_to_matrix(flat_params[mask])
+    return np.reshape(out, np.shape(gate_ids) + (dim, dim))
@@ -0,0 +1,103 @@
+import functools
+import typing
+from string import ascii_lowercase
+
+import numpy as np
+
+from pyqcd.circuit import UnitaryCircuit, apply_plan, instruction_matrices
+from pyqcd.gates import GATES, MAX_PARAMS, gate_table
+
+# Cost of a gradient sweep in circuit simulations: one forward, two gates per instruction backward
+GRADIENT_EVALS = 3
+
+
+@functools.lru_cache(maxsize=None)
+def environment_subscripts(qubits: typing.Tuple[int, ...], Q: int) -> str:
+    """Einsum subscripts tracing a (2**Q,2**Q) tensor over the qubits not in qubits,
+    leaving (gate rows, gate cols) axes in the basis of the gate matrices"""
+    plan = apply_plan(qubits, Q)
+    rows = ascii_lowercase[:Q]
+    cols = list(rows)
+    targets = ascii_lowercase[Q:Q + plan.k]
+    for pos, axis in enumerate(plan.axes):
+        cols[axis] = targets[pos]
+    return "%s%s->%s%s" % (rows, "".join(cols), "".join(rows[axis] for axis in plan.axes), targets)
+
+
+def trace_gradient(Q: int,
+                   gate_ids: np.ndarray,
+                   qubits: np.ndarray,
+                   params: np.ndarray,
+                   target: np.ndarray) -> typing.Tuple[complex, np.ndarray]:
+    """Return Tr[target_dag U] of a circuit U and its derivatives w.r.t. every param
+
+    With U = S_k G_k P_k (P_k, S_k products of the instructions before and after k),
+    the trace is Tr[G_k M_k] with M_k = P_k target_dag S_k for every k. A forward sweep
+    builds U, a backward sweep updates M_k = G_k_dag M_k+1 G_k+1, and each derivative
+    is the contraction of a gate derivative with M_k traced over the other qubits.
+
+    Arguments:
+        Q {int} -- number of qubits
+        gate_ids {np.ndarray} -- (L,) gate ids
+        qubits {np.ndarray} -- (L,MAX_QUBITS) padded target qubits
+        params {np.ndarray} -- (L,MAX_PARAMS) padded params
+        target {np.ndarray} -- (2**Q,2**Q) target unitary
+
+    Returns:
+        typing.Tuple[complex, np.ndarray] -- trace, (L,MAX_PARAMS) derivatives (0 for padding)
+    """
+    n_qubits = gate_table('n_qubits')[gate_ids]
+    n_params = gate_table('n_params')[gate_ids]
+    matrices = instruction_matrices(gate_ids, params)
+
+    derivatives = [None] * len(gate_ids)
+    for gid in np.unique(gate_ids[n_params > 0]):
+        index = np.flatnonzero(gate_ids == gid)
+        for idx, derivative in zip(index.tolist(), GATES[gid].batch_derivatives(params[index])):
+            derivatives[idx] = derivative
+
+    # Forward sweep
+    circuit = UnitaryCircuit(Q)
+    for gid, q, matrix in zip(gate_ids.tolist(), qubits.tolist(), matrices):
+        circuit.add_matrix(GATES[gid], matrix, q[:GATES[gid].n_qubits])
+    env = np.dot(circuit.to_matrix(), np.conjugate(target.T))
+    trace = np.trace(env)
+
+    # Backward sweep
+    grads = np.zeros((len(gate_ids), MAX_PARAMS), dtype=complex)
+    for idx in reversed(range(len(gate_ids))):
+        gate = GATES[gate_ids[idx]]
+        q = tuple(qubits[idx, :n_qubits[idx]].tolist())
+
+        circuit = UnitaryCircuit(Q, env)
+        circuit.add_matrix(gate, matrices[idx], q, dagger=True)
+        env = circuit.to_matrix()
+
+        if derivatives[idx] is not None:
+            traced = np.einsum(environment_subscripts(q, Q), np.reshape(env, 2 * Q * [2]))
+            dim = 2**len(q)
+            grads[idx, :n_params[idx]] = np.einsum('pij,ji->p', derivatives[idx], np.reshape(traced, (dim, dim)))
+
+        # env G = (G_dag env_dag)_dag
+        circuit = UnitaryCircuit(Q, np.conjugate(env.T))
+        circuit.add_matrix(gate, matrices[idx], q, dagger=True)
+        env = np.conjugate(circuit.to_matrix().T)
+
+    return trace, grads
+
+
+def tr_distance_gradient(Q: int,
+                         gate_ids: np.ndarray,
+                         qubits: np.ndarray,
+                         params: np.ndarray,
+                         target: np.ndarray) -> typing.Tuple[float, np.ndarray]:
+    """Return tr_distance between a circuit and target, and its gradient w.r.t. every param
+
+    Returns:
+        typing.Tuple[float, np.ndarray] -- distance, (L,MAX_PARAMS) gradient (0 for padding)
+    """
+    trace, grads = trace_gradient(Q, gate_ids, qubits, params, target)
+    dim = target.shape[0]
+    if np.abs(trace) == 0:
+        return 1., np.zeros(grads.shape)
+    return 1 - np.abs(trace) / dim, -np.real(np.conjugate(trace) * grads) / (dim * np.abs(trace))
@@ -2,7 +2,7 @@ import typing
 import numpy as np
 from copy import deepcopy
 
-from pyqcd.gates import Gate
+from pyqcd.gates import Gate, gate_matrix
 
 
 class Instruction:
@@ -38,9 +38,7 @@ class Instruction:
 
     def to_matrix(self) -> np.ndarray:
         """Return the matrix representation of the instruction"""
-        if len(self.params):
-            return self.gate(*self.params).to_matrix()
-        return self.gate().to_matrix()
+        return gate_matrix(self.gate, self.params if self.params is not None else ())
 
     def __str__(self) -> str:
         return "%s, (%s), (%s)" % (self.gate.name, ",".join(str(x) for x in self.qubits), ",".join("%0.2f" % x for x in self.params))
@@ -1,21 +1,70 @@
-import pickle
+import json
+import os
+import struct
+import time
 import typing
+import uuid
 
 import numpy as np
 
+# Log file: MAGIC, header length (uint32), JSON header, then fixed width records. The header
+# holds the labels and an id of the run, telling readers apart a log overwritten by another run
+MAGIC = b"PYQCDLOG"
+HEADER = struct.Struct("<I")
+
+# Record: label index, kind of value, value (8 bytes)
+RECORD = np.dtype([('label', '<u2'), ('kind', 'u1'), ('value', '<f8')])
+FLOAT, INT, NONE = 0, 1, 2
+_FLOAT_RECORD = struct.Struct("<HBd")
+_INT_RECORD = struct.Struct("<HBq")
+
 
 class Logger:
-    def __init__(self, file: str, live_update: bool = True) -> None:
+    """Streaming logger: registered values are appended to the log file as fixed
+    width records, buffered in memory and flushed at most every flush_interval seconds.
+    The log is read back with load_log.
+    """
+
+    def __init__(self,
+                 file: str,
+                 live_update: bool = True,
+                 flush_interval: float = 1.,
+                 resume_at: typing.Optional[int] = None) -> None:
+        """
+        Arguments:
+            file {str} -- log file, overwritten
+            live_update {bool} -- flush records while registering, otherwise only on dump (default: {True})
+            flush_interval {float} -- min time between two flushes in seconds (default: {1.})
+            resume_at {typing.Optional[int]} -- append to an existing log truncated to this size,
+                                                as returned by size (default: {None})
+        """
         self.vars = {}
         self.file = file
         self.live_update = live_update
+        self.flush_interval = flush_interval
+
+        self._buffer = bytearray()
+        self._header_written = False
+        self._last_flush = time.time()
+
+        if resume_at is not None:
+            with open(self.file, "r+b") as f:
+                f.truncate(resume_at)
+                labels = read_header(f)
+            if labels is None:
+                raise ValueError("%s has no complete header" % self.file)
+            self.vars = {label: idx for idx, label in enumerate(labels)}
+            self._header_written = True
 
     def add_variables(self, *args):
         for label in args:
             if label in self.vars:
                 print(label, "already in", self.vars)
                 raise Exception
-            self.vars[label] = []
+            if self._header_written:
+                print(label, "added after the first flush of", self.file)
+                raise Exception
+            self.vars[label] = len(self.vars)
 
     def register(self, **kwargs) -> None:
         for label in kwargs:
@@ -23,11 +72,127 @@ class Logger:
                 print(label, "not in", self.vars)
                 raise Exception
 
-            self.vars[label].append(kwargs[label])
+            value = kwargs[label]
+            if value is None:
+                self._buffer += _INT_RECORD.pack(self.vars[label], NONE, 0)
+            elif isinstance(value, (int, np.integer)):
+                self._buffer += _INT_RECORD.pack(self.vars[label], INT, int(value))
+            else:
+                self._buffer += _FLOAT_RECORD.pack(self.vars[label], FLOAT, float(value))
 
-            if self.live_update:
-                self.dump()
+        if self.live_update and time.time() - self._last_flush >= self.flush_interval:
+            self.dump()
 
     def dump(self) -> None:
-        with open(self.file, "wb") as f:
-            pickle.dump(self.vars, f)
+        """Append buffered records to the log file"""
+        if not self._header_written:
+            header = json.dumps({'run': uuid.uuid4().hex, 'labels': list(self.vars)}).encode()
+            with open(self.file, "wb") as f:
+                f.write(MAGIC + HEADER.pack(len(header)) + header)
+            self._header_written = True
+
+        with open(self.file, "ab") as f:
+            f.write(self._buffer)
+        self._buffer = bytearray()
+        self._last_flush = time.time()
+
+    def size(self) -> int:
+        """Flush buffered records and return the size of the log file"""
+        self.dump()
+        return os.path.getsize(self.file)
+
+
+def read_header(f: typing.BinaryIO) -> typing.Optional[typing.List[str]]:
+    """Read the labels of a log, None if the header is not complete yet"""
+    start = f.read(len(MAGIC) + HEADER.size)
+    if len(start) < len(MAGIC) + HEADER.size:
+        return None
+    if start[:len(MAGIC)] != MAGIC:
+        raise ValueError("%s is not a log file" % f.name)
+
+    size, = HEADER.unpack(start[len(MAGIC):])
+    header = f.read(size)
+    if len(header) < size:
+        return None
+    header = json.loads(header.decode())
+    # Logs written before run ids have a list of labels as header
+    return header if isinstance(header, list) else header['labels']
+
+
+def decode_records(data: bytes, labels: typing.Sequence[str]) -> typing.Dict[str, typing.List]:
+    """Decode complete records into a {label: list} dict
+
+    Arguments:
+        data {bytes} -- records, a whole number of them
+        labels {typing.Sequence[str]} -- labels of the log
+
+    Returns:
+        typing.Dict[str, typing.List] -- values of each label
+    """
+    records = np.frombuffer(data, dtype=RECORD)
+    floats = records['value']
+    ints = floats.view('<i8')
+
+    res = {}
+    for idx, label in enumerate(labels):
+        index = np.flatnonzero(records['label'] == idx)
+        kinds = records['kind'][index]
+        values = floats[index].tolist()
+        if np.any(kinds != FLOAT):
+            for pos, (kind, value) in enumerate(zip(kinds.tolist(), ints[index].tolist())):
+                if kind == INT:
+                    values[pos] = value
+                elif kind == NONE:
+                    values[pos] = None
+        res[label] = values
+    return res
+
+
+class LogReader:
+    """Incremental reader of a log written by Logger: each read returns only
+    the complete records appended since the previous read. A log overwritten
+    by another run, whose header differs, is read again from its start.
+    """
+
+    def __init__(self, file: str) -> None:
+        self.file = file
+        self.labels = None
+        self._header = b""
+        self._offset = 0
+
+    def read(self) -> typing.Dict[str, typing.List]:
+        """Return the values registered since the previous read
+
+        Returns:
+            typing.Dict[str, typing.List] -- new values of each label, empty while no header is written
+        """
+        with open(self.file, "rb") as f:
+            if (self.labels is None or os.fstat(f.fileno()).st_size < self._offset
+                    or f.read(len(self._header)) != self._header):
+                # First read, or the log has been overwritten
+                f.seek(0)
+                self.labels = read_header(f)
+                if self.labels is None:
+                    return {}
+                self._offset = f.tell()
+                f.seek(0)
+                self._header = f.read(self._offset)
+
+            f.seek(self._offset)
+            data = f.read()
+
+        data = data[:len(data) - len(data) % RECORD.itemsize]
+        self._offset += len(data)
+        return decode_records(data, self.labels)
+
+
+def load_log(file: str) -> typing.Dict[str, typing.List]:
+    """Read a log written by Logger, ignoring a trailing partially written record
+
+    Arguments:
+        file {str} -- log file
+
+    Returns:
+        typing.Dict[str, typing.List] -- values of each label, in order of registration
+    """
+    return LogReader(file).read()
@@ -1,24 +1,200 @@
+import typing
+
 import numpy as np
 
+# Max number of elements of the temporaries used by the elementwise distances
+BLOCK_SIZE = 2**16
+
+# Score of a candidate proven unable to beat its acceptance threshold by a
+# threshold-aware evaluation: worse than any score, so every acceptance test fails
+REJECTED = float('inf')
+
+# Normal quantile of the confidence intervals of sampled distances (95%)
+CONFIDENCE_Z = 1.96
+
 
 def tr_distance(a: np.ndarray, b: np.ndarray) -> float:
     """Computes 1 - 1/2^n |Tr[A_dag B]|
 
+    Tr[A_dag B] is the elementwise sum of conj(A) * B, computed in O(4^n)
+    without forming the matrix product.
+
     Arguments:
         a, b {np.ndarray} -- unitary matrices
     Returns:
         float -- the trace distance
     """
-    return 1 - 1/(a.shape[0]) * np.abs(np.trace(np.dot(np.conjugate(a.T), b)))
+    return 1 - 1/(a.shape[0]) * np.abs(np.vdot(a, b))
+
+
+def state_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """Computes the infidelity 1 - |<a|b>|^2 of two states
+
+    Arguments:
+        a, b {np.ndarray} -- normalized state vectors, (2^n,) or (2^n,1)
+    Returns:
+        float -- the infidelity
+    """
+    return 1 - np.abs(np.vdot(a, b))**2
+
+
+def isometry_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """Computes 1 - 1/k |Tr[A_dag B]|, tr_distance restricted to k columns
+
+    Arguments:
+        a, b {np.ndarray} -- (2^n,k) matrices with orthonormal columns
+    Returns:
+        float -- the distance
+    """
+    return 1 - 1/(a.shape[1]) * np.abs(np.vdot(a, b))
+
+
+def _diff_blocks(a: np.ndarray, b: np.ndarray) -> typing.Iterator[np.ndarray]:
+    """Yield a - b by blocks of rows of at most BLOCK_SIZE elements, written in a single buffer"""
+    a = np.reshape(a, (len(a), -1))
+    b = np.reshape(b, (len(b), -1))
+    rows = max(1, BLOCK_SIZE // max(1, a.shape[1]))
+    buf = np.empty((min(rows, len(a)), a.shape[1]), dtype=np.result_type(a, b))
+    for start in range(0, len(a), rows):
+        chunk = buf[:min(rows, len(a) - start)]
+        np.subtract(a[start:start + rows], b[start:start + rows], out=chunk)
+        yield chunk
 
 
 def d1(a: np.ndarray, b: np.ndarray) -> float:
-    return np.sum(np.abs(a - b))
+    return sum(np.sum(np.abs(chunk)) for chunk in _diff_blocks(a, b))
 
 
 def d2(a: np.ndarray, b: np.ndarray) -> float:
-    return np.sqrt(np.sum(np.abs(a - b)**2))
+    return np.sqrt(sum(np.vdot(chunk, chunk).real for chunk in _diff_blocks(a, b)))
 
 
 def d_inf(a: np.ndarray, b: np.ndarray) -> float:
-    return np.max(np.abs(a - b))
+    return max(np.max(np.abs(chunk)) for chunk in _diff_blocks(a, b))
+
+
+def batch_tr_distance(stack: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """Computes tr_distance of each matrix of a stack against the same target
+
+    Arguments:
+        stack {np.ndarray} -- (N,n,n) unitary matrices
+        target {np.ndarray} -- (n,n) unitary matrix
+    Returns:
+        np.ndarray -- (N,) trace distances
+    """
+    traces = np.dot(np.reshape(stack, (len(stack), -1)), np.conjugate(np.ravel(target)))
+    return 1 - 1/(target.shape[0]) * np.abs(traces)
+
+
+def batch_state_distance(stack: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """Computes state_distance of each state of a stack against the same target
+
+    Arguments:
+        stack {np.ndarray} -- (N,2^n) or (N,2^n,1) states
+        target {np.ndarray} -- (2^n,) or (2^n,1) state
+    Returns:
+        np.ndarray -- (N,) infidelities
+    """
+    overlaps = np.dot(np.reshape(stack, (len(stack), -1)), np.conjugate(np.ravel(target)))
+    return 1 - np.abs(overlaps)**2
+
+
+def batch_isometry_distance(stack: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """Computes isometry_distance of each matrix of a stack against the same target
+
+    Arguments:
+        stack {np.ndarray} -- (N,2^n,k) matrices
+        target {np.ndarray} -- (2^n,k) matrix
+    Returns:
+        np.ndarray -- (N,) distances
+    """
+    traces = np.dot(np.reshape(stack, (len(stack), -1)), np.conjugate(np.ravel(target)))
+    return 1 - 1/(target.shape[1]) * np.abs(traces)
+
+
+def random_states(Q: int, n: int) -> np.ndarray:
+    """Draw Haar random states
+
+    Arguments:
+        Q {int} -- number of qubits
+        n {int} -- number of states
+
+    Returns:
+        np.ndarray -- (2^Q,n) normalized states
+    """
+    states = np.random.standard_normal((2**Q, n)) + 1j * np.random.standard_normal((2**Q, n))
+    return states / np.linalg.norm(states, axis=0)
+
+
+def sampled_tr_distance(overlaps: np.ndarray,
+                        dim: int,
+                        z: float = CONFIDENCE_Z) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Estimates tr_distance(A, B) from overlaps <A psi|B psi> on n Haar random states psi.
+
+    The mean overlap is an unbiased estimate of t = 1/2^Q Tr[A_dag B], whose samples
+    have variance (1 - |t|^2) / (2^Q + 1): a few states are enough at large Q,
+    and intervals shrink to 0 as |t| reaches 1.
+
+    Arguments:
+        overlaps {np.ndarray} -- (...,n) overlaps
+        dim {int} -- dimension 2^Q of the states
+        z {float} -- normal quantile of the interval (default: {CONFIDENCE_Z})
+    Returns:
+        typing.Tuple[np.ndarray, np.ndarray] -- (...,) estimated distances, half widths of their intervals
+    """
+    t = np.minimum(np.abs(np.mean(overlaps, axis=-1)), 1)
+    return 1 - t, z * np.sqrt((1 - t**2) / ((dim + 1) * overlaps.shape[-1]))
+
+
+def _batch_elementwise(stack: np.ndarray,
+                       target: np.ndarray,
+                       mat_dist: typing.Callable,
+                       reduce: typing.Callable) -> np.ndarray:
+    """Apply an elementwise distance to a stack, reducing stack - target by blocks
+    of matrices of at most BLOCK_SIZE elements. Matrices larger than a block, or
+    empty stacks, fall back to mat_dist on each matrix.
+    """
+    if not len(stack) or target.size > BLOCK_SIZE:
+        return np.array([mat_dist(m, target) for m in stack], dtype=float)
+
+    size = BLOCK_SIZE // target.size
+    return np.concatenate([reduce(np.reshape(stack[start:start + size] - target, (-1, target.size)))
+                           for start in range(0, len(stack), size)])
+
+
+def batch_d1(stack: np.ndarray, target: np.ndarray) -> np.ndarray:
+    return _batch_elementwise(stack, target, d1, lambda diff: np.sum(np.abs(diff), axis=1))
+
+
+def batch_d2(stack: np.ndarray, target: np.ndarray) -> np.ndarray:
+    return _batch_elementwise(stack, target, d2, lambda diff: np.linalg.norm(diff, axis=1))
+
+
+def batch_d_inf(stack: np.ndarray, target: np.ndarray) -> np.ndarray:
+    return _batch_elementwise(stack, target, d_inf, lambda diff: np.max(np.abs(diff), axis=1))
+
+
+BATCH_DISTANCES = {
+    tr_distance: batch_tr_distance,
+    d1: batch_d1,
+    d2: batch_d2,
+    d_inf: batch_d_inf,
+    state_distance: batch_state_distance,
+    isometry_distance: batch_isometry_distance,
+}
+
+
+def batch_distance(mat_dist: typing.Callable) -> typing.Callable:
+    """Return the batched variant of a matrix distance: a function of a (N,n,n) stack
+    and a (n,n) target returning (N,) distances. Distances without a batched variant
+    are applied to each matrix of the stack.
+
+    Arguments:
+        mat_dist {typing.Callable} -- matrix distance
+
+    Returns:
+        typing.Callable -- batched matrix distance
+    """
+    if mat_dist in BATCH_DISTANCES:
+        return BATCH_DISTANCES[mat_dist]
+    return lambda stack, target: np.array([mat_dist(m, target) for m in stack], dtype=float)
@@ -1,3 +1,5 @@
+import typing
+
 import numpy as np
 
 I = np.eye(2, dtype=complex)
@@ -49,7 +51,7 @@ def Grover(Q: int) -> np.ndarray:
     return 2*A - Identity(Q)
 
 
-def random_unitary(Q: int) -> np.ndarray:
+def random_unitary(Q: int, seed: typing.Optional[int] = None) -> np.ndarray:
     from qiskit.quantum_info import random_unitary
 
-    return random_unitary(2**Q).data
+    return random_unitary(2**Q, seed=seed).data
@@ -0,0 +1,215 @@
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from pyqcd.circuit import Circuit, identity_columns, iter_unitaries, lower_arrays
+from pyqcd.math_utils import batch_distance, tr_distance
+
+# Per process state of the workers, set by _init_worker
+_WORKER = {}
+
+
+def _init_worker(shm_name: str, shape: typing.Tuple[int, ...], dtype: str, mat_dist: typing.Callable) -> None:
+    """Attach a worker to the shared target"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _WORKER['shm'] = shm
+    _WORKER['target'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _WORKER['batch_mat_dist'] = batch_distance(mat_dist)
+
+
+def _distances(gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> np.ndarray:
+    """Worker task: simulate a chunk of circuits and return their distances to the shared target"""
+    target = _WORKER['target']
+    return _unitary_distances(target, _WORKER['batch_mat_dist'], gate_ids, qubits, params)
+
+
+def _unitary_distances(target: np.ndarray,
+                       batch_mat_dist: typing.Callable,
+                       gate_ids: np.ndarray,
+                       qubits: np.ndarray,
+                       params: np.ndarray) -> np.ndarray:
+    """Simulate circuits in padded array representation (see iter_unitaries) and return their distances to target"""
+    distances = np.empty(len(gate_ids))
+    for rows, matrices in iter_unitaries(int(np.log2(target.shape[0])), gate_ids, qubits, params):
+        distances[rows] = batch_mat_dist(matrices, target)
+    return distances
+
+
+class ProcessEvaluator(object):
+    """Process pool simulating batches of circuits against a target in shared memory.
+
+    Batches are split in chunks of padded arrays, one task per chunk; the target
+    is copied once in shared memory, where workers read it. Simulation draws no
+    random numbers, so results do not depend on the number of workers or scheduling.
+    """
+
+    def __init__(self,
+                 target: np.ndarray,
+                 mat_dist: typing.Callable = tr_distance,
+                 n_workers: typing.Optional[int] = None,
+                 min_chunk: int = 16) -> None:
+        """Start the workers
+
+        Arguments:
+            target {np.ndarray} -- target unitary
+            mat_dist {typing.Callable} -- matrix distance, must be picklable (default: {tr_distance})
+            n_workers {typing.Optional[int]} -- number of processes (default: {None}, number of cores)
+            min_chunk {int} -- min number of circuits per task, smaller batches are simulated
+                               in process (default: {16})
+        """
+        self.target = np.ascontiguousarray(target)
+        self.Q = int(np.log2(self.target.shape[0]))
+        self.mat_dist = mat_dist
+        self.batch_mat_dist = batch_distance(mat_dist)
+        self.min_chunk = min_chunk
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self.target.nbytes)
+        np.ndarray(self.target.shape, dtype=self.target.dtype, buffer=self._shm.buf)[:] = self.target
+
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(
+            self.n_workers, initializer=_init_worker,
+            initargs=(self._shm.name, self.target.shape, self.target.dtype.str, mat_dist))
+
+    def __enter__(self) -> "ProcessEvaluator":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stop the workers and release the shared target"""
+        if self._pool is None:
+            return
+        self._pool.shutdown()
+        self._pool = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def distance(self, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> float:
+        """Return the distance to the target of a single circuit in array representation, simulated in process
+
+        Arguments:
+            gate_ids {np.ndarray} -- (L,) gate ids
+            qubits {np.ndarray} -- (L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (L,MAX_PARAMS) padded params
+
+        Returns:
+            float -- distance
+        """
+        return self.mat_dist(Circuit.from_arrays(self.Q, gate_ids, qubits, params).to_matrix(), self.target)
+
+    def distances(self, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> np.ndarray:
+        """Return the distance to the target of circuits in padded array representation
+
+        Arguments:
+            gate_ids {np.ndarray} -- (N,L) gate ids, -1 for padding
+            qubits {np.ndarray} -- (N,L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (N,L,MAX_PARAMS) padded params
+
+        Returns:
+            np.ndarray -- (N,) distances
+        """
+        N = len(gate_ids)
+        n_chunks = min(self.n_workers, N // self.min_chunk)
+        if n_chunks <= 1:
+            return _unitary_distances(self.target, self.batch_mat_dist, gate_ids, qubits, params)
+
+        bounds = np.linspace(0, N, n_chunks + 1).astype(int)
+        futures = [self._pool.submit(_distances, gate_ids[start:stop], qubits[start:stop], params[start:stop])
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        return np.concatenate([future.result() for future in futures])
+
+
+class BlockedEvaluator(object):
+    """Memory-capped tr_distance evaluation for large unitaries.
+
+    Circuits are never simulated as a whole (2**Q,2**Q) unitary: blocks of basis
+    columns are pushed through the circuit independently and Tr[target_dag U] is
+    accumulated block by block, against the same columns of the target. Blocks are
+    sized so that the simulation buffers of all threads fit in max_bytes, and may
+    be simulated by a pool of threads (numpy releases the GIL in its kernels).
+    """
+
+    # Simulation buffers alive per block: the tensor, the kernel output and temporaries
+    BUFFERS_PER_BLOCK = 3
+
+    def __init__(self, target: np.ndarray, max_bytes: int = 2**28, n_threads: int = 1) -> None:
+        """Initialize an evaluator
+
+        Arguments:
+            target {np.ndarray} -- target unitary, not copied
+            max_bytes {int} -- memory cap of the simulation buffers (default: {2**28})
+            n_threads {int} -- number of threads simulating blocks (default: {1})
+        """
+        self.target = target
+        self.Q = int(np.log2(target.shape[0]))
+        self.mat_dist = tr_distance
+        self.max_bytes = max_bytes
+        self.n_threads = n_threads
+
+        # Power of 2 number of columns per block, at least one
+        column_bytes = self.BUFFERS_PER_BLOCK * 2**self.Q * np.dtype(complex).itemsize
+        columns = max(1, max_bytes // (n_threads * column_bytes))
+        self.block_size = min(2**self.Q, 2**int(np.log2(columns)))
+
+        self._pool = ThreadPoolExecutor(n_threads) if n_threads > 1 else None
+
+    def __enter__(self) -> "BlockedEvaluator":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stop the threads"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _block_trace(self, ops: list, start: int) -> complex:
+        """Return the contribution of columns [start, start + block_size) to Tr[target_dag U]"""
+        dim, size = 2**self.Q, self.block_size
+        tensor = np.reshape(identity_columns(self.Q, slice(start, start + size)), self.Q * [2] + [size])
+        for op in ops:
+            tensor = op.apply(tensor, self.Q)
+        return np.vdot(self.target[:, start:start + size], np.reshape(tensor, (dim, size)))
+
+    def trace(self, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> complex:
+        """Return Tr[target_dag U] of a circuit U in array representation
+
+        Arguments:
+            gate_ids {np.ndarray} -- (L,) gate ids
+            qubits {np.ndarray} -- (L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (L,MAX_PARAMS) padded params
+
+        Returns:
+            complex -- trace overlap
+        """
+        ops = lower_arrays(self.Q, gate_ids, qubits, params)
+        starts = range(0, 2**self.Q, self.block_size)
+        if self._pool is None:
+            return sum(self._block_trace(ops, start) for start in starts)
+        return sum(self._pool.map(lambda start: self._block_trace(ops, start), starts))
+
+    def distance(self, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> float:
+        """Return tr_distance between a circuit in array representation and the target"""
+        return 1 - np.abs(self.trace(gate_ids, qubits, params)) / 2**self.Q
+
+    def distances(self, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> np.ndarray:
+        """Return tr_distance to the target of circuits in padded array representation
+
+        Arguments:
+            gate_ids {np.ndarray} -- (N,L) gate ids, -1 for padding
+            qubits {np.ndarray} -- (N,L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (N,L,MAX_PARAMS) padded params
+
+        Returns:
+            np.ndarray -- (N,) distances
+        """
+        lengths = np.sum(gate_ids >= 0, axis=1)
+        return np.array([self.distance(g[:n], q[:n], p[:n]) for g, q, p, n in zip(gate_ids, qubits, params, lengths)],
+                        dtype=float)
@@ -0,0 +1,269 @@
+import typing
+
+import numpy as np
+
+from pyqcd.alphabet import Alphabet
+from pyqcd.circuit import Circuit, stack_arrays
+from pyqcd.gates import MAX_PARAMS, MAX_QUBITS, gate_table
+
+
+class Population(object):
+    """A population of circuits stored as padded arrays.
+
+    Individual i is made of the first lengths[i] instructions of row i of
+    gate_ids (N,L), qubits (N,L,MAX_QUBITS) and params (N,L,MAX_PARAMS);
+    padding instructions have gate id -1. Scores are NaN until computed.
+    Genetic operators act on the whole population with a few vectorized calls.
+    Individuals keep the partial products a UnitaryCache built for them, if any:
+    edited individuals are re-scored from those of their ancestor.
+    """
+
+    def __init__(self,
+                 Q: int,
+                 gate_ids: np.ndarray,
+                 qubits: np.ndarray,
+                 params: np.ndarray,
+                 scores: typing.Optional[np.ndarray] = None,
+                 partials: typing.Optional[np.ndarray] = None) -> None:
+        """Initialize a population on the given arrays (not copied)
+
+        Arguments:
+            Q {int} -- number of qubits
+            gate_ids {np.ndarray} -- (N,L) gate ids, -1 for padding
+            qubits {np.ndarray} -- (N,L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (N,L,MAX_PARAMS) padded params
+            scores {typing.Optional[np.ndarray]} -- (N,) scores (default: {None}, not scored)
+            partials {typing.Optional[np.ndarray]} -- (N,) object array of cached partial products
+                                                      or None (default: {None}, none)
+        """
+        self.Q = Q
+        self.gate_ids = gate_ids
+        self.qubits = qubits
+        self.params = params
+        self.lengths = np.sum(gate_ids >= 0, axis=1)
+        self.scores = np.full(len(gate_ids), np.nan) if scores is None else scores
+        self.partials = np.full(len(gate_ids), None, dtype=object) if partials is None else partials
+
+    @classmethod
+    def from_circuits(cls, Q: int, circuits: typing.Sequence[Circuit]) -> "Population":
+        """Pack circuits into a population
+
+        Arguments:
+            Q {int} -- number of qubits
+            circuits {typing.Sequence[Circuit]} -- circuit objs
+
+        Returns:
+            Population -- a population obj
+        """
+        scores = np.array([np.nan if c.score is None else c.score for c in circuits], dtype=float)
+        partials = np.full(len(circuits), None, dtype=object)
+        for idx, c in enumerate(circuits):
+            partials[idx] = c._partials
+        return cls(Q, *stack_arrays(circuits), scores, partials)
+
+    @classmethod
+    def random(cls, Q: int, alphabet: Alphabet, N: int, L: int) -> "Population":
+        """Return N random circuits of L instructions
+
+        Arguments:
+            Q {int} -- number of qubits
+            alphabet {Alphabet} -- universal set alphabet
+            N {int} -- number of individuals
+            L {int} -- number of instructions
+
+        Returns:
+            Population -- a population obj
+        """
+        return cls(Q, *alphabet.get_random_arrays((N, L)))
+
+    def __len__(self) -> int:
+        return len(self.gate_ids)
+
+    def __getitem__(self, idx: int) -> Circuit:
+        n = self.lengths[idx]
+        circuit = Circuit.from_arrays(self.Q,
+                                      self.gate_ids[idx, :n].copy(),
+                                      self.qubits[idx, :n].copy(),
+                                      self.params[idx, :n].copy())
+        circuit.score = None if np.isnan(self.scores[idx]) else self.scores[idx]
+        circuit._partials = self.partials[idx]
+        return circuit
+
+    def to_circuits(self) -> typing.List[Circuit]:
+        return [self[idx] for idx in range(len(self))]
+
+    def copy(self) -> "Population":
+        return Population(self.Q, self.gate_ids.copy(), self.qubits.copy(),
+                          self.params.copy(), self.scores.copy(), self.partials.copy())
+
+    def take(self, index: np.ndarray) -> "Population":
+        """Return a new population made of the individuals in index"""
+        return Population(self.Q, self.gate_ids[index], self.qubits[index],
+                          self.params[index], self.scores[index], self.partials[index])
+
+    def put(self, index: np.ndarray, other: "Population") -> None:
+        """Replace the individuals in index with the individuals of other"""
+        self.reserve(other.gate_ids.shape[1])
+        other.reserve(self.gate_ids.shape[1])
+
+        self.gate_ids[index] = other.gate_ids
+        self.qubits[index] = other.qubits
+        self.params[index] = other.params
+        self.lengths[index] = other.lengths
+        self.scores[index] = other.scores
+        self.partials[index] = other.partials
+
+    def reserve(self, L: int) -> None:
+        """Grow padding so that individuals can hold up to L instructions"""
+        extra = L - self.gate_ids.shape[1]
+        if extra <= 0:
+            return
+
+        N = len(self)
+        self.gate_ids = np.concatenate(
+            [self.gate_ids, np.full((N, extra), -1, dtype=self.gate_ids.dtype)], axis=1)
+        self.qubits = np.concatenate(
+            [self.qubits, np.full((N, extra, MAX_QUBITS), -1, dtype=self.qubits.dtype)], axis=1)
+        self.params = np.concatenate([self.params, np.zeros((N, extra, MAX_PARAMS))], axis=1)
+
+    def unscored(self) -> np.ndarray:
+        """Return indices of individuals not yet scored"""
+        return np.flatnonzero(np.isnan(self.scores))
+
+    def best(self) -> int:
+        """Return the index of the fittest individual"""
+        return int(np.nanargmin(self.scores))
+
+    def leaders(self, group_size: int) -> np.ndarray:
+        """Return the index of the fittest individual of each group of consecutive individuals
+
+        Arguments:
+            group_size {int} -- number of individuals per group
+
+        Returns:
+            np.ndarray -- (N//group_size,) indices
+        """
+        scores = np.reshape(self.scores, (-1, group_size))
+        return np.argmin(scores, axis=1) + np.arange(len(scores)) * group_size
+
+    def tournament_selection(self, t_size: int, n: int = 1) -> np.ndarray:
+        """Run n tournaments among t_size distinct random individuals
+
+        Returns:
+            np.ndarray -- (n,) indices of the winners
+        """
+        contestants = np.argsort(np.random.rand(n, len(self)), axis=1)[:, :t_size]
+        winners = np.argmin(self.scores[contestants], axis=1)
+        return contestants[np.arange(n), winners]
+
+    def crossover(self, a: np.ndarray, b: np.ndarray, points: np.ndarray) -> None:
+        """One point crossover: individuals a[i] and b[i] exchange their first points[i] instructions
+
+        Arguments:
+            a, b {np.ndarray} -- (P,) indices of the mates
+            points {np.ndarray} -- (P,) crossover points, not past the shortest mate
+        """
+        mask = np.arange(self.gate_ids.shape[1]) < points[:, None]
+        for arr in [self.gate_ids, self.qubits, self.params]:
+            m = np.reshape(mask, mask.shape + (1,) * (arr.ndim - 2))
+            arr_a, arr_b = arr[a], arr[b]
+            arr[a] = np.where(m, arr_b, arr_a)
+            arr[b] = np.where(m, arr_a, arr_b)
+
+        self.scores[a] = np.nan
+        self.scores[b] = np.nan
+
+    def mutate(self, index: np.ndarray, alphabet: Alphabet) -> None:
+        """Single point mutation of the individuals in index: a random instruction is
+        removed, changed (new instruction, new qubits or new params) or added
+
+        Arguments:
+            index {np.ndarray} -- (M,) indices of the individuals to mutate
+            alphabet {Alphabet} -- alphabet to draw new instructions from
+        """
+        M = len(index)
+        mode = np.random.randint(3, size=M)
+        # Empty individuals can only grow
+        mode[self.lengths[index] == 0] = 2
+        mut_mode = np.random.randint(3, size=M)
+
+        # Mutation point, insertions may happen past the last instruction
+        pos = np.floor(np.random.rand(M) * (self.lengths[index] + (mode == 2))).astype(int)
+        new_gate_ids, new_qubits, new_params = alphabet.get_random_arrays(M)
+
+        delete = mode == 0
+        insert = mode == 2
+        if np.any(insert):
+            self.reserve(np.max(self.lengths[index[insert]]) + 1)
+
+        # DELETE / INSERT: shift the tail of each row by one position
+        cols = np.arange(self.gate_ids.shape[1])
+        shift = np.zeros((M, len(cols)), dtype=int)
+        shift[delete] = cols >= pos[delete, None]
+        shift[insert] = -(cols > pos[insert, None]).astype(int)
+        src = np.clip(cols + shift, 0, len(cols) - 1)
+        for arr in ['gate_ids', 'qubits', 'params']:
+            getattr(self, arr)[index] = getattr(self, arr)[index[:, None], src]
+
+        rows, last = index[delete], self.lengths[index[delete]] - 1
+        self.gate_ids[rows, last] = -1
+        self.qubits[rows, last] = -1
+        self.params[rows, last] = 0
+        self.lengths[index] += insert.astype(int) - delete.astype(int)
+
+        # INSERT and CHANGE with a new instruction
+        new = insert | ((mode == 1) & (mut_mode == 0))
+        self.gate_ids[index[new], pos[new]] = new_gate_ids[new]
+        self.qubits[index[new], pos[new]] = new_qubits[new]
+        self.params[index[new], pos[new]] = new_params[new]
+
+        # CHANGE qubits or params of the existing instruction
+        change = (mode == 1) & (mut_mode == 1)
+        gids = self.gate_ids[index[change], pos[change]]
+        self.qubits[index[change], pos[change]] = alphabet.get_random_qubits_array(
+            gate_table('n_qubits')[gids])
+
+        change = (mode == 1) & (mut_mode == 2)
+        gids = self.gate_ids[index[change], pos[change]]
+        self.params[index[change], pos[change]] = alphabet.get_random_angles_array(
+            gate_table('n_params')[gids])
+
+        self.scores[index] = np.nan
+
+    def combine(self, leaders: "Population", randoms: "Population", weights: np.ndarray) -> "Population":
+        """One way crossover of each individual with a leader and a random individual
+
+        Each instruction is taken from current, leader or random with probabilities weights;
+        where the three share the same parametrized gate, params are combined arithmetically.
+
+        Arguments:
+            leaders {Population} -- leader of each individual
+            randoms {Population} -- random individuals
+            weights {np.ndarray} -- weights of respectively current, leader and random
+
+        Returns:
+            Population -- the combined individuals
+        """
+        N = len(self)
+        parents = [self, leaders, randoms]
+        L = max(x.gate_ids.shape[1] for x in parents)
+        for x in parents:
+            x.reserve(L)
+        gate_ids = np.array([x.gate_ids for x in parents])
+        qubits = np.array([x.qubits for x in parents])
+        params = np.array([x.params for x in parents])
+
+        # Past the shortest parent, instructions are taken from current
+        valid = np.all(gate_ids >= 0, axis=0)
+        choice = np.random.choice(np.arange(3), size=(N, L), p=weights)
+        choice = np.where(valid, choice, 0)
+
+        rows, cols = np.arange(N)[:, None], np.arange(L)
+        new_params = params[choice, rows, cols]
+
+        same = valid & (gate_table('n_params')[gate_ids[0]] > 0) & \
+            (gate_ids[0] == gate_ids[1]) & (gate_ids[0] == gate_ids[2])
+        new_params[same] = np.tensordot(weights, params[:, same], axes=1)
+
+        return Population(self.Q, gate_ids[choice, rows, cols], qubits[choice, rows, cols], new_params,
+                          partials=self.partials.copy())
@@ -0,0 +1,153 @@
+import itertools
+import json
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from pyqcd import algorithms, gates, matrices
+from pyqcd.alphabet import Alphabet
+from pyqcd.logger import Logger
+
+# Fields of a run matrix entry expanded as a cartesian product when given as lists
+MATRIX_FIELDS = ['target', 'qubits', 'solver', 'seeds']
+
+
+def expand_runs(matrix: typing.Dict) -> typing.List[typing.Dict]:
+    """Expand a run matrix into single run specifications
+
+    A run matrix is a dict with an output directory and a list of entries:
+        {"output": "data",
+         "runs": [{"target": "QFT", "qubits": [2, 3], "gates": ["I", "U3", "CX"],
+                   "solver": "MLOA", "params": {"n_groups": 50, "group_size": 5, "circuit_size": 15},
+                   "seeds": [0, 1, 2, 3], "n_evals": 100000}]}
+    Target, qubits, solver and seeds may be single values or lists, each combination
+    is a run. An optional "name" distinguishes entries sharing target and solver.
+    Runs save a checkpoint every "checkpoint_interval" generations (default 10, 0 disables),
+    from which they resume after an interruption. Logs are flushed at most every
+    "log_interval" seconds (default 1), so that runs can be followed live.
+
+    Arguments:
+        matrix {typing.Dict} -- run matrix
+
+    Returns:
+        typing.List[typing.Dict] -- run specifications, with their output path prefix
+    """
+    runs = []
+    for entry in matrix['runs']:
+        values = [entry[field] if isinstance(entry[field], list) else [entry[field]] for field in MATRIX_FIELDS]
+        for target, qubits, solver, seed in itertools.product(*values):
+            name = "%s_%s%d" % (entry['name'], target, qubits) if 'name' in entry else "%s%d" % (target, qubits)
+            runs.append({
+                'target': target,
+                'qubits': qubits,
+                'gates': entry['gates'],
+                'solver': solver,
+                'params': entry.get('params', {}),
+                'seed': seed,
+                'n_evals': entry['n_evals'],
+                'checkpoint_interval': entry.get('checkpoint_interval', 10),
+                'log_interval': entry.get('log_interval', 1.),
+                'path': os.path.join(matrix.get('output', 'data'), solver, "%s_seed%d" % (name, seed)),
+            })
+    return runs
+
+
+def is_done(run: typing.Dict) -> bool:
+    """A run is done when its QASM output, written last, exists"""
+    return os.path.exists(run['path'] + ".qasm")
+
+
+def get_target(name: str, Q: int, seed: typing.Optional[int] = None) -> np.ndarray:
+    """Return the target unitary named name on Q qubits (QFT, Grover, Identity or random)"""
+    if name == "random":
+        return matrices.random_unitary(Q, seed=seed)
+    return getattr(matrices, name)(Q)
+
+
+def solve(run: typing.Dict) -> typing.Dict:
+    """Perform a run, write its log and the QASM of its best circuit
+
+    Arguments:
+        run {typing.Dict} -- run specification, as returned by expand_runs
+
+    Returns:
+        typing.Dict -- summary of the run
+    """
+    np.random.seed(run['seed'])
+    target = get_target(run['target'], run['qubits'], run['seed'])
+
+    alphabet = Alphabet(Q=run['qubits'])
+    alphabet.register_gates([getattr(gates, name) for name in run['gates']])
+
+    solver = getattr(algorithms, run['solver'])(target=target, alphabet=alphabet, **run['params'])
+
+    os.makedirs(os.path.dirname(run['path']) or '.', exist_ok=True)
+    checkpoint = run['path'] + ".ckpt.npz"
+    if os.path.exists(checkpoint):
+        # Resume an interrupted run, dropping what was logged after the checkpoint
+        extra = solver.load_checkpoint(checkpoint)
+        logger = Logger(run['path'] + ".log", True, run['log_interval'], resume_at=extra['log_size'])
+    else:
+        logger = Logger(run['path'] + ".log", True, run['log_interval'])
+        logger.add_variables(*solver.stats().keys())
+
+    step = 0
+    while solver.n_evals < run['n_evals']:
+        # One step evolution
+        solver.evolve()
+        step += 1
+
+        # Gather statistics
+        logger.register(**solver.stats())
+
+        if run['checkpoint_interval'] and step % run['checkpoint_interval'] == 0:
+            solver.save_checkpoint(checkpoint, log_size=logger.size())
+    logger.dump()
+
+    # Write the QASM last and atomically, its existence marks the run as done
+    with open(run['path'] + ".qasm.tmp", 'w') as f:
+        f.write(solver.best.to_qasm())
+    os.replace(run['path'] + ".qasm.tmp", run['path'] + ".qasm")
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    return {'path': run['path'], 'gen': solver.gen, 'n_evals': solver.n_evals, 'score': solver.best.score}
+
+
+def run_matrix(matrix: typing.Dict, n_workers: typing.Optional[int] = None) -> typing.List[typing.Dict]:
+    """Perform the runs of a run matrix not done yet over a process pool
+
+    Arguments:
+        matrix {typing.Dict} -- run matrix, see expand_runs
+        n_workers {typing.Optional[int]} -- number of processes, 1 runs in process
+                                            (default: {None}, matrix "workers" or number of cores)
+
+    Returns:
+        typing.List[typing.Dict] -- summaries of the performed runs, in completion order
+    """
+    runs = [run for run in expand_runs(matrix) if not is_done(run)]
+    n_workers = n_workers or matrix.get('workers')
+
+    if n_workers == 1:
+        return [report(solve(run)) for run in runs]
+
+    with ProcessPoolExecutor(n_workers) as pool:
+        futures = [pool.submit(solve, run) for run in runs]
+        return [report(future.result()) for future in as_completed(futures)]
+
+
+def report(summary: typing.Dict) -> typing.Dict:
+    print("=============================")
+    print(summary['path'])
+    print("Generations %d" % summary['gen'])
+    print("Fitness evals %d" % summary['n_evals'])
+    print("Score %0.5f" % summary['score'])
+    print("=============================")
+    return summary
+
+
+def load_matrix(file: str) -> typing.Dict:
+    with open(file) as f:
+        return json.load(f)
@@ -0,0 +1,95 @@
+import typing
+
+import numpy as np
+
+from pyqcd.circuit import identity_columns, simulate_columns
+from pyqcd.math_utils import isometry_distance, state_distance
+
+
+class ColumnsTarget(object):
+    """Target defined on a few input basis states only: the circuit must map
+    basis state inputs[j] to columns[:, j]. Circuits are simulated on these k
+    inputs only, in O(k 2^Q) memory and time per gate instead of O(4^Q)."""
+
+    # Default distance between simulated and target columns
+    mat_dist: typing.Callable = staticmethod(isometry_distance)
+
+    def __init__(self, columns: np.ndarray, inputs: typing.Optional[typing.Sequence[int]] = None) -> None:
+        """Initialize a target
+
+        Arguments:
+            columns {np.ndarray} -- (2**Q,k) orthonormal target columns
+            inputs {typing.Optional[typing.Sequence[int]]} -- k input basis states
+                                                             (default: {None}, the first k)
+        """
+        columns = np.asarray(columns, dtype=complex)
+        if columns.ndim == 1:
+            columns = columns[:, None]
+        self.Q = int(np.log2(columns.shape[0]))
+        self.k = columns.shape[1]
+        if columns.shape[0] != 2**self.Q:
+            raise ValueError("Target columns of dimension %d are not a register of qubits" % columns.shape[0])
+        if not np.allclose(np.dot(np.conjugate(columns.T), columns), np.eye(self.k)):
+            raise ValueError("Target columns are not orthonormal")
+
+        self.inputs = np.arange(self.k) if inputs is None else np.asarray(inputs, dtype=int)
+        if len(self.inputs) != self.k or len(set(self.inputs.tolist())) != self.k:
+            raise ValueError("Expected %d distinct inputs, got %s" % (self.k, self.inputs))
+        self.columns = columns
+
+    @property
+    def shape(self) -> typing.Tuple[int, int]:
+        return self.columns.shape
+
+    def simulate(self, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> np.ndarray:
+        """Return the output columns of a circuit in array representation
+
+        Arguments:
+            gate_ids {np.ndarray} -- (L,) gate ids
+            qubits {np.ndarray} -- (L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (L,MAX_PARAMS) padded params
+
+        Returns:
+            np.ndarray -- (2**Q,k) columns
+        """
+        return simulate_columns(self.Q, gate_ids, qubits, params, identity_columns(self.Q, self.inputs))
+
+    def batch_simulate(self, gate_ids: np.ndarray, qubits: np.ndarray, params: np.ndarray) -> np.ndarray:
+        """Return the output columns of circuits in padded array representation. On a few columns the
+        structured kernels of each circuit beat the index arithmetic of BatchUnitaryCircuit.
+
+        Arguments:
+            gate_ids {np.ndarray} -- (N,L) gate ids, -1 for padding
+            qubits {np.ndarray} -- (N,L,MAX_QUBITS) padded target qubits
+            params {np.ndarray} -- (N,L,MAX_PARAMS) padded params
+
+        Returns:
+            np.ndarray -- (N,2**Q,k) columns
+        """
+        outputs = np.empty((len(gate_ids), 2**self.Q, self.k), dtype=complex)
+        lengths = np.sum(gate_ids >= 0, axis=1)
+        for idx, n in enumerate(lengths.tolist()):
+            outputs[idx] = self.simulate(gate_ids[idx, :n], qubits[idx, :n], params[idx, :n])
+        return outputs
+
+    def select(self, matrices: np.ndarray) -> np.ndarray:
+        """Return the input columns of full (...,2**Q,2**Q) circuit unitaries"""
+        return matrices[..., self.inputs]
+
+
+class IsometryTarget(ColumnsTarget):
+    """Isometry (subset of columns) target, scored with isometry_distance by default"""
+
+
+class StateTarget(ColumnsTarget):
+    """State preparation from |0...0>, scored with the infidelity state_distance by default"""
+
+    mat_dist: typing.Callable = staticmethod(state_distance)
+
+    def __init__(self, state: np.ndarray) -> None:
+        """Initialize a target
+
+        Arguments:
+            state {np.ndarray} -- (2**Q,) normalized state to prepare from |0...0>
+        """
+        super().__init__(np.reshape(state, (-1, 1)), [0])
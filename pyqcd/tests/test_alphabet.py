@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+from pyqcd.alphabet import Alphabet
+from pyqcd.gates import CX, U3, I
+
+
+class TestAlphabet(unittest.TestCase):
+    def make_alphabet(self, seed):
+        alphabet = Alphabet(Q=4, rng=np.random.default_rng(seed))
+        alphabet.register_gates([I, U3, CX])
+        return alphabet
+
+    def test_seeded_generator(self):
+        first = self.make_alphabet(0).get_random_arrays((8, 20))
+        second = self.make_alphabet(0).get_random_arrays((8, 20))
+        for a, b in zip(first, second):
+            self.assertTrue(np.array_equal(a, b))
+
+    def test_global_state(self):
+        alphabet = Alphabet(Q=4)
+        alphabet.register_gates([I, U3, CX])
+        np.random.seed(3)
+        first = alphabet.get_random_arrays((8, 20))
+        np.random.seed(3)
+        second = alphabet.get_random_arrays((8, 20))
+        for a, b in zip(first, second):
+            self.assertTrue(np.array_equal(a, b))
+
+    def test_random_arrays(self):
+        gate_ids, qubits, params = self.make_alphabet(1).get_random_arrays((8, 20))
+        self.assertEqual(gate_ids.shape, (8, 20))
+        for q in qubits.reshape(-1, qubits.shape[-1]).tolist():
+            valid = [x for x in q if x >= 0]
+            self.assertEqual(len(valid), len(set(valid)))
+            self.assertTrue(all(0 <= x < 4 for x in valid))
+        self.assertTrue(np.all((params >= 0) & (params < 2 * np.pi)))
+
+    def test_get_random(self):
+        instructions = self.make_alphabet(2).get_random(10)
+        self.assertEqual(len(instructions), 10)
+        for inst in instructions:
+            self.assertEqual(len(inst.qubits), inst.gate.n_qubits)
+            self.assertEqual(len(inst.params), inst.gate.n_params)
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from pyqcd.algorithms import GA, GLOA, MLOA, Islands
+from pyqcd.alphabet import Alphabet
+from pyqcd.circuit import FitnessCache
+from pyqcd.gates import CX, U3, I
+from pyqcd.matrices import QFT
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.alphabet = Alphabet(Q=2)
+        self.alphabet.register_gates([I, U3, CX])
+
+    def check_resume(self, make_solver):
+        with tempfile.TemporaryDirectory() as tmp:
+            file = os.path.join(tmp, "solver.ckpt.npz")
+            np.random.seed(0)
+            solver = make_solver()
+            solver.evolve()
+            solver.save_checkpoint(file, log_size=123)
+            for _ in range(3):
+                solver.evolve()
+
+            resumed = make_solver()
+            self.assertEqual(resumed.load_checkpoint(file), {'log_size': 123})
+            for _ in range(3):
+                resumed.evolve()
+
+        self.assertEqual(resumed.stats(), solver.stats())
+        self.assertTrue(np.array_equal(resumed.best.params, solver.best.params))
+
+    def test_ga(self):
+        self.check_resume(lambda: GA(QFT(2), self.alphabet, pop_size=10, circuit_size=6))
+
+    def test_mloa(self):
+        self.check_resume(lambda: MLOA(QFT(2), self.alphabet, n_groups=3, group_size=4, circuit_size=6))
+
+    def test_fitness_cache(self):
+        self.check_resume(lambda: GA(QFT(2), self.alphabet, pop_size=10, circuit_size=6,
+                                     fitness_cache=FitnessCache(max_size=40)))
+        self.check_resume(lambda: MLOA(QFT(2), self.alphabet, n_groups=3, group_size=4, circuit_size=6,
+                                       fitness_cache=FitnessCache()))
+
+    def test_alphabet_generator(self):
+        self.alphabet = Alphabet(Q=2, rng=np.random.default_rng(0))
+        self.alphabet.register_gates([I, U3, CX])
+        self.check_resume(lambda: GA(QFT(2), self.alphabet, pop_size=10, circuit_size=6))
+
+    def test_sampled_fitness(self):
+        self.check_resume(lambda: GA(QFT(2), self.alphabet, pop_size=10, circuit_size=6, n_samples=3))
+
+    def test_islands(self):
+        def make_solver():
+            return Islands(GLOA, QFT(2), self.alphabet, n_islands=2, n_groups=2, group_size=3, circuit_size=6,
+                           migration_interval=2, seed=0)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            file = os.path.join(tmp, "solver.ckpt.npz")
+            solver = make_solver()
+            resumed = make_solver()
+            try:
+                solver.evolve()
+                solver.save_checkpoint(file)
+                for _ in range(2):
+                    solver.evolve()
+
+                resumed.load_checkpoint(file)
+                for _ in range(2):
+                    resumed.evolve()
+                self.assertEqual(resumed.stats(), solver.stats())
+            finally:
+                solver.close()
+                resumed.close()
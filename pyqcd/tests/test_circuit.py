@@ -0,0 +1,300 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from pyqcd import matrices
+from pyqcd.alphabet import Alphabet
+from pyqcd.algorithms import GA, MC
+from pyqcd.algorithms.base import BaseSearch
+from pyqcd.circuit import (BATCH_MAX_QUBITS, FUSION_MIN_QUBITS, Circuit, FitnessCache, UnitaryCache, UnitaryCircuit,
+                           batch_to_matrix, compile_arrays, iter_unitaries, shared_structure_to_matrix, stack_arrays,
+                           threshold_tr_distances)
+from pyqcd.gates import (CCX, CX, CZ, RX, RY, RZ, U1, U2, U3, H, I, S, T, X, Z, batch_gate_matrix, gate_id,
+                         gate_matrix)
+from pyqcd.instruction import Instruction
+from pyqcd.math_utils import REJECTED, tr_distance
+from pyqcd.population import Population
+
+
+def reference_matrix(circuit: Circuit) -> np.ndarray:
+    """Dense matrix of a circuit built from explicit basis states"""
+    dim = 2**circuit.Q
+    res = np.eye(dim, dtype=complex)
+    for instr in circuit.instructions:
+        gate = instr.to_matrix()
+        qubits = list(instr.qubits)
+        full = np.zeros((dim, dim), dtype=complex)
+        for col in range(dim):
+            sub_col = sum(((col >> q) & 1) << k for k, q in enumerate(qubits))
+            for sub_row in range(gate.shape[0]):
+                row = col
+                for k, q in enumerate(qubits):
+                    row = (row & ~(1 << q)) | (((sub_row >> k) & 1) << q)
+                full[row, col] += gate[sub_row, sub_col]
+        res = full @ res
+    return res
+
+
+class TestCircuit(unittest.TestCase):
+    def setUp(self):
+        self.alphabet = Alphabet(Q=3)
+        self.alphabet.register_gates([I, H, U3, CX])
+
+    def test_to_matrix(self):
+        circuit = Circuit(3, self.alphabet.get_random(20))
+        self.assertTrue(np.allclose(circuit.to_matrix(), reference_matrix(circuit)))
+
+    def test_arrays_roundtrip(self):
+        instructions = self.alphabet.get_random(20)
+        circuit = Circuit(3, instructions)
+        for a, b in zip(instructions, circuit.instructions):
+            self.assertEqual(a.gate, b.gate)
+            self.assertTrue(np.array_equal(a.qubits, b.qubits))
+            self.assertTrue(np.array_equal(a.params, b.params))
+        self.assertIsInstance(circuit.instructions, tuple)
+
+        clone = circuit.clone()
+        clone.set_params(0, [1., 2., 3.])
+        clone.swap_prefix(circuit, 1)
+        self.assertTrue(np.array_equal(circuit.params[0], [1., 2., 3.]))
+        self.assertEqual(len(clone.pop(4).qubits), instructions[4].gate.n_qubits)
+        self.assertEqual(len(clone), 19)
+
+    def test_structured_kernels(self):
+        alphabet = Alphabet(Q=3)
+        alphabet.register_gates([I, X, Z, S, T, RZ, U1, CX, CZ, H])
+        circuit = Circuit(3, alphabet.get_random(40))
+        self.assertTrue(np.allclose(circuit.to_matrix(), reference_matrix(circuit)))
+
+    def test_three_qubit_gates(self):
+        alphabet = Alphabet(Q=4)
+        alphabet.register_gates([U3, CX, CCX])
+        circuit = Circuit(4, alphabet.get_random(30))
+        self.assertTrue(np.allclose(circuit.to_matrix(), reference_matrix(circuit)))
+
+        UC = UnitaryCircuit(4)
+        UC.add_gate(matrices.CCX, [3, 0, 2])
+        dense = Circuit(4, [Instruction(CCX, [3, 0, 2], [])])
+        self.assertTrue(np.allclose(UC.to_matrix(), reference_matrix(dense)))
+
+    def test_compile(self):
+        alphabet = Alphabet(Q=4)
+        alphabet.register_gates([I, X, Z, H, T, RZ, U3, CX, CZ, CCX])
+        circuit = Circuit(4, alphabet.get_random(60))
+        ops = compile_arrays(4, circuit.gate_ids, circuit.qubits, circuit.params)
+        self.assertLess(len(ops), np.count_nonzero(circuit.gate_ids != gate_id(I)))
+        UC = UnitaryCircuit(4)
+        UC.add_compiled(ops)
+        self.assertTrue(np.allclose(UC.to_matrix(), reference_matrix(circuit)))
+
+        # Runs of 1-qubit gates and identities vanish into the 2-qubit gate
+        circuit = Circuit(2, [Instruction(U3, [0], [1., 2., 3.]), Instruction(I, [1], []),
+                              Instruction(H, [1], []), Instruction(CX, [1, 0], []),
+                              Instruction(RZ, [0], [.5]), Instruction(U3, [1], [.1, .2, .3])])
+        ops = compile_arrays(2, circuit.gate_ids, circuit.qubits, circuit.params)
+        self.assertEqual(len(ops), 1)
+        UC = UnitaryCircuit(2)
+        UC.add_compiled(ops)
+        self.assertTrue(np.allclose(UC.to_matrix(), reference_matrix(circuit)))
+
+        alphabet = Alphabet(Q=FUSION_MIN_QUBITS)
+        alphabet.register_gates([I, U3, CX])
+        circuit = Circuit(FUSION_MIN_QUBITS, alphabet.get_random(30))
+        self.assertTrue(np.allclose(circuit.to_matrix(), reference_matrix(circuit)))
+
+    def test_threshold_tr_distances(self):
+        alphabet = Alphabet(Q=8)
+        alphabet.register_gates([U3, CX])
+        parent = Circuit(8, alphabet.get_random(10))
+        target = parent.to_matrix()
+        circuits = [parent] + [Circuit(8, alphabet.get_random(10)) for _ in range(2)]
+        gate_ids, qubits, params = stack_arrays(circuits)
+        distances = [tr_distance(c.to_matrix(), target) for c in circuits]
+
+        self.assertTrue(np.allclose(threshold_tr_distances(8, gate_ids, qubits, params, target, np.inf), distances))
+        res = threshold_tr_distances(8, gate_ids, qubits, params, target, [.5, .5, 1.])
+        self.assertTrue(np.isclose(res[0], distances[0]))
+        self.assertEqual(res[1], REJECTED)
+        self.assertTrue(np.isclose(res[2], distances[2]))
+
+        search = BaseSearch(target, alphabet, 10, early_exit=True)
+        self.assertEqual(search.fitness(circuits[1], threshold=.5), REJECTED)
+        self.assertTrue(np.isclose(search.fitness(circuits[1]), distances[1]))
+        self.assertEqual(search.stats()['n_rejects'], 1)
+
+    def test_sampled_fitness(self):
+        alphabet = Alphabet(Q=6)
+        alphabet.register_gates([I, U3, CX])
+        pop = Population.random(6, alphabet, 20, 30)
+        exact = MC(matrices.QFT(6), alphabet, circuit_size=30).arrays_fitness(pop.gate_ids, pop.qubits, pop.params)
+
+        solver = MC(matrices.QFT(6), alphabet, circuit_size=30, batch_size=20, n_samples=64)
+        estimates, ci = solver.sampled_distances(pop.gate_ids, pop.qubits, pop.params)
+        self.assertTrue(np.allclose(solver.arrays_fitness(pop.gate_ids, pop.qubits, pop.params), estimates))
+        # 95% intervals, 5 widths is far in the tails
+        self.assertTrue(np.all(np.abs(estimates - exact) < 5 * ci))
+
+        solver.evolve()
+        self.assertEqual(solver.n_exact, 1)
+        self.assertAlmostEqual(solver.best.score, tr_distance(solver.best.to_matrix(), solver.target))
+        self.assertIsNotNone(solver.stats()['best_ci'])
+
+        with self.assertRaises(ValueError):
+            MC(matrices.QFT(6), alphabet, circuit_size=30, mat_dist=lambda a, b: 0, n_samples=64)
+
+    def test_work_buffers(self):
+        alphabet = Alphabet(Q=3)
+        alphabet.register_gates([X, T, H, U3, CX, CZ])
+        a, b = Circuit(3, alphabet.get_random(20)), Circuit(3, alphabet.get_random(20))
+        # Matrices are handed over, never written again by later simulations
+        ua = a.to_matrix()
+        ub = b.to_matrix()
+        self.assertTrue(np.allclose(ua, reference_matrix(a)))
+        self.assertTrue(np.allclose(ub, reference_matrix(b)))
+
+        start = ua.copy()
+        UC = UnitaryCircuit(3, ua)
+        UC.add_arrays(b.gate_ids, b.qubits, b.params)
+        prefix = UC.to_matrix()
+        UC.add_arrays(a.gate_ids, a.qubits, a.params)
+        self.assertTrue(np.array_equal(ua, start))
+        self.assertTrue(np.allclose(prefix, ub @ ua))
+        self.assertTrue(np.allclose(UC.to_matrix(), ua @ ub @ ua))
+
+        identity = UnitaryCircuit(3).to_matrix()
+        identity[0, 0] = 0
+        self.assertTrue(np.array_equal(UnitaryCircuit(3).to_matrix(), np.eye(8)))
+
+    def test_batch_to_matrix(self):
+        circuits = [Circuit(3, self.alphabet.get_random(n)) for n in [1, 5, 20, 13]]
+        matrices = batch_to_matrix(circuits)
+        self.assertEqual(matrices.shape, (4, 8, 8))
+        for matrix, circuit in zip(matrices, circuits):
+            self.assertTrue(np.allclose(matrix, reference_matrix(circuit)))
+
+    def test_iter_unitaries(self):
+        # Layered batch below the threshold, single circuits above
+        for Q in [BATCH_MAX_QUBITS, BATCH_MAX_QUBITS + 1]:
+            alphabet = Alphabet(Q)
+            alphabet.register_gates([I, H, U3, CX])
+            circuits = [Circuit(Q, alphabet.get_random(n)) for n in [12, 0, 7]]
+            gate_ids, qubits, params = stack_arrays(circuits)
+            chunks = list(iter_unitaries(Q, gate_ids, qubits, params))
+            self.assertEqual(len(chunks), 1 if Q <= BATCH_MAX_QUBITS else 3)
+            for rows, matrices in chunks:
+                for c, matrix in zip(circuits[rows], matrices):
+                    self.assertTrue(np.allclose(matrix, c.to_matrix()))
+
+        # Batches of 2 circuits
+        with mock.patch('pyqcd.circuit.BATCH_MAX_BYTES', 2 * 3 * 4**3 * 16):
+            chunks = list(iter_unitaries(3, *stack_arrays([Circuit(3, self.alphabet.get_random(5)) for _ in range(5)])))
+        self.assertEqual([len(matrices) for _, matrices in chunks], [2, 2, 1])
+
+    def test_shared_structure_to_matrix(self):
+        alphabet = Alphabet(Q=3)
+        alphabet.register_gates([I, X, H, T, CX, CCX, RX, RY, RZ, U1, U2, U3])
+        circuit = Circuit(3, alphabet.get_random(30))
+        params = circuit.params + np.random.rand(4, *circuit.params.shape)
+
+        matrices = shared_structure_to_matrix(3, circuit.gate_ids, circuit.qubits, params)
+        self.assertEqual(matrices.shape, (4, 8, 8))
+        for matrix, p in zip(matrices, params):
+            candidate = Circuit.from_arrays(3, circuit.gate_ids, circuit.qubits, p)
+            self.assertTrue(np.allclose(matrix, reference_matrix(candidate)))
+
+    def test_batch_gate_matrix(self):
+        gates = [RX, RY, RZ, U1, U2, U3, H, T]
+        gate_ids = np.array([gate_id(gate) for gate in gates] * 3)
+        params = np.random.rand(len(gate_ids), 3) * 2 * np.pi
+        stack = batch_gate_matrix(gate_ids, params)
+        self.assertEqual(stack.shape, (len(gate_ids), 2, 2))
+        for gid, p, matrix in zip(gate_ids, params, stack):
+            gate = gates[list(gate_ids).index(gid)]
+            self.assertTrue(np.allclose(matrix, gate_matrix(gate, p[:gate.n_params])))
+            self.assertTrue(np.allclose(matrix, gate(*p[:gate.n_params]).to_matrix()))
+
+    def test_unitary_cache_edits(self):
+        cache = UnitaryCache(max_window=10)
+        circuit = Circuit(3, self.alphabet.get_random(20))
+        self.assertTrue(np.allclose(circuit.to_matrix(cache), circuit.to_matrix()))
+
+        for idx in [0, 7, 19]:
+            new = circuit.clone()
+            new[idx] = self.alphabet.get_random()[0]
+            self.assertTrue(np.allclose(new.to_matrix(cache), new.to_matrix()))
+
+        new = circuit.clone()
+        new.pop(5)
+        new.insert(12, self.alphabet.get_random()[0])
+        self.assertTrue(np.allclose(new.to_matrix(cache), new.to_matrix()))
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 4)
+
+        # Matrices returned on a miss or on an unedited hit are the caller's own
+        matrix = circuit.clone().to_matrix(cache)
+        expected = matrix.copy()
+        matrix[:] = 0
+        circuit.to_matrix(cache)[:] = 0
+        self.assertTrue(np.allclose(circuit.clone().to_matrix(cache), expected))
+        self.assertFalse(circuit._partials.prefix[-1].flags.writeable)
+
+        # On larger unitaries, a short suffix goes through the gate kernels instead of a product
+        alphabet = Alphabet(Q=6)
+        alphabet.register_gates([I, H, U3, CX])
+        circuit = Circuit(6, alphabet.get_random(20))
+        circuit.to_matrix(cache)
+        hits = cache.hits
+        new = circuit.clone()
+        new[18] = Instruction(U3, [0], [.1, .2, .3])
+        self.assertTrue(np.allclose(new.to_matrix(cache), new.to_matrix()))
+        self.assertEqual(cache.hits, hits + 1)
+        self.assertIsNone(circuit._partials.suffix_dag)
+
+    def test_unitary_cache_budget(self):
+        entry_bytes = 21 * 2**6 * 16
+        cache = UnitaryCache(max_bytes=2 * entry_bytes)
+
+        circuits = [Circuit(3, self.alphabet.get_random(20)) for _ in range(4)]
+        for c in circuits:
+            c.to_matrix(cache)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 2)
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+        self.assertFalse(circuits[0]._partials.valid)
+        self.assertTrue(np.allclose(circuits[0].to_matrix(cache), reference_matrix(circuits[0])))
+
+    def test_unitary_cache_population(self):
+        cache = UnitaryCache()
+        search = GA(matrices.QFT(3), self.alphabet, pop_size=20, circuit_size=20, mut_pb=1., unitary_cache=cache)
+        for _ in range(3):
+            search.evolve()
+
+        # Mutants are re-scored from the products of their parent
+        self.assertGreater(cache.hits, 0)
+        pop = search.pop.copy()
+        pop.scores[:] = np.nan
+        BaseSearch(matrices.QFT(3), self.alphabet, 20).compute_population_scores(pop)
+        self.assertTrue(np.allclose(search.pop.scores, pop.scores))
+
+    def test_fitness_cache(self):
+        cache = FitnessCache(max_size=3)
+        search = BaseSearch(np.eye(8), self.alphabet, 10, fitness_cache=cache)
+
+        circuits = [Circuit(3, self.alphabet.get_random(10)) for _ in range(3)]
+        circuits[0].params = np.round(circuits[0].params, 6)
+        noisy = circuits[0].clone()
+        noisy.params = noisy.params + 1e-12
+        scores = search.batch_fitness(circuits + [circuits[1], noisy])
+        self.assertEqual(search.n_evals, 3)
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+        self.assertEqual(scores[0], scores[4])
+        self.assertEqual(scores[1], scores[3])
+        self.assertTrue(np.isclose(scores[2], search.mat_dist(circuits[2].to_matrix(), search.target)))
+
+        self.assertEqual(search.fitness(circuits[2].clone()), scores[2])
+        search.fitness(Circuit(3, self.alphabet.get_random(10)))
+        self.assertEqual(search.n_evals, 4)
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get(cache.key(circuits[0])))
@@ -0,0 +1,97 @@
+import unittest
+
+import numpy as np
+
+from pyqcd.algorithms import MLOA
+from pyqcd.alphabet import Alphabet
+from pyqcd.circuit import Circuit, UnitaryCache
+from pyqcd.gates import CCX, CX, RX, RY, RZ, U1, U2, U3, H
+from pyqcd.gradient import tr_distance_gradient
+from pyqcd.math_utils import tr_distance
+from pyqcd.matrices import QFT
+from pyqcd.targets import StateTarget
+
+
+class TestGradient(unittest.TestCase):
+    def test_tr_distance_gradient(self):
+        alphabet = Alphabet(Q=3)
+        alphabet.register_gates([RX, RY, RZ, U1, U2, U3, H, CX, CCX])
+        circuit = Circuit(3, alphabet.get_random(20))
+        target = QFT(3)
+
+        distance, grad = tr_distance_gradient(3, circuit.gate_ids, circuit.qubits, circuit.params, target)
+        self.assertTrue(np.isclose(distance, tr_distance(circuit.to_matrix(), target)))
+
+        eps = 1e-6
+        for idx in range(len(circuit)):
+            for p in range(circuit.gate(idx).n_params):
+                shifted = [circuit.clone(), circuit.clone()]
+                shifted[0].params[idx, p] += eps
+                shifted[1].params[idx, p] -= eps
+                numeric = (tr_distance(shifted[0].to_matrix(), target) -
+                           tr_distance(shifted[1].to_matrix(), target)) / (2 * eps)
+                self.assertTrue(np.isclose(grad[idx, p], numeric, atol=1e-7))
+            self.assertTrue(np.all(grad[idx, circuit.gate(idx).n_params:] == 0))
+
+    def test_gradient_refinement(self):
+        alphabet = Alphabet(Q=2)
+        alphabet.register_gates([U3, CX])
+        solver = MLOA(QFT(2), alphabet, n_groups=2, group_size=2, circuit_size=6, refinement="gradient")
+        circuit = solver.groups[0][0]
+        score, n_evals = circuit.score, solver.n_evals
+
+        solver.refine(circuit, 20)
+        self.assertLessEqual(circuit.score, score)
+        self.assertTrue(np.isclose(circuit.score, solver.mat_dist(circuit.to_matrix(), solver.target)))
+        self.assertEqual(solver.n_evals - n_evals, 60)
+
+        # The analytic gradient is of the full unitary distance
+        with self.assertRaises(ValueError):
+            MLOA(StateTarget(np.array([1, 0, 0, 1]) / np.sqrt(2)), alphabet,
+                 n_groups=2, group_size=2, circuit_size=6, refinement="gradient")
+
+    def test_batch_refinement(self):
+        alphabet = Alphabet(Q=2)
+        alphabet.register_gates([U3])
+        solver = MLOA(QFT(2), alphabet, n_groups=2, group_size=2, circuit_size=6, refinement="batch", ref_pb=1.)
+        circuit = solver.groups[0][0]
+        score, n_evals = circuit.score, solver.n_evals
+
+        solver.refine(circuit, 16)
+        self.assertLessEqual(circuit.score, score)
+        self.assertTrue(np.isclose(circuit.score, solver.mat_dist(circuit.to_matrix(), solver.target)))
+        self.assertEqual(solver.n_evals - n_evals, 16)
+
+    def test_random_refinement_partials(self):
+        alphabet = Alphabet(Q=2)
+        alphabet.register_gates([U3])
+        cache = UnitaryCache()
+        solver = MLOA(QFT(2), alphabet, n_groups=2, group_size=2, circuit_size=6, ref_pb=1., unitary_cache=cache)
+        circuit = solver.groups[0][0]
+        n_refs = solver.n_refs
+
+        solver.refine(circuit, 16)
+        self.assertGreater(solver.n_refs, n_refs)
+
+        # The refined circuit keeps the products of its params, it is re-scored on a hit
+        self.assertTrue(np.array_equal(circuit._partials.params, circuit.params))
+        hits = cache.hits
+        self.assertTrue(np.isclose(solver.matrix_distance(circuit), circuit.score))
+        self.assertEqual(cache.hits, hits + 1)
+
+    def test_sampled_refinement(self):
+        alphabet = Alphabet(Q=2)
+        alphabet.register_gates([U3])
+        solver = MLOA(QFT(2), alphabet, n_groups=2, group_size=2, circuit_size=6, refinement="batch", ref_pb=1.,
+                      n_samples=8)
+        circuit = solver.groups[0][0]
+        score = circuit.score
+
+        # Candidates are compared on the same estimator as the score of the circuit
+        solver.refine(circuit, 16)
+        self.assertLessEqual(circuit.score, score)
+        estimate = solver.sampled_distances(circuit.gate_ids[None], circuit.qubits[None], circuit.params[None])[0]
+        self.assertTrue(np.isclose(circuit.score, estimate[0] + solver.circuit_cost(circuit)))
+
+        with self.assertRaises(ValueError):
+            MLOA(QFT(2), alphabet, n_groups=2, group_size=2, circuit_size=6, refinement="gradient", n_samples=8)
@@ -0,0 +1,65 @@
+import unittest
+
+import numpy as np
+
+from pyqcd.algorithms import GLOA, Islands
+from pyqcd.alphabet import Alphabet
+from pyqcd.gates import CX, U3, I
+from pyqcd.matrices import QFT
+
+
+class TestIslands(unittest.TestCase):
+    def test_islands(self):
+        alphabet = Alphabet(Q=2)
+        alphabet.register_gates([I, U3, CX])
+        solver = Islands(GLOA, QFT(2), alphabet, n_islands=2, n_groups=2, group_size=3, circuit_size=6,
+                         migration_interval=2, seed=0)
+        try:
+            keys = list(solver.stats().keys())
+            best_fit = solver.best.score
+            solver.evolve()
+            solver.evolve()
+            stats = solver.stats()
+        finally:
+            solver.close()
+
+        self.assertEqual(list(stats.keys()), keys)
+        self.assertEqual(solver.gen, 4)
+        self.assertEqual(stats['best_fit'], solver.best.score)
+        self.assertLessEqual(solver.best.score, best_fit)
+        self.assertEqual(len([key for key in keys if key.startswith('mean_fit_')]), 4)
+        self.assertTrue(np.isclose(solver.mat_dist(solver.best.to_matrix(), solver.target), solver.best.score))
+
+    def test_islands_diverge(self):
+        alphabet = Alphabet(Q=2, rng=np.random.default_rng(0))
+        alphabet.register_gates([I, U3, CX])
+        solver = Islands(GLOA, QFT(2), alphabet, n_islands=2, n_groups=2, group_size=3, circuit_size=6,
+                         migration_interval=2, seed=0)
+        try:
+            stats = solver.stats()
+        finally:
+            solver.close()
+
+        # Initial groups are drawn from the alphabet: groups 0-1 on island 0, groups 2-3 on island 1
+        self.assertNotEqual((stats['mean_fit_0'], stats['mean_fit_1']), (stats['mean_fit_2'], stats['mean_fit_3']))
+
+    def test_islands_sampled(self):
+        alphabet = Alphabet(Q=2)
+        alphabet.register_gates([I, U3, CX])
+        solver = Islands(GLOA, QFT(2), alphabet, n_islands=2, n_groups=2, group_size=3, circuit_size=6,
+                         migration_interval=2, seed=0, n_samples=4)
+        try:
+            solver.evolve()
+        finally:
+            solver.close()
+
+        # Confidence intervals are not summed: best_ci is that of the island holding the best
+        island_stats = solver._island_stats
+        best = min(range(2), key=lambda island: island_stats[island]['best_fit'])
+        stats = solver.stats()
+        self.assertEqual(stats['best_fit'], island_stats[best]['best_fit'])
+        self.assertEqual(stats['best_ci'], island_stats[best]['best_ci'])
+        self.assertEqual(stats['n_exact'], sum(s['n_exact'] for s in island_stats))
+
+        island_stats[1 - best]['best_ci'] = None
+        self.assertEqual(solver.stats()['best_ci'], island_stats[best]['best_ci'])
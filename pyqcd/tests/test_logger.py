@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from pyqcd.logger import Logger, LogReader, load_log
+
+
+class TestLogger(unittest.TestCase):
+    def test_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file = os.path.join(tmp, "run.log")
+            logger = Logger(file, True, flush_interval=0)
+            logger.add_variables('best_fit', 'n_evals', 'mean_fit')
+
+            expected = {'best_fit': [None, 0.5, np.float64(0.25)], 'n_evals': [10, 20, np.int64(2**40)],
+                        'mean_fit': [0.75, 0.5, 1/3]}
+            for step in range(3):
+                logger.register(**{label: values[step] for label, values in expected.items()})
+            self.assertEqual(load_log(file), expected)
+
+            # Buffered records are written on dump, partial records are ignored
+            logger.live_update = False
+            logger.register(best_fit=0.125, n_evals=30, mean_fit=0.25)
+            self.assertEqual(len(load_log(file)['n_evals']), 3)
+            logger.dump()
+            with open(file, "ab") as f:
+                f.write(b"\x00\x00\x01")
+            data = load_log(file)
+            self.assertEqual(data['n_evals'][-1], 30)
+            self.assertEqual(data['best_fit'][-1], 0.125)
+            self.assertIsInstance(data['n_evals'][-1], int)
+
+    def test_incremental_reader(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file = os.path.join(tmp, "run.log")
+            reader = LogReader(file)
+            logger = Logger(file, False)
+            logger.add_variables('best_fit', 'n_evals')
+            open(file, "wb").close()
+            self.assertEqual(reader.read(), {})
+
+            logger.register(best_fit=0.5, n_evals=10)
+            logger.dump()
+            self.assertEqual(reader.read(), {'best_fit': [0.5], 'n_evals': [10]})
+            self.assertEqual(reader.read(), {'best_fit': [], 'n_evals': []})
+
+            logger.register(best_fit=0.25, n_evals=20)
+            logger.register(best_fit=0.125, n_evals=30)
+            logger.dump()
+            self.assertEqual(reader.read(), {'best_fit': [0.25, 0.125], 'n_evals': [20, 30]})
+
+            # Another run overwrites the log past the offset of the reader
+            logger = Logger(file, False)
+            logger.add_variables('best_fit', 'n_evals')
+            for step in range(5):
+                logger.register(best_fit=1. / (step + 1), n_evals=step)
+            logger.dump()
+            self.assertEqual(reader.read(), {'best_fit': [1., 0.5, 1/3, 0.25, 0.2], 'n_evals': [0, 1, 2, 3, 4]})
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file = os.path.join(tmp, "run.log")
+            logger = Logger(file, False)
+            logger.add_variables('n_evals')
+            logger.register(n_evals=10)
+            size = logger.size()
+            logger.register(n_evals=20)
+            logger.dump()
+
+            logger = Logger(file, False, resume_at=size)
+            logger.register(n_evals=30)
+            logger.dump()
+            self.assertEqual(load_log(file), {'n_evals': [10, 30]})
@@ -3,8 +3,9 @@ import unittest
 
 import numpy as np
 
+from pyqcd import math_utils
 from pyqcd.gates import U3
-from pyqcd.math_utils import d1, d2, tr_distance
+from pyqcd.math_utils import batch_distance, d1, d2, d_inf, tr_distance
 
 
 class TestMathUtils(unittest.TestCase):
@@ -52,3 +53,23 @@ class TestMathUtils(unittest.TestCase):
         self.assertTrue(d_ab >= 0)
         self.assertTrue(np.isclose(d_aa, 0))
         self.assertTrue(np.isclose(d_bb, 0))
+
+    def test_batch_distances(self):
+        stack = np.random.rand(5, 8, 8) + 1j * np.random.rand(5, 8, 8)
+        target = np.random.rand(8, 8) + 1j * np.random.rand(8, 8)
+        reference = {
+            tr_distance: lambda a, b: 1 - 1/8 * np.abs(np.trace(np.dot(np.conjugate(a.T), b))),
+            d1: lambda a, b: np.sum(np.abs(a - b)),
+            d2: lambda a, b: np.sqrt(np.sum(np.abs(a - b)**2)),
+            d_inf: lambda a, b: np.max(np.abs(a - b)),
+        }
+        block_size = math_utils.BLOCK_SIZE
+        try:
+            for block in [block_size, 16, 128]:
+                math_utils.BLOCK_SIZE = block
+                for dist, ref in reference.items():
+                    expected = [ref(m, target) for m in stack]
+                    self.assertTrue(np.allclose([dist(m, target) for m in stack], expected))
+                    self.assertTrue(np.allclose(batch_distance(dist)(stack, target), expected))
+        finally:
+            math_utils.BLOCK_SIZE = block_size
@@ -0,0 +1,22 @@
+import unittest
+
+import numpy as np
+
+from pyqcd.algorithms import MC
+from pyqcd.alphabet import Alphabet
+from pyqcd.gates import CX, U3, I
+from pyqcd.matrices import QFT
+
+
+class TestMC(unittest.TestCase):
+    def test_batch_mode(self):
+        alphabet = Alphabet(Q=2)
+        alphabet.register_gates([I, U3, CX])
+        solver = MC(QFT(2), alphabet, circuit_size=5, batch_size=64)
+
+        solver.evolve()
+        solver.evolve()
+        self.assertEqual(solver.n_evals, 128)
+        self.assertEqual(solver.gen, 2)
+        self.assertEqual(len(solver.best), 5)
+        self.assertTrue(np.isclose(solver.best.score, solver.mat_dist(solver.best.to_matrix(), solver.target)))
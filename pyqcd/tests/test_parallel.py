@@ -0,0 +1,44 @@
+import unittest
+
+import numpy as np
+
+from pyqcd.algorithms.base import BaseSearch
+from pyqcd.alphabet import Alphabet
+from pyqcd.gates import CX, U3, I
+from pyqcd.math_utils import d2
+from pyqcd.matrices import QFT
+from pyqcd.parallel import BlockedEvaluator, ProcessEvaluator
+from pyqcd.population import Population
+
+
+class TestParallel(unittest.TestCase):
+    def test_process_evaluator(self):
+        alphabet = Alphabet(Q=3)
+        alphabet.register_gates([I, U3, CX])
+        pop = Population.random(3, alphabet, 40, 12)
+
+        local = BaseSearch(QFT(3), alphabet, 12, d2)
+        expected = local.arrays_fitness(pop.gate_ids, pop.qubits, pop.params)
+
+        with ProcessEvaluator(QFT(3), d2, n_workers=2, min_chunk=8) as executor:
+            search = BaseSearch(QFT(3), alphabet, 12, d2, executor=executor)
+            scores = search.arrays_fitness(pop.gate_ids, pop.qubits, pop.params)
+
+        self.assertTrue(np.allclose(scores, expected))
+        self.assertEqual(search.n_evals, 40)
+
+    def test_blocked_evaluator(self):
+        alphabet = Alphabet(Q=4)
+        alphabet.register_gates([I, U3, CX])
+        pop = Population.random(4, alphabet, 10, 12)
+        expected = BaseSearch(QFT(4), alphabet, 12).arrays_fitness(pop.gate_ids, pop.qubits, pop.params)
+
+        # Blocks of 2 columns
+        with BlockedEvaluator(QFT(4), max_bytes=2 * 2 * 3 * 16 * 16, n_threads=2) as executor:
+            self.assertEqual(executor.block_size, 2)
+            search = BaseSearch(QFT(4), alphabet, 12, executor=executor)
+            self.assertTrue(np.allclose(search.arrays_fitness(pop.gate_ids, pop.qubits, pop.params), expected))
+            self.assertTrue(np.isclose(search.fitness(pop[0]), expected[0]))
+
+        with self.assertRaises(ValueError):
+            BaseSearch(QFT(4), alphabet, 12, d2, executor=BlockedEvaluator(QFT(4)))
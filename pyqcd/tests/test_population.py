@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+from pyqcd.alphabet import Alphabet
+from pyqcd.gates import CX, U3, H, I
+from pyqcd.population import Population
+
+
+class TestPopulation(unittest.TestCase):
+    def setUp(self):
+        self.alphabet = Alphabet(Q=3)
+        self.alphabet.register_gates([I, H, U3, CX])
+        self.pop = Population.random(3, self.alphabet, 20, 10)
+
+    def assertPadded(self, pop):
+        """Instructions are contiguous and padding is consistent"""
+        cols = np.arange(pop.gate_ids.shape[1])
+        valid = cols < pop.lengths[:, None]
+        self.assertTrue(np.array_equal(pop.gate_ids >= 0, valid))
+        self.assertTrue(np.all(pop.qubits[~valid] == -1))
+        self.assertTrue(np.all(pop.params[~valid] == 0))
+
+    def test_circuits_roundtrip(self):
+        circuits = self.pop.to_circuits()
+        pop = Population.from_circuits(3, circuits)
+        self.assertTrue(np.array_equal(pop.gate_ids, self.pop.gate_ids))
+        self.assertTrue(np.array_equal(pop.qubits, self.pop.qubits))
+        self.assertTrue(np.array_equal(pop.params, self.pop.params))
+
+    def test_mutate(self):
+        before = self.pop.copy()
+        index = np.arange(0, 20, 2)
+        for _ in range(10):
+            self.pop.mutate(index, self.alphabet)
+            self.assertPadded(self.pop)
+
+        self.assertTrue(np.all(np.isnan(self.pop.scores[index])))
+        untouched = np.arange(1, 20, 2)
+        self.assertTrue(np.array_equal(self.pop.gate_ids[untouched, :10], before.gate_ids[untouched]))
+
+    def test_crossover(self):
+        before = self.pop.copy()
+        a, b = np.array([0, 2]), np.array([1, 3])
+        self.pop.crossover(a, b, np.array([4, 0]))
+        self.assertTrue(np.array_equal(self.pop.gate_ids[0, :4], before.gate_ids[1, :4]))
+        self.assertTrue(np.array_equal(self.pop.gate_ids[0, 4:], before.gate_ids[0, 4:]))
+        self.assertTrue(np.array_equal(self.pop.params[1, :4], before.params[0, :4]))
+        self.assertTrue(np.array_equal(self.pop.gate_ids[2], before.gate_ids[2]))
+
+    def test_selection(self):
+        self.pop.scores = np.random.rand(20)
+        leaders = self.pop.leaders(5)
+        self.assertTrue(np.array_equal(leaders, [5 * g + np.argmin(self.pop.scores[5 * g:5 * g + 5])
+                                                 for g in range(4)]))
+        self.assertEqual(self.pop.tournament_selection(20)[0], self.pop.best())
+
+    def test_combine(self):
+        weights = np.array([1., 0., 0.])
+        new = self.pop.combine(self.pop.take(np.zeros(20, dtype=int)),
+                               Population.random(3, self.alphabet, 20, 10), weights)
+        self.assertTrue(np.array_equal(new.gate_ids, self.pop.gate_ids))
+        self.assertTrue(np.allclose(new.params, self.pop.params))
+        self.assertPadded(new)
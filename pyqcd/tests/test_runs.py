@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pyqcd.algorithms import GA
+from pyqcd.logger import load_log
+from pyqcd.runs import expand_runs, run_matrix, solve
+
+
+class TestRuns(unittest.TestCase):
+    def test_run_matrix(self):
+        with tempfile.TemporaryDirectory() as output:
+            entry = {"target": "QFT", "qubits": [1, 2], "gates": ["I", "U3", "CX"], "solver": "GA",
+                     "params": {"pop_size": 4, "circuit_size": 4}, "seeds": [0, 1], "n_evals": 20}
+            matrix = {"output": output, "runs": [entry, dict(entry, qubits=2, name="small")]}
+
+            runs = expand_runs(matrix)
+            self.assertEqual(len(runs), 6)
+            self.assertEqual(len(set(run['path'] for run in runs)), 6)
+
+            summaries = run_matrix(matrix, n_workers=1)
+            self.assertEqual(len(summaries), 6)
+            for summary in summaries:
+                self.assertTrue(os.path.exists(summary['path'] + ".qasm"))
+                self.assertTrue(os.path.exists(summary['path'] + ".log"))
+
+            # Completed runs are skipped
+            self.assertEqual(run_matrix(matrix, n_workers=1), [])
+
+    def test_live_log(self):
+        with tempfile.TemporaryDirectory() as output:
+            entry = {"target": "QFT", "qubits": 2, "gates": ["I", "U3", "CX"], "solver": "GA",
+                     "params": {"pop_size": 4, "circuit_size": 4}, "seeds": 0, "n_evals": 20,
+                     "checkpoint_interval": 0, "log_interval": 0}
+            run, = expand_runs({"output": output, "runs": [entry]})
+
+            # Records of the previous generations are on disk when a generation starts
+            logged = []
+            evolve = GA.evolve
+
+            def watched_evolve(solver):
+                if os.path.exists(run['path'] + ".log"):
+                    logged.append(len(load_log(run['path'] + ".log")['n_evals']))
+                evolve(solver)
+
+            with mock.patch.object(GA, 'evolve', autospec=True, side_effect=watched_evolve):
+                summary = solve(run)
+            self.assertGreater(summary['gen'], 2)
+            self.assertEqual(logged, list(range(1, summary['gen'])))
@@ -0,0 +1,53 @@
+import unittest
+
+import numpy as np
+
+from pyqcd.algorithms import GA
+from pyqcd.alphabet import Alphabet
+from pyqcd.circuit import Circuit
+from pyqcd.gates import CX, U3, H, I
+from pyqcd.instruction import Instruction
+from pyqcd.math_utils import isometry_distance, state_distance
+from pyqcd.matrices import QFT
+from pyqcd.population import Population
+from pyqcd.targets import IsometryTarget, StateTarget
+
+
+class TestTargets(unittest.TestCase):
+    def setUp(self):
+        self.alphabet = Alphabet(Q=3)
+        self.alphabet.register_gates([I, H, U3, CX])
+
+    def test_isometry_target(self):
+        inputs = [1, 4, 6]
+        target = IsometryTarget(QFT(3)[:, inputs], inputs)
+        pop = Population.random(3, self.alphabet, 5, 10)
+
+        outputs = target.batch_simulate(pop.gate_ids, pop.qubits, pop.params)
+        for idx, output in enumerate(outputs):
+            matrix = pop[idx].to_matrix()
+            self.assertTrue(np.allclose(output, matrix[:, inputs]))
+            self.assertTrue(np.allclose(target.simulate(pop[idx].gate_ids, pop[idx].qubits, pop[idx].params), output))
+
+        search = GA(target, self.alphabet, pop_size=6, circuit_size=10)
+        self.assertIs(search.mat_dist, isometry_distance)
+        expected = [isometry_distance(pop[idx].to_matrix()[:, inputs], target.columns) for idx in range(5)]
+        self.assertTrue(np.allclose(search.arrays_fitness(pop.gate_ids, pop.qubits, pop.params), expected))
+        self.assertTrue(np.isclose(search.fitness(pop[0]), expected[0]))
+
+        with self.assertRaises(ValueError):
+            IsometryTarget(2 * QFT(3)[:, :2])
+
+    def test_state_target(self):
+        bell = np.array([1, 0, 0, 1]) / np.sqrt(2)
+        target = StateTarget(bell)
+        # Matrix bit k of a gate acts on qubits[k]: CX [0, 1] is controlled by qubit 1
+        circuit = Circuit(2, [Instruction(H, [1], []), Instruction(CX, [0, 1], [])])
+
+        alphabet = Alphabet(Q=2)
+        alphabet.register_gates([I, H, CX])
+        search = GA(target, alphabet, pop_size=6, circuit_size=4)
+        self.assertIs(search.mat_dist, state_distance)
+        self.assertAlmostEqual(search.fitness(circuit), 0)
+        self.assertAlmostEqual(state_distance(circuit.to_matrix()[:, 0], bell), 0)
+        self.assertAlmostEqual(search.fitness(Circuit(2, [Instruction(H, [1], [])])), 0.75)
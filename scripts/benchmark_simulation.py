@@ -0,0 +1,126 @@
+"""Timings of the simulation paths behind the thresholds of pyqcd.circuit
+
+Run from the repository root: PYTHONPATH=. python scripts/benchmark_simulation.py
+"""
+import time
+import typing
+
+import numpy as np
+
+from pyqcd.alphabet import Alphabet
+from pyqcd.circuit import (BATCH_MAX_QUBITS, BLAS_OP_SPEEDUP, EINSUM_OP_COST, FUSION_MIN_QUBITS, KERNEL_CALL_OPS, Circuit,
+                           UnitaryCache, UnitaryCircuit, batch_arrays_to_matrix, get_plan)
+from pyqcd.gates import CX, RZ, U3, H, I, T
+
+N_CIRCUITS = 64
+CIRCUIT_SIZE = 30
+REPEATS = 5
+
+
+def best_times(funcs: typing.Sequence[typing.Callable], repeats: int = REPEATS) -> typing.List[float]:
+    """Return the best wall time of repeated calls of each func, in s. Calls are interleaved
+    so that a drift of the machine load affects all the funcs alike"""
+    best = [np.inf] * len(funcs)
+    for _ in range(repeats):
+        for idx, func in enumerate(funcs):
+            start = time.perf_counter()
+            func()
+            best[idx] = min(best[idx], time.perf_counter() - start)
+    return best
+
+
+def batch_vs_single(Q: int) -> None:
+    """Layered batch simulation against one Circuit.to_matrix per circuit (see BATCH_MAX_QUBITS)"""
+    alphabet = Alphabet(Q)
+    alphabet.register_gates([I, U3, CX])
+    gate_ids, qubits, params = alphabet.get_random_arrays((N_CIRCUITS, CIRCUIT_SIZE))
+    circuits = [Circuit.from_arrays(Q, g, q, p) for g, q, p in zip(gate_ids, qubits, params)]
+
+    batch, single = best_times([lambda: batch_arrays_to_matrix(Q, gate_ids, qubits, params),
+                                lambda: [c.to_matrix() for c in circuits]])
+    print("Q=%d  batch %7.3f ms  single %7.3f ms  per circuit, batch speedup %5.2f%s" % (
+        Q, 1e3 * batch / N_CIRCUITS, 1e3 * single / N_CIRCUITS, single / batch,
+        "  (batched)" if Q <= BATCH_MAX_QUBITS else ""))
+
+
+def kernel_constants() -> None:
+    """Constants of the cost model of fusion (see KERNEL_CALL_OPS), fitted on dense gates
+    applied to unitaries of 2 and 9 qubits: 1-qubit gates do 2 multiply-adds per entry,
+    and on a product of 8-qubit unitaries"""
+    def kernel(Q: int, k: int) -> typing.Callable:
+        tensor = np.ones(Q * [2, 2], dtype=complex)
+        out = np.empty_like(tensor)
+        plan = get_plan(list(range(k)), Q)
+        gate = np.ones((2**k, 2**k), dtype=complex)
+        return lambda: plan.apply_dense(gate, tensor, out)
+
+    matrix = np.ones((2**8, 2**8), dtype=complex)
+    small, large, einsum, product = best_times([kernel(2, 1), kernel(9, 1), kernel(9, 2),
+                                                lambda: np.dot(matrix, matrix)], repeats=20)
+    per_op = (large - small) / (2 * (4**9 - 4**2))
+    print("kernel call %.1f us, %.2f ns per operation: %d operations (KERNEL_CALL_OPS %d)" % (
+        1e6 * small, 1e9 * per_op, (small - 2 * 4**2 * per_op) / per_op, KERNEL_CALL_OPS))
+    print("2-qubit dense gate %.2f ns per operation: %.1f times the 1-qubit matmul (EINSUM_OP_COST %d)" % (
+        1e9 * einsum / (4 * 4**9), einsum / (4 * 4**9) / per_op, EINSUM_OP_COST))
+    print("unitary product %.2f ns per multiply-add: %.1f per operation (BLAS_OP_SPEEDUP %d)" % (
+        1e9 * product / 8**8, per_op / (product / 8**8), BLAS_OP_SPEEDUP))
+
+
+def fused_vs_unfused(Q: int, gates: typing.List) -> None:
+    """Compiled (fused) simulation against one kernel call per instruction (see FUSION_MIN_QUBITS)"""
+    alphabet = Alphabet(Q)
+    alphabet.register_gates(gates)
+    circuits = [Circuit(Q, alphabet.get_random(CIRCUIT_SIZE)) for _ in range(N_CIRCUITS)]
+
+    def unfused():
+        for c in circuits:
+            UC = UnitaryCircuit(Q)
+            UC.add_arrays(c.gate_ids, c.qubits, c.params)
+            UC.to_matrix()
+
+    def fused():
+        for c in circuits:
+            UC = UnitaryCircuit(Q)
+            UC.add_compiled(c.compile())
+            UC.to_matrix()
+
+    a, b = best_times([unfused, fused])
+    print("Q=%d  unfused %7.3f ms  fused %7.3f ms  per circuit, fusion speedup %5.2f%s" % (
+        Q, 1e3 * a / N_CIRCUITS, 1e3 * b / N_CIRCUITS, a / b, "  (fused)" if Q >= FUSION_MIN_QUBITS else ""))
+
+
+def cache_hit_vs_simulation(Q: int, n_circuits: int = 8) -> None:
+    """Rebuild of point edited circuits from cached partial products (see UnitaryCache)
+    against their simulation from scratch"""
+    alphabet = Alphabet(Q)
+    alphabet.register_gates([I, U3, CX])
+    cache = UnitaryCache(max_bytes=2**31)
+    edited = []
+    for _ in range(n_circuits):
+        circuit = Circuit(Q, alphabet.get_random(CIRCUIT_SIZE))
+        circuit.to_matrix(cache)
+        circuit[np.random.randint(CIRCUIT_SIZE)] = alphabet.get_random()[0]
+        edited.append(circuit)
+
+    hit, full = best_times([lambda: [c.to_matrix(cache) for c in edited],
+                            lambda: [c.to_matrix() for c in edited]])
+    print("Q=%d  hit %8.3f ms  simulation %8.3f ms  per circuit, hit speedup %5.2f" % (
+        Q, 1e3 * hit / n_circuits, 1e3 * full / n_circuits, full / hit))
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    print("%d random [I, U3, CX] circuits of %d instructions" % (N_CIRCUITS, CIRCUIT_SIZE))
+    for Q in range(2, 9):
+        batch_vs_single(Q)
+
+    kernel_constants()
+    for gates in [[I, U3, CX], [H, T, RZ, CX]]:
+        print("%d random %s circuits of %d instructions" % (
+            N_CIRCUITS, [gate.__name__ for gate in gates], CIRCUIT_SIZE))
+        for Q in range(2, 10):
+            fused_vs_unfused(Q, gates)
+
+    print("%d random [I, U3, CX] circuits of %d instructions, one instruction edited" % (8, CIRCUIT_SIZE))
+    for Q in range(2, 9):
+        cache_hit_vs_simulation(Q)
@@ -1,24 +1,24 @@
 import os
-import pickle
 from pathlib import Path
 
 import matplotlib.pyplot as plt
 import numpy as np
 
+from pyqcd.logger import load_log
+
 solvers = ["GA", "GLOA", "MLOA", "MLOA2"]
 colors = ["blue", "orange", "red", "green"]
 
 fig, ax = plt.subplots()
 
 for color, solver in zip(colors, solvers):
-    files = sorted(list(Path('../data').glob('%s/*.pickle' % solver)))
+    files = sorted(list(Path('../data').glob('%s/*.log' % solver)))
     for file in files:
-        with open(file, 'rb') as f:
-            data = pickle.load(f)
-            x = data['n_evals']
-            y = data['best_fit']
+        data = load_log(file)
+        x = data['n_evals']
+        y = data['best_fit']
 
-            ax.plot(x, y, label=solver, color=color)
+        ax.plot(x, y, label=solver, color=color)
 
 ax.set_title("QFT 2 - 100k evals - 4 runs")
 ax.legend()